@@ -1,6 +1,8 @@
 @echo off
 echo This script is used to build the executable file.
 pyinstaller --name UeTool.exe --workpath ..\build --distpath ..\binaries  --specpath ..\build --noconsole --onefile ..\main.py
+rem the command line version needs a console and must not include tkinter
+pyinstaller --name uetools.exe --workpath ..\build --distpath ..\binaries  --specpath ..\build --console --onefile --exclude-module tkinter ..\uetools.py
 
 copy  ..\build\UeTool.exe H:\Sync\Scripts\Windows\04_tools\UeTool.exe /Y
 echo Done!
@@ -0,0 +1,72 @@
+# coding=utf-8
+"""
+Compare the os.walk based folder search with the FolderScanner on a synthetic tree of more than 100 000 folders.
+Usage: python _testing/bench_folder_scanner.py [tree_folder]
+If tree_folder does not exist, it is created (this takes a while the first time).
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from _testing.fake_tree import make_projects_tree  # noqa: E402
+from modules.FolderScannerClass import FolderScanner  # noqa: E402
+
+names_to_clean = ['Binaries', 'Build', 'DerivedDataCache', 'Intermediate']
+
+
+def find_folders_os_walk(root: str) -> list:
+    """
+    The original implementation of FolderCleaner._find_folders, without the treeview.
+    """
+    folder_list = []
+    for root, dirs, files in os.walk(root):
+        for to_clean in names_to_clean:
+            for dir_name in dirs:
+                if to_clean == dir_name:
+                    folder_list.append(os.path.normpath(os.path.join(root, dir_name)))
+    return folder_list
+
+
+def find_folders_scanner(root: str) -> list:
+    """
+    The FolderScanner implementation of FolderCleaner._find_folders, without the treeview.
+    """
+    return list(FolderScanner(names_to_find=names_to_clean).scan(root))
+
+
+def find_folders_projects(root: str) -> list:
+    """
+    The project-aware search of FolderCleanerEngine.find_folders: only the folders of the projects that can contain a folder to clean are read.
+    """
+    return [folder for _project, folder in FolderScanner(names_to_find=names_to_clean).scan_projects(root)]
+
+
+def timed(func, root: str) -> tuple[float, list]:
+    start = time.perf_counter()
+    result = func(root)
+    return time.perf_counter() - start, result
+
+
+def main():
+    tree_folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(tempfile.gettempdir(), 'uetools_bench_tree')
+    if not os.path.isdir(tree_folder):
+        print(f'Creating the synthetic tree in {tree_folder}...')
+        count = make_projects_tree(tree_folder)
+        print(f'{count} folders created.')
+    # warm the OS cache so that both runs are compared on the same footing
+    find_folders_scanner(tree_folder)
+    walk_time, walk_result = timed(find_folders_os_walk, tree_folder)
+    scan_time, scan_result = timed(find_folders_scanner, tree_folder)
+    projects_time, projects_result = timed(find_folders_projects, tree_folder)
+    # the old implementation also reports nested matches (Binaries in Intermediate...) and matches inside skipped folders
+    print(f'os.walk:       {walk_time:.3f}s, {len(walk_result)} folders found')
+    print(f'FolderScanner: {scan_time:.3f}s, {len(scan_result)} folders found')
+    print(f'Projects:      {projects_time:.3f}s, {len(projects_result)} folders found')
+    print(f'Speed-up:      x{walk_time / scan_time:.1f}, x{walk_time / projects_time:.1f} project-aware')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# coding=utf-8
+"""
+Check the startup time of the main window against a time budget, using "python -X importtime".
+It also checks that the modules that must be loaded lazily (the tools, ttkwidgets...) are not imported at startup.
+Usage: python _testing/bench_startup.py [--budget-ms 150] [--module main|uetools] [--runs 5]
+The exit code is 1 if the budget is exceeded or if a lazy module has been imported, so it can be used as a regression check.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+root_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules that must not be imported at startup, for each entry point
+lazy_modules = {
+    # the main window: the tools are imported when their window is opened
+    'main': [
+        'ttkwidgets', 'json', 'shutil', 'configparser', 'modules.FolderCleanerClass', 'modules.PluginVersionFixerClass', 'modules.PluginBrowserClass', 'modules.ToolConfigClass', 'modules.ConfigStoreClass', 'modules.globals'
+    ],
+    # the command line: never imports tkinter
+    'uetools': ['tkinter', '_tkinter', 'ttkwidgets'],
+}
+
+
+def measure_import(module: str) -> tuple[float, set]:
+    """
+    Import a module in a new python process and measure the import time.
+    :param module: The module to import.
+    :return: The cumulative import time in milliseconds and the set of imported modules.
+    """
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=root_folder, capture_output=True, text=True, check=True)
+    total_us = 0
+    imported = set()
+    for line in process.stderr.splitlines():
+        # format: "import time: self [us] | cumulative | imported package"
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        imported.add(name.strip())
+        if not name.startswith('  '):  # top-level import: its cumulative time includes its children
+            total_us += int(cumulative_us)
+    return total_us / 1000, imported
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget-ms', type=float, default=150.0, help='The maximum import time, in milliseconds.')
+    parser.add_argument('--module', default='main', help='The module to import.')
+    parser.add_argument('--runs', type=int, default=5, help='The number of runs. The best run is kept.')
+    args = parser.parse_args()
+
+    timings = []
+    imported = set()
+    for _ in range(args.runs):
+        duration, imported = measure_import(args.module)
+        timings.append(duration)
+    best = min(timings)
+    print(f'Import time of {args.module}: best {best:.1f} ms, worst {max(timings):.1f} ms ({args.runs} runs), budget {args.budget_ms:.1f} ms')
+
+    status = 0
+    unexpected = sorted(name for name in lazy_modules.get(args.module, []) if name in imported)
+    if unexpected:
+        print(f'FAILED: modules imported at startup but that should be loaded lazily: {", ".join(unexpected)}')
+        status = 1
+    if best > args.budget_ms:
+        print(f'FAILED: the startup time budget is exceeded by {best - args.budget_ms:.1f} ms')
+        status = 1
+    if status == 0:
+        print('OK')
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
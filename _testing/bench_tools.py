@@ -0,0 +1,177 @@
+# coding=utf-8
+"""
+Benchmark the GUI-free engines of the tools on synthetic trees: the search and the cleaning of the project folders,
+the search of the plugins and the update of their BuildId.
+The results are written as JSON, so two commits can be compared.
+Usage: python _testing/bench_tools.py [--projects 50] [--files 4] [--plugins 500] [--repeat 3] [--output FILE] [--compare FILE] [--tolerance 0.2]
+The trees are created in a temporary folder and removed at the end. They are created again for each run, because the cleaning and the update change them.
+With --compare, the exit code is 1 if a benchmark is slower than the compared results by more than the tolerance, so it can be used as a regression check.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+root_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_folder)
+
+from _testing.fake_tree import make_projects_tree, make_engine_tree  # noqa: E402
+from modules.FolderCleanerEngineClass import FolderCleanerEngine  # noqa: E402
+from modules.PluginVersionFixerEngineClass import PluginsBuildIdFixerEngine  # noqa: E402
+
+# the benchmarks, in the order they are run
+bench_names = ['find_folders_cold', 'find_folders_warm', 'compute_sizes', 'clean_folders', 'find_plugins_cold', 'find_plugins_warm', 'fix_build_id_in_plugins']
+
+
+def get_git_commit() -> str:
+    """
+    Get the short hash of the current commit, or 'unknown' if git is not available.
+    """
+    try:
+        process = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root_folder, capture_output=True, text=True, check=True)
+        return process.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def timed(function, *args, **kwargs) -> tuple[float, object]:
+    """
+    Call a function and measure its duration.
+    :return: The duration in seconds and the result of the function.
+    """
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def run_once(work_folder: str, args) -> dict:
+    """
+    Create the trees and run all the benchmarks once.
+    :param work_folder: An empty folder for the trees and the cache files.
+    :param args: The command line arguments.
+    :return: {benchmark name: (duration in seconds, number of processed items)}.
+    """
+    projects_folder = os.path.join(work_folder, 'Projects')
+    engine_folder = os.path.join(work_folder, 'UE_5.3')
+    make_projects_tree(projects_folder, project_count=args.projects, content_width=args.content_width, cleanable_width=args.cleanable_width, files_per_folder=args.files)
+    make_engine_tree(engine_folder, plugin_count=args.plugins)
+    results = {}
+
+    cleaner = FolderCleanerEngine(index_file=os.path.join(work_folder, 'scan_index.json'), sizes_cache_file=os.path.join(work_folder, 'folder_sizes.json'))
+    duration, folder_list = timed(cleaner.find_folders, projects_folder)
+    results['find_folders_cold'] = (duration, len(folder_list))
+    duration, folder_list = timed(cleaner.find_folders, projects_folder)
+    results['find_folders_warm'] = (duration, len(folder_list))
+    duration, _dirs_read = timed(cleaner.compute_sizes, folder_list, on_result=lambda _folder, _size, _count: None)
+    results['compute_sizes'] = (duration, len(folder_list))
+    duration, stats = timed(cleaner.clean_folders, folder_list)
+    results['clean_folders'] = (duration, sum(folder_stats['files'] for folder_stats in stats.values()))
+
+    fixer = PluginsBuildIdFixerEngine(index_file=os.path.join(work_folder, 'plugins_index.json'), journal_file=os.path.join(work_folder, 'journal.json'),
+                                      registry_file=os.path.join(work_folder, 'engines.json'))
+    plugins_folder = os.path.join(engine_folder, 'Engine', 'Plugins', 'Marketplace')
+    duration, plugin_list = timed(fixer.find_plugins, plugins_folder)
+    results['find_plugins_cold'] = (duration, len(plugin_list))
+    duration, plugin_list = timed(fixer.find_plugins, plugins_folder)
+    results['find_plugins_warm'] = (duration, len(plugin_list))
+    fixer.build_id = fixer.extract_build_id(engine_folder)
+    duration, _statuses = timed(fixer.fix_build_id_in_plugins, plugin_list)
+    results['fix_build_id_in_plugins'] = (duration, sum(fixer.file_counts.values()))
+
+    errors = cleaner.error_list + fixer.error_list
+    if errors:
+        print(f'{len(errors)} errors during the run, ie. {errors[0]}', file=sys.stderr)
+    return results
+
+
+def run_benchmarks(args) -> dict:
+    """
+    Run the benchmarks args.repeat times.
+    :param args: The command line arguments.
+    :return: The results, as written to the JSON file.
+    """
+    durations = {name: [] for name in bench_names}
+    items = {}
+    for run in range(args.repeat):
+        work_folder = tempfile.mkdtemp(prefix='uetools_bench_')
+        try:
+            for name, (duration, count) in run_once(work_folder, args).items():
+                durations[name].append(round(duration, 4))
+                items[name] = count
+        finally:
+            shutil.rmtree(work_folder, ignore_errors=True)
+        print(f'Run {run + 1}/{args.repeat} done.', file=sys.stderr)
+    return {
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'commit': get_git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {
+            'projects': args.projects, 'files': args.files, 'content_width': args.content_width, 'cleanable_width': args.cleanable_width, 'plugins': args.plugins, 'repeat': args.repeat
+        },
+        'benchmarks': {
+            name: {'items': items.get(name, 0), 'seconds': values, 'min': min(values), 'median': round(statistics.median(values), 4)}
+            for name, values in durations.items() if values
+        },
+    }
+
+
+def compare(results: dict, reference: dict, tolerance: float) -> bool:
+    """
+    Print the comparison of the results with reference results.
+    :param results: The new results.
+    :param reference: The results to compare with, ie. the results of the previous commit.
+    :param tolerance: The accepted slowdown, ie. 0.2 for 20%.
+    :return: True if no benchmark is slower than the reference by more than the tolerance.
+    """
+    if reference.get('parameters') != results['parameters']:
+        print('Warning: the parameters of the compared results are different.')
+    print(f'Compared with {reference.get("commit")} ({reference.get("created")}):')
+    is_ok = True
+    for name, bench in results['benchmarks'].items():
+        old = reference.get('benchmarks', {}).get(name)
+        if old is None or not old['min']:
+            print(f'  {name:<25} no reference')
+            continue
+        ratio = bench['min'] / old['min']
+        is_slower = ratio > 1 + tolerance
+        is_ok = is_ok and not is_slower
+        print(f'  {name:<25} {old["min"]:8.3f}s -> {bench["min"]:8.3f}s  x{ratio:.2f}{"  SLOWER" if is_slower else ""}')
+    return is_ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the engines of the tools on synthetic trees.')
+    parser.add_argument('--projects', type=int, default=50, help='number of fake projects')
+    parser.add_argument('--files', type=int, default=4, help='number of small files in each cleanable folder and in its first level sub folders')
+    parser.add_argument('--content-width', type=int, default=3, help='width of the Content and Source trees of the projects')
+    parser.add_argument('--cleanable-width', type=int, default=4, help='width of the cleanable trees of the projects')
+    parser.add_argument('--plugins', type=int, default=500, help='number of fake Marketplace plugins')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs, the best time is compared')
+    parser.add_argument('--output', help='JSON file of the results. Default: uetools_bench_<commit>.json in the temporary folder')
+    parser.add_argument('--compare', help='JSON file of previous results to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='accepted slowdown when comparing, ie. 0.2 for 20%%')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args)
+    output = args.output or os.path.join(tempfile.gettempdir(), f'uetools_bench_{results["commit"]}.json')
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+    for name, bench in results['benchmarks'].items():
+        print(f'{name:<25} {bench["items"]:>8} items  min {bench["min"]:8.3f}s  median {bench["median"]:8.3f}s')
+    print(f'Results written to {output}')
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            reference = json.load(file)
+        return 0 if compare(results, reference, args.tolerance) else 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
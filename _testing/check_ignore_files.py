@@ -0,0 +1,61 @@
+# coding=utf-8
+"""
+Check that the ignore files of the projects (see CleaningRules.with_ignore_file()) change what the project-aware search finds.
+An exclude line must hide a folder to clean, and an include line must find a folder under a skipped folder, ie. '!Saved/Logs' under Saved.
+Usage: python _testing/check_ignore_files.py
+The exit code is 1 if a check fails, so it can be used as a regression check.
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.CleaningRulesClass import CleaningRules, ignore_filename  # noqa: E402
+from modules.FolderCleanerEngineClass import FolderCleanerEngine  # noqa: E402
+from modules.FolderScannerClass import FolderScanner  # noqa: E402
+
+
+def make_tree(root: str) -> None:
+    """
+    Make two projects: one with an ignore file that excludes Binaries and includes Saved/Logs, one without.
+    :param root: The folder of the projects.
+    """
+    for project in ('WithIgnore', 'Plain'):
+        for folder in ('Binaries', 'Intermediate', os.path.join('Saved', 'Logs'), os.path.join('Saved', 'Config')):
+            os.makedirs(os.path.join(root, project, folder))
+        open(os.path.join(root, project, project + '.uproject'), 'w').close()
+    with open(os.path.join(root, 'WithIgnore', ignore_filename), 'w') as file:
+        file.write('# keep the binaries, clean the logs\nBinaries\n!Saved/Logs\n')
+
+
+def main() -> int:
+    """
+    Run the checks.
+    :return: The exit code.
+    """
+    failures = []
+    with tempfile.TemporaryDirectory() as root:
+        make_tree(root)
+        found = sorted(os.path.relpath(folder, root) for _project, folder in FolderScanner(rules=CleaningRules()).scan_projects(root))
+        expected = sorted(os.path.normpath(path) for path in ('Plain/Binaries', 'Plain/Intermediate', 'WithIgnore/Intermediate', 'WithIgnore/Saved/Logs'))
+        if found != expected:
+            failures.append(f'scan_projects() found {found}, expected {expected}')
+
+        # the project of a folder created after the search must be the one the search would group it with
+        engine = FolderCleanerEngine(rules=CleaningRules())
+        engine.projects_folder = os.path.normpath(root)
+        for folder, project in (('WithIgnore/Saved/Logs', 'WithIgnore'), ('Plain/Saved/Logs', '')):
+            result = engine.get_project_root(os.path.join(engine.projects_folder, os.path.normpath(folder)), from_disk=True)
+            if result != (os.path.join(engine.projects_folder, project) if project else ''):
+                failures.append(f'get_project_root({folder}) returned "{result}", expected "{project}"')
+
+    for message in failures:
+        print(f'FAILED: {message}')
+    if not failures:
+        print('OK')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
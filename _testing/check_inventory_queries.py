@@ -0,0 +1,81 @@
+# coding=utf-8
+"""
+Check that the queries of the plugin inventory can run while it's updated in another thread, like the filters of the PluginBrowser window during a refresh.
+A query must never fail, and must see the plugins of the previous update or of the new one.
+Usage: python _testing/check_inventory_queries.py
+The exit code is 1 if a check fails, so it can be used as a regression check.
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.PluginInventoryClass import PluginInventory  # noqa: E402
+
+plugin_count = 3000
+
+
+def make_plugins(root: str) -> list:
+    """
+    Make some plugins, without binaries.
+    :param root: The folder of the plugins.
+    :return: The .uplugin files.
+    """
+    plugin_files = []
+    for index in range(plugin_count):
+        folder = os.path.join(root, f'Plugin{index}')
+        os.makedirs(folder)
+        plugin_file = os.path.join(folder, f'Plugin{index}.uplugin')
+        with open(plugin_file, 'w') as file:
+            json.dump({'EngineVersion': '5.1.0', 'Modules': [{'Name': f'Module{index}'}]}, file)
+        plugin_files.append(plugin_file)
+    return plugin_files
+
+
+def main() -> int:
+    """
+    Run the checks.
+    :return: The exit code.
+    """
+    failures = []
+    with tempfile.TemporaryDirectory() as root:
+        plugin_files = make_plugins(root)
+        halves = (plugin_files[:plugin_count // 2], plugin_files[plugin_count // 2:])
+        inventory = PluginInventory()
+        inventory.update({root: halves[0]}, lambda plugin_file: plugin_file + '.modules')
+        is_done = threading.Event()
+
+        def run_queries():
+            while not is_done.is_set():
+                try:
+                    count = len(inventory.query(text='plugin'))
+                    inventory.query(name='Plugin7', engine_version='5.1')
+                except Exception as error:
+                    failures.append(f'query() failed during an update: error {error!r}')
+                    return
+                if count not in (len(halves[0]), len(halves[1])):
+                    failures.append(f'query() returned {count} plugins, a mix of two updates')
+                    return
+
+        thread = threading.Thread(target=run_queries)
+        thread.start()
+        for _ in range(3):
+            for half in (halves[1], halves[0]):
+                inventory.update({root: half}, lambda plugin_file: plugin_file + '.modules')
+        is_done.set()
+        thread.join()
+        if len(inventory.query(engine_version='5.1')) != len(halves[0]):
+            failures.append(f'the last update left {len(inventory.entries)} plugins, expected {len(halves[0])}')
+
+    for message in failures:
+        print(f'FAILED: {message}')
+    if not failures:
+        print('OK')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
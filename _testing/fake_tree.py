@@ -0,0 +1,122 @@
+# coding=utf-8
+"""
+Build a synthetic tree of Unreal projects, used by the benchmarks.
+"""
+import json
+import os
+
+# the names of the cleanable folders of a project, filled with small files by make_projects_tree(files_per_folder=...)
+cleanable_names = ('Binaries', 'Intermediate', 'DerivedDataCache', 'Saved')
+
+
+def _make_sub_dirs(root: str, width: int, depth: int) -> int:
+    """
+    Create a tree of sub folders.
+    :param root: The folder to create the tree in.
+    :param width: The number of sub folders per folder.
+    :param depth: The depth of the tree.
+    :return: The number of folders created.
+    """
+    if depth <= 0:
+        return 0
+    count = 0
+    for i in range(width):
+        path = os.path.join(root, f'Dir{i:02d}')
+        os.makedirs(path, exist_ok=True)
+        count += 1 + _make_sub_dirs(path, width, depth - 1)
+    return count
+
+
+def _write_small_files(folder: str, file_count: int, file_size: int) -> int:
+    """
+    Create small files in a folder and in its sub folders (one level).
+    :param folder: The folder.
+    :param file_count: The number of files per folder.
+    :param file_size: The size of each file in bytes.
+    :return: The number of files created.
+    """
+    data = b'x' * file_size
+    count = 0
+    folders = [folder] + [entry.path for entry in os.scandir(folder) if entry.is_dir()]
+    for path in folders:
+        for i in range(file_count):
+            with open(os.path.join(path, f'File{i:03d}.bin'), 'wb') as file:
+                file.write(data)
+            count += 1
+    return count
+
+
+def make_projects_tree(root: str, project_count: int = 200, content_width: int = 4, cleanable_width: int = 8, files_per_folder: int = 0, file_size: int = 512) -> int:
+    """
+    Create a folder with project_count fake UE projects.
+    Each project has a Content tree and big Intermediate/DerivedDataCache/Binaries/Saved trees.
+    With the default values, more than 100 000 folders are created.
+    :param root: The folder to create the projects in.
+    :param project_count: The number of projects to create.
+    :param content_width: The width of the Content and Source trees (depth 3).
+    :param cleanable_width: The width of the cleanable trees (depth 2).
+    :param files_per_folder: The number of small files created in each cleanable folder and in its first level sub folders.
+    :param file_size: The size of each small file in bytes.
+    :return: The number of folders created.
+    """
+    count = 0
+    for p in range(project_count):
+        project = os.path.join(root, f'Project{p:04d}')
+        os.makedirs(project, exist_ok=True)
+        with open(os.path.join(project, f'Project{p:04d}.uproject'), 'w') as file:
+            file.write('{"FileVersion": 3}')
+        for name in ('Content', 'Source', 'Config'):
+            path = os.path.join(project, name)
+            os.makedirs(path, exist_ok=True)
+            count += 1 + _make_sub_dirs(path, content_width, 3)
+        for name in cleanable_names:
+            path = os.path.join(project, name)
+            os.makedirs(path, exist_ok=True)
+            count += 1 + _make_sub_dirs(path, cleanable_width, 2)
+            if files_per_folder > 0:
+                _write_small_files(path, files_per_folder, file_size)
+    return count
+
+
+def _write_json(filename: str, data: dict) -> None:
+    """
+    Write a JSON file, creating its folder.
+    :param filename: The file.
+    :param data: The content.
+    """
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, 'w', encoding='utf-8') as file:
+        json.dump(data, file, indent='\t')
+
+
+def make_engine_tree(root: str, plugin_count: int = 500, build_id: str = 'ENGINE-BUILD-ID', plugin_build_id: str = 'OLD-BUILD-ID', module_count: int = 3) -> list:
+    """
+    Create a fake UE engine: the .modules files of the engine binaries with build_id, and plugin_count Marketplace plugins,
+    each with a .uplugin file and a Binaries/Win64/UnrealEditor.modules file with plugin_build_id.
+    :param root: The install folder of the engine. The engine files are created in its 'Engine' sub folder.
+    :param plugin_count: The number of plugins to create.
+    :param build_id: The BuildId of the engine.
+    :param plugin_build_id: The BuildId of the plugins, different from the engine one so that they need an update.
+    :param module_count: The number of modules of each plugin.
+    :return: The paths of the .uplugin files.
+    """
+    engine_root = os.path.join(root, 'Engine')
+    for name in ('UnrealEditor', 'UnrealGame'):
+        _write_json(os.path.join(engine_root, 'Binaries', 'Win64', f'{name}.modules'), {'BuildId': build_id, 'Modules': {'Core': f'{name}-Core.dll'}})
+    for name in ('Paper2D', 'Niagara'):
+        _write_json(os.path.join(engine_root, 'Plugins', name, 'Binaries', 'Win64', 'UnrealEditor.modules'), {'BuildId': build_id, 'Modules': {name: f'UnrealEditor-{name}.dll'}})
+    plugin_files = []
+    for p in range(plugin_count):
+        name = f'Plugin{p:04d}'
+        plugin_folder = os.path.join(engine_root, 'Plugins', 'Marketplace', name)
+        modules = {f'{name}Module{m}': f'UnrealEditor-{name}Module{m}.dll' for m in range(module_count)}
+        plugin_file = os.path.join(plugin_folder, f'{name}.uplugin')
+        _write_json(plugin_file, {
+            'FileVersion': 3, 'Version': 1, 'VersionName': '1.0', 'FriendlyName': name, 'EngineVersion': '5.3.0', 'BuildId': plugin_build_id,
+            'Modules': [{'Name': module, 'Type': 'Runtime', 'LoadingPhase': 'Default'} for module in modules]
+        })
+        _write_json(os.path.join(plugin_folder, 'Binaries', 'Win64', 'UnrealEditor.modules'), {'BuildId': plugin_build_id, 'Modules': modules})
+        for folder in ('Content', 'Resources', 'Source'):
+            os.makedirs(os.path.join(plugin_folder, folder), exist_ok=True)
+        plugin_files.append(plugin_file)
+    return plugin_files
@@ -1,15 +1,21 @@
 # coding=utf-8
 """
 The main UETools window.
+Note: the tool modules are imported when their window is opened, to keep the startup fast (see _testing/bench_startup.py).
+The tools run as jobs of the main window (see JobScheduler): several jobs can run at the same time, each with its progress, its cancel button and its log.
 """
+import os
+import queue
 import tkinter as tk
 from tkinter import ttk
-from tkinter.filedialog import asksaveasfilename
-from tkinter.messagebox import showinfo
 
-from modules.FolderCleanerClass import FolderCleaner
-from modules.functions import make_modal
-from modules.PluginVersionFixerClass import PluginsBuildIdFixer
+from modules.ResultLogClass import ResultLog, LEVEL_INFO, LEVEL_WARNING, LEVEL_ERROR
+
+# filters of the results pane: {label: minimum level}
+level_filters = {'All levels': None, 'Warnings': LEVEL_WARNING, 'Errors': LEVEL_ERROR}
+all_tools_label = 'All tools'
+# the file of the jobs not finished when the application is closed, in the config folder. They are paused in the next session, until they are started again
+job_queue_filename = 'job_queue.json'
 
 
 class UETools(tk.Tk):
@@ -20,10 +26,22 @@ class UETools(tk.Tk):
     def __init__(self):
         super().__init__()
         self.text_content = None
-        self.keep_existing = False
         self.width = 500
-        self.height = 500
-        self.file_types = (('csv file', '*.csv'), ('tcsv file', '*.tcsv'), ('json file', '*.json'), ('text file', '*.txt'))
+        self.height = 660
+        self.view_max_lines = 2000  # number of lines displayed in the results pane, the full log is in the log file
+        self.poll_delay = 100  # delay between two updates of the results pane, in ms
+        self.result_log = ResultLog()
+        self._pending_records = queue.SimpleQueue()  # records written by the tools (maybe in a worker thread), not displayed yet
+        self.level_filter_var = tk.StringVar(value='All levels')
+        self.tool_filter_var = tk.StringVar(value=all_tools_label)
+        self.cb_tool_filter = None
+        self.scheduler = None  # the JobScheduler, created when the first job is submitted or when the jobs of the previous session are resumed
+        self.jobs_tree = None
+        self.job_items = {}  # {job id: treeview item}
+        self._jobs_changes = -1  # the changes of the scheduler displayed in the jobs pane
+        self.tool_windows = {}  # {tool name: its open window}. A tool has only one window at a time
+        # the text file is the full log, the other types are the typed items of the runs (see ResultExporter)
+        self.file_types = (('csv file', '*.csv'), ('tcsv file', '*.tcsv'), ('tsv file', '*.tsv'), ('json lines file', '*.jsonl'), ('json file', '*.json'), ('text file', '*.txt'))
 
         self.title('UE Tools')
         self.resizable(False, False)
@@ -32,6 +50,10 @@ class UETools(tk.Tk):
         self.create_widgets()
         self.bind('<Key>', self.on_key)
         self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.result_log.add_listener(self._pending_records.put)
+        self.after(self.poll_delay, self._poll_result_log)
+        # after the window is displayed: the jobs need the modules of the tools
+        self.after_idle(self._resume_jobs)
 
     def create_widgets(self):
         """
@@ -39,10 +61,12 @@ class UETools(tk.Tk):
         """
         pack_def_options = {'ipadx': 5, 'ipady': 5, 'padx': 3, 'pady': 3}
         lblf_top = tk.LabelFrame(self, text='Run Commands')
+        lblf_jobs = tk.LabelFrame(self, text='Jobs')
         lblf_content = tk.LabelFrame(self, text='Results')
         lblf_bottom = tk.LabelFrame(self)
 
         lblf_top.pack(side=tk.TOP, fill=tk.X, **pack_def_options)
+        lblf_jobs.pack(fill=tk.X, **pack_def_options)
         lblf_content.pack(fill=tk.X, **pack_def_options)
         lblf_bottom.pack(side=tk.BOTTOM, fill=tk.X, **pack_def_options)
 
@@ -50,9 +74,40 @@ class UETools(tk.Tk):
         btn_plugins_fix_build_id.pack(side=tk.LEFT, **pack_def_options)
         btn_folder_cleaner = ttk.Button(lblf_top, text='Clean projects folder', command=self.run_folder_cleaner)
         btn_folder_cleaner.pack(side=tk.LEFT, **pack_def_options)
+        btn_plugin_browser = ttk.Button(lblf_top, text='Plugin inventory', command=self.run_plugin_browser)
+        btn_plugin_browser.pack(side=tk.LEFT, **pack_def_options)
+
+        jobs_tree = ttk.Treeview(lblf_jobs, selectmode='browse', columns=('Status', 'Progress'), show='tree headings', height=4)
+        jobs_tree.column('#0', width=290, stretch=tk.YES)
+        jobs_tree.column('Status', width=70, stretch=tk.NO, anchor=tk.CENTER)
+        jobs_tree.column('Progress', width=90, stretch=tk.NO, anchor=tk.E)
+        jobs_tree.heading('#0', text='Job', anchor=tk.CENTER)
+        jobs_tree.heading('Status', text='Status', anchor=tk.CENTER)
+        jobs_tree.heading('Progress', text='Progress', anchor=tk.CENTER)
+        jobs_tree.bind('<Double-1>', lambda _event: self.show_job_log())
+        jobs_tree.pack(side=tk.TOP, fill=tk.X, padx=3, pady=3)
+        self.jobs_tree = jobs_tree
+        frm_jobs = ttk.Frame(lblf_jobs)
+        frm_jobs.pack(side=tk.TOP, fill=tk.X)
+        ttk.Button(frm_jobs, text='Start job', command=self.start_job).pack(side=tk.LEFT, padx=3, pady=3)
+        ttk.Button(frm_jobs, text='Cancel job', command=self.cancel_job).pack(side=tk.LEFT, padx=3, pady=3)
+        ttk.Button(frm_jobs, text='Show job log', command=self.show_job_log).pack(side=tk.LEFT, padx=3, pady=3)
+        ttk.Button(frm_jobs, text='Clear finished', command=self.clear_finished_jobs).pack(side=tk.LEFT, padx=3, pady=3)
+
+        frm_filters = ttk.Frame(lblf_content)
+        frm_filters.pack(side=tk.TOP, fill=tk.X)
+        ttk.Label(frm_filters, text='Show:').pack(side=tk.LEFT, padx=3)
+        cb_level_filter = ttk.Combobox(frm_filters, textvariable=self.level_filter_var, values=list(level_filters), state='readonly', width=12)
+        cb_level_filter.pack(side=tk.LEFT, padx=3, pady=3)
+        cb_level_filter.bind('<<ComboboxSelected>>', lambda _event: self.refresh_results())
+        self.cb_tool_filter = ttk.Combobox(frm_filters, textvariable=self.tool_filter_var, values=[all_tools_label], state='readonly', width=22)
+        self.cb_tool_filter.pack(side=tk.LEFT, padx=3, pady=3)
+        self.cb_tool_filter.bind('<<ComboboxSelected>>', lambda _event: self.refresh_results())
 
         pack_def_options = {'ipadx': 3, 'ipady': 3}
         text_content = tk.Text(lblf_content, font=('Verdana', 8))
+        text_content.tag_config(LEVEL_WARNING, foreground='dark orange')
+        text_content.tag_config(LEVEL_ERROR, foreground='red')
         scrollbar_y = ttk.Scrollbar(lblf_content)
         scrollbar_y.config(command=text_content.yview)
         text_content.config(yscrollcommand=scrollbar_y.set)
@@ -85,59 +140,271 @@ class UETools(tk.Tk):
         """
         Close the window
         """
+        self._stop_jobs()
+        self.result_log.close()
         self.quit()
 
-    def display(self, content='', keep_mode=True) -> None:
+    def display(self, content='', level=LEVEL_INFO) -> None:
         """
-        Display the content in the window. By default, ie. keep_mode==True, each new call adds the content to the existing content with a new line.
+        Display a content in the results pane, through the result log.
         :param content: the text to print
-        :param keep_mode: whether to keep the existing content when a new one is added
+        :param level: the level of the content
         """
+        self.result_log.write('UETools', content, level)
 
-        if self.keep_existing:
-            content += '\n'
-            self.text_content.insert(tk.END, content)
-        else:
-            self.text_content.delete('1.0', tk.END)
-            self.text_content.insert(tk.END, content)
-        # set the mode at the end to allow using display() to be used to change the mode for the next call
-        self.keep_existing = keep_mode
+    def _get_filters(self) -> tuple:
+        """
+        Get the filters of the results pane.
+        :return: The minimum level and the tool name, None if not filtered.
+        """
+        tool = self.tool_filter_var.get()
+        return level_filters.get(self.level_filter_var.get()), None if tool == all_tools_label else tool
+
+    def _insert_records(self, records: list) -> None:
+        """
+        Append records to the results pane, and remove the oldest lines to keep the pane bounded.
+        :param records: The records to append, already filtered.
+        """
+        text_content = self.text_content
+        for record in records:
+            text_content.insert(tk.END, ResultLog.format_record(record) + '\n', record['level'])
+        line_count = int(text_content.index('end-1c').split('.')[0])
+        if line_count > self.view_max_lines:
+            text_content.delete('1.0', f'{line_count - self.view_max_lines + 1}.0')
+        text_content.see(tk.END)
+
+    def _poll_result_log(self) -> None:
+        """
+        Display the new records of the result log. Run regularly in the main thread.
+        """
+        level, tool = self._get_filters()
+        min_index = ResultLog.level_index(level)
+        records = []
+        try:
+            # a bounded batch, so a burst of records never freezes the window
+            for _ in range(self.view_max_lines):
+                record = self._pending_records.get_nowait()
+                if ResultLog.level_index(record['level']) >= min_index and (tool is None or record['tool'] == tool):
+                    records.append(record)
+        except queue.Empty:
+            pass
+        if records:
+            self._insert_records(records[-self.view_max_lines:])
+        tools = [all_tools_label] + sorted(self.result_log.tools)
+        if list(self.cb_tool_filter['values']) != tools:
+            self.cb_tool_filter['values'] = tools
+        if self.scheduler is not None:
+            self._refresh_jobs()
+        self.after(self.poll_delay, self._poll_result_log)
+
+    def refresh_results(self) -> None:
+        """
+        Display the records of the result log kept in memory that match the filters.
+        """
+        level, tool = self._get_filters()
+        self.text_content.delete('1.0', tk.END)
+        self._insert_records(self.result_log.get_records(level, tool)[-self.view_max_lines:])
 
     def clean(self) -> None:
         """
-        Clean the content of the window
+        Clean the content of the window. The log file is kept.
         """
+        self.result_log.clear()
         self.text_content.delete('1.0', tk.END)
 
     def save_to_file(self) -> str:
         """
-        Save the content displayed to a file
+        Save the results of the session to a file: the typed items of the runs for a csv, tsv or json file, the full log for a text file.
         """
+        from tkinter.filedialog import asksaveasfilename
+        from tkinter.messagebox import showinfo
+        from modules.ResultExporterClass import ResultExporter
         filename = asksaveasfilename(title='Choose a file to save text to', filetypes=self.file_types, initialfile='results.txt')
-        if filename:
-            with open(filename, 'w') as f:
-                f.write(self.text_content.get('1.0', tk.END))
+        if not filename:
+            return filename
+        self.result_log.flush()
+        exporter = ResultExporter(self.result_log.items_file)
+        if exporter.get_format(filename) is not None:
+            count = exporter.export(filename)
+            showinfo(self.wm_title(), f'{count} results exported to {filename}')
+        else:
+            if self.result_log.log_file is not None:
+                import shutil
+                shutil.copyfile(self.result_log.log_file, filename)
+            else:
+                with open(filename, 'w', encoding='utf-8') as f:
+                    f.writelines(ResultLog.format_record(record, with_time=True) + '\n' for record in self.result_log.get_records())
             showinfo(self.wm_title(), f'Content Saved to {filename}')
         return filename
 
+    def _open_log_file(self) -> None:
+        """
+        Stream the result log to a log file of the session, in the config folder.
+        Called when the first tool is opened, because modules.globals is not loaded at startup.
+        """
+        if self.result_log.log_file is not None:
+            return
+        from modules.ResultLogClass import get_session_log_file
+        from modules.globals import config_folder, log_folder_name
+        log_file = get_session_log_file(os.path.join(config_folder, log_folder_name))
+        self.result_log.open_log_file(log_file)
+        self.result_log.open_items_file(os.path.splitext(log_file)[0] + '.jsonl')
+
+    def _get_scheduler(self):
+        """
+        Get the JobScheduler of the application, and create it on the first call with the jobs not finished by the previous session.
+        """
+        if self.scheduler is None:
+            from modules.JobSchedulerClass import JobScheduler, default_max_running_jobs, default_max_io_workers
+            from modules.ToolConfigClass import ToolConfig
+            from modules.globals import config_folder
+            from modules.jobs import job_runners, job_resources
+            self._open_log_file()
+            config = ToolConfig(init_values={'max_running_jobs': default_max_running_jobs, 'max_io_workers': default_max_io_workers}, section='UETools')
+            self.scheduler = JobScheduler(
+                job_runners, queue_file=os.path.join(config_folder, job_queue_filename), result_log=self.result_log, max_running=config.get('max_running_jobs'),
+                resources=job_resources, max_io_workers=config.get('max_io_workers')
+            )
+            for message in self.scheduler.error_list:
+                self.display(message, LEVEL_WARNING)
+        return self.scheduler
+
+    def _resume_jobs(self) -> None:
+        """
+        Display the jobs not finished by the previous session, if any. They are paused: they delete or change files, so they only run again when started.
+        """
+        from modules.globals import config_folder
+        if not os.path.isfile(os.path.join(config_folder, job_queue_filename)):
+            return
+        paused_jobs = self._get_scheduler().get_paused_jobs()
+        if paused_jobs:
+            self.display(f'{len(paused_jobs)} jobs of the previous session are paused. Select a job and click "Start job" to run it again, or "Cancel job"', LEVEL_WARNING)
+
+    def _stop_jobs(self) -> None:
+        """
+        Stop the running jobs and save the queue, see JobScheduler.shutdown().
+        """
+        if self.scheduler is not None:
+            self.scheduler.shutdown()
+
+    def _refresh_jobs(self) -> None:
+        """
+        Update the jobs pane: the rows when the jobs have changed, the progress of the running jobs otherwise. Run regularly in the main thread.
+        """
+        jobs = self.scheduler.get_jobs()
+        is_changed = self.scheduler.changes != self._jobs_changes
+        if is_changed:
+            self._jobs_changes = self.scheduler.changes
+            job_ids = {job.id for job in jobs}
+            for job_id in [job_id for job_id in self.job_items if job_id not in job_ids]:
+                self.jobs_tree.delete(self.job_items.pop(job_id))
+            for job in jobs:
+                if job.id not in self.job_items:
+                    self.job_items[job.id] = self.jobs_tree.insert('', 'end', text=f'{job.name} {job.title}')
+        for job in jobs:
+            if job.is_finished and not is_changed:
+                continue
+            if job.total:
+                progress = f'{job.done}/{job.total}'
+            else:
+                progress = str(job.done) if job.done else ''
+            if job.is_finished:
+                progress = job.summary or job.error
+            self.jobs_tree.item(self.job_items[job.id], values=(job.status, progress))
+
+    def _get_selected_job(self):
+        """
+        Get the job selected in the jobs pane.
+        :return: The job, or None if no job is selected.
+        """
+        if self.scheduler is None:
+            return None
+        selection = self.jobs_tree.selection()
+        job_id = next((job_id for job_id, item in self.job_items.items() if selection and item == selection[0]), None)
+        return None if job_id is None else self.scheduler.get_job(job_id)
+
+    def start_job(self) -> None:
+        """
+        Start the selected job, if it's a paused job of the previous session.
+        """
+        job = self._get_selected_job()
+        if job is not None:
+            self.scheduler.start(job.id)
+
+    def cancel_job(self) -> None:
+        """
+        Cancel the selected job.
+        """
+        job = self._get_selected_job()
+        if job is not None:
+            self.scheduler.cancel(job.id)
+
+    def show_job_log(self) -> None:
+        """
+        Show the log of the selected job in the results pane, with the filter of the tool of the job.
+        """
+        job = self._get_selected_job()
+        if job is None:
+            return
+        tools = [tool for tool in self.result_log.tools if tool.endswith(f' {job.name}')]
+        if not tools:
+            self.display(f'Job {job.name} has not written anything yet')
+            return
+        self.level_filter_var.set('All levels')
+        self.cb_tool_filter['values'] = [all_tools_label] + sorted(self.result_log.tools)
+        self.tool_filter_var.set(tools[0])
+        self.refresh_results()
+
+    def clear_finished_jobs(self) -> None:
+        """
+        Remove the finished jobs from the jobs pane.
+        """
+        if self.scheduler is not None:
+            self.scheduler.remove_finished()
+
+    def _open_tool_window(self, name: str, window_class) -> None:
+        """
+        Open the window of a tool, or bring it to the front if it's already open. The window is not modal: the jobs of the other tools keep running.
+        :param name: The name of the tool.
+        :param window_class: The class of the window.
+        """
+        window = self.tool_windows.get(name)
+        if window is not None and window.winfo_exists():
+            window.deiconify()
+            window.lift()
+            window.focus_set()
+            return
+        window = window_class(self, result_log=self.result_log, scheduler=self._get_scheduler())
+        window.transient(self)
+        self.tool_windows[name] = window
+
     def run_plugins_fix_build_id(self) -> None:
         """
         Open the Update Plugin Files window.
         """
-        toplevel = PluginsBuildIdFixer(self, display_callback=self.display)
-        make_modal(tk_root=self, tk_child=toplevel)
+        from modules.PluginVersionFixerClass import PluginsBuildIdFixer
+        self._open_tool_window('PluginsBuildIdFixer', PluginsBuildIdFixer)
 
     def run_folder_cleaner(self) -> None:
         """
         Open the Folder Cleaner window.
         """
-        toplevel = FolderCleaner(self, display_callback=self.display)
-        make_modal(tk_root=self, tk_child=toplevel)
+        from modules.FolderCleanerClass import FolderCleaner
+        self._open_tool_window('FolderCleaner', FolderCleaner)
+
+    def run_plugin_browser(self) -> None:
+        """
+        Open the Plugin Inventory window.
+        """
+        from modules.PluginBrowserClass import PluginBrowser
+        self._open_tool_window('PluginBrowser', PluginBrowser)
 
     def close_app(self) -> None:
         """
         Close the application.
         """
+        self._stop_jobs()
+        self.result_log.close()
         self.destroy()
 
 
@@ -0,0 +1,131 @@
+# coding=utf-8
+"""
+Implementation for:
+- BackgroundTask: A class to run a job in a worker thread and stream its results to the Tk main thread.
+"""
+import queue
+import threading
+
+
+class BackgroundTask:
+    """
+    A class to run a job in a worker thread and stream its results to the Tk main thread.
+    The job must not use any tk widget. It sends its results with put() and its progress with progress().
+    The main thread drains the queue in batches using after(), so the window stays responsive.
+    :param tk_widget: The widget used to schedule the queue polling. Usually the window that starts the task.
+    :param target: The function to run in the worker thread. It receives the task as its first parameter and its return value is passed to on_done.
+    :param args: The other parameters to pass to target.
+    :param on_items: A callback called in the main thread with a list of items sent by the job.
+    :param on_progress: A callback called in the main thread with the values (done, total) sent by the job. total is 0 if unknown.
+    :param on_done: A callback called in the main thread with the returned value of the job and the exception raised by the job (or None).
+    :param batch_size: The maximum number of messages processed by each polling.
+    :param poll_delay: The delay between two pollings, in milliseconds.
+    """
+
+    def __init__(self, tk_widget, target, args=(), on_items=None, on_progress=None, on_done=None, batch_size: int = 500, poll_delay: int = 50):
+        self.tk_widget = tk_widget
+        self.target = target
+        self.args = args
+        self.on_items = on_items
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.batch_size = batch_size
+        self.poll_delay = poll_delay
+        self._queue = queue.SimpleQueue()
+        self._cancel_event = threading.Event()
+        self._thread = None
+        self._after_id = None
+
+    @property
+    def is_running(self) -> bool:
+        """
+        Check if the job is still running.
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def is_cancelled(self) -> bool:
+        """
+        Check if the job has been cancelled. Must be checked regularly by the job.
+        """
+        return self._cancel_event.is_set()
+
+    def start(self) -> None:
+        """
+        Start the job in a worker thread and the polling of the queue in the main thread.
+        """
+        self._thread = threading.Thread(target=self._run, name=f'BackgroundTask-{self.target.__name__}', daemon=True)
+        self._thread.start()
+        self._after_id = self.tk_widget.after(self.poll_delay, self._poll)
+
+    def cancel(self) -> None:
+        """
+        Ask the job to stop. The job stops at its next check of is_cancelled, on_done is still called.
+        """
+        self._cancel_event.set()
+
+    def stop_polling(self) -> None:
+        """
+        Cancel the job and stop the polling of the queue. Must be called before destroying tk_widget.
+        """
+        self.cancel()
+        if self._after_id is not None:
+            self.tk_widget.after_cancel(self._after_id)
+            self._after_id = None
+
+    def put(self, item) -> None:
+        """
+        Send an item to the main thread. Called by the job.
+        :param item: The item to send.
+        """
+        self._queue.put(('item', item))
+
+    def progress(self, done: int, total: int = 0) -> None:
+        """
+        Send the progress of the job to the main thread. Called by the job.
+        :param done: The number of elements done.
+        :param total: The total number of elements, 0 if unknown.
+        """
+        self._queue.put(('progress', (done, total)))
+
+    def _run(self) -> None:
+        """
+        Run the job in the worker thread.
+        """
+        result = None
+        error = None
+        try:
+            result = self.target(self, *self.args)
+        except Exception as exception:
+            error = exception
+        self._queue.put(('done', (result, error)))
+
+    def _poll(self) -> None:
+        """
+        Process the messages sent by the job, by batches. Run in the main thread.
+        """
+        self._after_id = None
+        items = []
+        last_progress = None
+        done = None
+        for _ in range(self.batch_size):
+            try:
+                kind, value = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'item':
+                items.append(value)
+            elif kind == 'progress':
+                last_progress = value  # only the last progress value is useful
+            else:
+                done = value
+                break
+        if items and self.on_items is not None:
+            self.on_items(items)
+        if last_progress is not None and self.on_progress is not None:
+            self.on_progress(*last_progress)
+        if done is not None:
+            if self.on_done is not None:
+                self.on_done(*done)
+            return
+        self._after_id = self.tk_widget.after(self.poll_delay, self._poll)
@@ -0,0 +1,87 @@
+# coding=utf-8
+"""
+Implementation for:
+- BuildIdJournal: A journal of the original BuildId values of the files changed by a run, used to roll back the run.
+"""
+import json
+import os
+import time
+
+from modules.functions import atomic_write
+
+# status of the journal
+JOURNAL_PENDING = 'pending'  # written before the files are changed. If a run stops in this state, some files have been changed
+JOURNAL_APPLIED = 'applied'  # all the files of the run have been processed
+JOURNAL_ROLLED_BACK = 'rolled_back'  # the files have been restored
+
+
+class BuildIdJournal:
+    """
+    A journal of the original BuildId values of the files changed by a run, used to roll back the run.
+    Only the last run is kept. The journal is written (atomically) before any file is changed.
+    For each file, it stores the original BuildId value or, if the file had no BuildId key, its original content.
+    :param journal_file: The file of the journal.
+    """
+
+    def __init__(self, journal_file: str):
+        self.journal_file = journal_file
+        self.data = {}
+
+    def load(self) -> bool:
+        """
+        Load the journal of the last run.
+        :return: True if a journal has been loaded.
+        """
+        self.data = {}
+        if not os.path.isfile(self.journal_file):
+            return False
+        try:
+            with open(self.journal_file, 'r', encoding='utf-8') as file:
+                self.data = json.load(file)
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def save(self) -> None:
+        """
+        Save the journal, atomically.
+        """
+        os.makedirs(os.path.dirname(self.journal_file), exist_ok=True)
+        atomic_write(self.journal_file, json.dumps(self.data, indent=2).encode('utf-8'))
+
+    def start(self, build_id: str, files: list) -> None:
+        """
+        Write the journal of a new run, before any file is changed.
+        :param build_id: The Build ID written by the run.
+        :param files: A list of dict {'path': file path, 'old_build_id': original value or None, 'original': original content if old_build_id is None}.
+        """
+        self.data = {'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'build_id': build_id, 'status': JOURNAL_PENDING, 'files': files}
+        self.save()
+
+    def set_status(self, status: str) -> None:
+        """
+        Change the status of the journal and save it.
+        :param status: The new status.
+        """
+        self.data['status'] = status
+        self.save()
+
+    @property
+    def status(self) -> str:
+        """
+        The status of the journal, or an empty string if no journal has been loaded.
+        """
+        return self.data.get('status', '')
+
+    @property
+    def files(self) -> list:
+        """
+        The files changed by the run.
+        """
+        return self.data.get('files', [])
+
+    def can_rollback(self) -> bool:
+        """
+        Check if the last run can be rolled back.
+        """
+        return self.status in (JOURNAL_PENDING, JOURNAL_APPLIED) and len(self.files) > 0
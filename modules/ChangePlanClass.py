@@ -0,0 +1,149 @@
+# coding=utf-8
+"""
+Implementation for:
+- ChangePlan: A structured change set produced by the plan (dry-run) stage of a tool, that can be reviewed, exported and executed later.
+"""
+import json
+import os
+import time
+
+from modules.functions import atomic_write, format_size
+
+# actions of the items of a plan
+ACTION_DELETE = 'delete'  # a folder to clean
+ACTION_PRUNE = 'prune'  # a cache folder whose least recently used files are evicted, see FolderPruner
+ACTION_UPDATE = 'update'  # a file whose BuildId will be changed
+ACTION_UP_TO_DATE = 'up_to_date'  # a file that already has the right BuildId
+ACTION_FAILED = 'failed'  # a file that could not be read
+
+plan_version = 1
+
+
+class ChangePlan:
+    """
+    A structured change set produced by the plan (dry-run) stage of a tool, that can be reviewed, exported and executed later.
+    Each item stores the modification time of its path when the plan was made.
+    The plan can be executed without scanning again as long as none of these modification times has changed, see get_stale_items().
+    :param tool: The name of the tool that made the plan.
+    """
+
+    def __init__(self, tool: str = ''):
+        self.tool = tool
+        self.created = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.parameters = {}  # the parameters of the plan, ie. the scanned folder
+        self.items = []  # list of dict {'action', 'path', 'mtime_ns', ...}
+
+    def add(self, action: str, path: str, **values) -> dict:
+        """
+        Add an item to the plan. The current modification time of the path is stored with the item.
+        :param action: The action of the item.
+        :param path: The path of the folder or file.
+        :param values: The other values of the item, ie. bytes and files for a folder, old_build_id and new_build_id for a file.
+        :return: The item.
+        """
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        item = {'action': action, 'path': path, 'mtime_ns': mtime_ns, **values}
+        self.items.append(item)
+        return item
+
+    def get_items(self, action: str) -> list:
+        """
+        Get the items of the plan with a given action.
+        :param action: The action.
+        """
+        return [item for item in self.items if item['action'] == action]
+
+    def get_stale_items(self) -> list:
+        """
+        Get the items whose path has changed (or has been removed) since the plan was made. If any, the plan must be made again.
+        """
+        stale_items = []
+        for item in self.items:
+            try:
+                mtime_ns = os.stat(item['path']).st_mtime_ns
+            except OSError:
+                mtime_ns = None
+            if mtime_ns != item['mtime_ns']:
+                stale_items.append(item)
+        return stale_items
+
+    def to_dict(self) -> dict:
+        """
+        Get the plan as a dict, ie. to export it as JSON.
+        """
+        return {'version': plan_version, 'tool': self.tool, 'created': self.created, 'parameters': self.parameters, 'items': self.items}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """
+        Create a plan from a dict made by to_dict().
+        :param data: The dict.
+        :return: The plan.
+        """
+        if data.get('version') != plan_version:
+            raise ValueError(f'Unsupported plan version: {data.get("version")}')
+        plan = cls(data['tool'])
+        plan.created = data['created']
+        plan.parameters = data.get('parameters', {})
+        plan.items = data['items']
+        return plan
+
+    def save(self, filename: str) -> None:
+        """
+        Save the plan to a JSON file, atomically.
+        :param filename: The file.
+        """
+        folder = os.path.dirname(filename)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        atomic_write(filename, json.dumps(self.to_dict(), indent=2).encode('utf-8'))
+
+    @classmethod
+    def load(cls, filename: str):
+        """
+        Load a plan from a JSON file.
+        :param filename: The file.
+        :return: The plan.
+        """
+        with open(filename, 'r', encoding='utf-8') as file:
+            return cls.from_dict(json.load(file))
+
+    def to_text(self) -> str:
+        """
+        Get the plan as a readable report, to be displayed in the results pane.
+        """
+        text = f'\n###########\nPLAN {self.tool} ({self.created})\n###########\n'
+        for name, value in self.parameters.items():
+            text += f'{name}: {value}\n'
+        folders = self.get_items(ACTION_DELETE)
+        if folders:
+            total = sum(item.get('bytes', 0) for item in folders)
+            text += f'\nFolders to clean: {len(folders)}, {format_size(total)}\n'
+            text += ''.join(f'    {format_size(item.get("bytes", 0)):>10} {item.get("files", 0):>8} files  {item["path"]}\n' for item in folders)
+        pruned = self.get_items(ACTION_PRUNE)
+        if pruned:
+            total = sum(item.get('bytes', 0) for item in pruned)
+            kept = sum(item.get('kept_bytes', 0) for item in pruned)
+            text += f'\nFolders to prune: {len(pruned)}, {format_size(total)} to free, {format_size(kept)} kept\n'
+            text += ''.join(
+                f'    {format_size(item.get("bytes", 0)):>10} {item.get("files", 0):>8} files  {item["path"]}\n'
+                f'        kept: {format_size(item.get("kept_bytes", 0))}, {item.get("kept_files", 0)} files\n' for item in pruned
+            )
+        updates = self.get_items(ACTION_UPDATE)
+        if updates:
+            text += f'\nFiles to update: {len(updates)}\n'
+            text += ''.join(f'    {item["path"]}\n        {item.get("old_build_id") or "(no BuildId)"} -> {item["new_build_id"]}\n' for item in updates)
+        up_to_date = self.get_items(ACTION_UP_TO_DATE)
+        if up_to_date:
+            text += f'\nFiles already up to date: {len(up_to_date)}\n'
+            text += ''.join(f'    {item["path"]}\n' for item in up_to_date)
+        failed = self.get_items(ACTION_FAILED)
+        if failed:
+            text += f'\nFiles that could not be read: {len(failed)}\n'
+            text += ''.join(f'    {item["path"]}\n' for item in failed)
+        if not self.items:
+            text += 'Nothing to do.\n'
+        return text
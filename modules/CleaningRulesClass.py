@@ -0,0 +1,247 @@
+# coding=utf-8
+"""
+Implementation for:
+- CleaningRules: The compiled include/exclude rules that select the folders to find, with per-project ignore files.
+"""
+import os
+import re
+from fnmatch import fnmatchcase
+
+# the default rules of the tools. They can be changed in the configuration file
+default_include_patterns = ['Binaries', 'Build', 'DerivedDataCache', 'Intermediate']
+# folders that never contain anything to clean or to update and that can be very large
+default_names_to_skip = ['.git', '.svn', '.vs', '.idea', 'Saved', '__pycache__']
+# folders that can't contain a plugin
+default_plugin_skip_patterns = ['Binaries', 'Build', 'DerivedDataCache', 'Intermediate', 'Saved', 'ThirdParty'] + default_names_to_skip
+
+# the name of the ignore file of a project. Each line is an exclude pattern, or an include pattern if it starts with '!'. The lines starting with '#' are comments
+ignore_filename = '.uetoolsignore'
+
+_regex_prefix = 're:'
+_glob_chars = frozenset('*?[')
+_regex_flags = re.IGNORECASE if os.name == 'nt' else 0
+
+
+def _to_posix(path: str) -> str:
+    return path.replace('\\', '/') if os.sep == '\\' else path
+
+
+def glob_to_regex(pattern: str, base: str = '') -> str:
+    """
+    Convert a pattern to a regular expression searched in the full path of a folder, with '/' as separator.
+    A pattern is a glob ('*' matches a name part, '**' any number of folders, '?' a character) matched against the last folders of the path,
+    ie. 'Plugins/*/Intermediate', or against the path from the base folder if it starts with '/'. A pattern starting with 're:' is a regular expression.
+    :param pattern: The pattern.
+    :param base: The folder the pattern is relative to, ie. the folder of an ignore file. If '', the pattern applies to any folder.
+    :return: The regular expression.
+    """
+    if pattern.startswith(_regex_prefix):
+        regex = pattern[len(_regex_prefix):]
+        return re.escape(_to_posix(base)) + '/' + regex if base else regex
+    is_anchored = pattern.startswith('/')
+    pattern = pattern.strip('/')
+    parts = []
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if pattern.startswith('**/', index):
+            parts.append('(?:.*/)?')
+            index += 3
+            continue
+        if pattern.startswith('**', index):
+            parts.append('.*')
+            index += 2
+            continue
+        if char == '*':
+            parts.append('[^/]*')
+        elif char == '?':
+            parts.append('[^/]')
+        elif char == '[':
+            end = pattern.find(']', index + 1)
+            if end < 0:
+                parts.append(re.escape(char))
+            else:
+                content = pattern[index + 1:end]
+                parts.append('[' + ('^' + content[1:] if content.startswith('!') else content) + ']')
+                index = end
+        else:
+            parts.append(re.escape(char))
+        index += 1
+    regex = ''.join(parts) + '$'
+    if base:
+        return re.escape(_to_posix(base)) + ('/' if is_anchored else '/(?:.*/)?') + regex
+    return ('^' if is_anchored else '(?:^|/)') + regex
+
+
+def _is_plain_name(pattern: str) -> bool:
+    return '/' not in pattern and not pattern.startswith(_regex_prefix) and not _glob_chars.intersection(pattern)
+
+
+class CleaningRules:
+    """
+    The compiled include/exclude rules that select the folders to find (ie. the folders to clean), and the folders not to visit.
+    The patterns are compiled once: the plain names go in sets, all the other patterns in one regular expression for the includes and one for the excludes,
+    so checking a folder costs the same with one rule or with dozens.
+    A folder is found if it matches an include pattern and no exclude pattern. Its sub folders are not visited.
+    A folder is visited if it's not found, not excluded and its name is not in the names to skip.
+    The rules of a project can be changed by an ignore file (see ignore_filename) in the project folder: its patterns only apply to the folders under it.
+    :param include: The include patterns, see glob_to_regex().
+    :param exclude: The exclude patterns.
+    :param skip: The names of the folders never visited. The folders named in the include patterns (ie. 'Saved' for 'Saved/Logs') are visited anyway.
+    """
+
+    def __init__(self, include=None, exclude=None, skip=None):
+        self.include = list(default_include_patterns if include is None else include)
+        self.exclude = list(exclude or [])
+        self.skip = list(default_names_to_skip if skip is None else skip)
+        self._include_sources = [glob_to_regex(pattern) for pattern in self.include if not _is_plain_name(pattern)]
+        self._exclude_sources = [glob_to_regex(pattern) for pattern in self.exclude if not _is_plain_name(pattern)]
+        self.include_names = frozenset(pattern for pattern in self.include if _is_plain_name(pattern))
+        self.exclude_names = frozenset(pattern for pattern in self.exclude if _is_plain_name(pattern))
+        # the folders of the include patterns must be visited to find them, ie. ('Saved',) for 'Saved/Logs'
+        self.include_prefixes = self._get_include_prefixes(self.include)
+        # the prefixes of the include patterns of the ignore files, relative to the folder of each file: {folder + os.sep: prefixes}, see with_ignore_file()
+        self.folder_include_prefixes = {}
+        self.skip_names = frozenset(self.skip).difference(part for prefix in self.include_prefixes for part in prefix)
+        self._compile()
+        self._children = {}  # {folder: (mtime_ns of the ignore file, CleaningRules of the ignore file of the folder)}
+
+    @staticmethod
+    def _get_include_prefixes(patterns: list) -> frozenset:
+        """
+        Get the folders that lead to the folders of some include patterns, ie. ('Saved',) for 'Saved/Logs'. The regular expressions are ignored.
+        :param patterns: The include patterns.
+        :return: The names of the folders of each pattern, without its last name.
+        """
+        return frozenset(tuple(pattern.strip('/').split('/')[:-1]) for pattern in patterns if '/' in pattern.strip('/') and not pattern.startswith(_regex_prefix))
+
+    def _compile(self) -> None:
+        """
+        Compile the patterns that are not plain names into one regular expression for the includes and one for the excludes.
+        """
+        self._include_regex = re.compile('|'.join(f'(?:{source})' for source in self._include_sources), _regex_flags) if self._include_sources else None
+        self._exclude_regex = re.compile('|'.join(f'(?:{source})' for source in self._exclude_sources), _regex_flags) if self._exclude_sources else None
+
+    def is_match(self, parent: str, name: str) -> bool:
+        """
+        Check if a folder is a folder to find.
+        :param parent: The path of the parent folder.
+        :param name: The name of the folder.
+        """
+        if name in self.exclude_names:
+            return False
+        path = None
+        if name not in self.include_names:
+            if self._include_regex is None:
+                return False
+            path = _to_posix(os.path.join(parent, name))
+            if self._include_regex.search(path) is None:
+                return False
+        if self._exclude_regex is None:
+            return True
+        return self._exclude_regex.search(path or _to_posix(os.path.join(parent, name))) is None
+
+    def should_visit(self, parent: str, name: str) -> bool:
+        """
+        Check if a folder that is not a folder to find must be visited.
+        :param parent: The path of the parent folder.
+        :param name: The name of the folder.
+        """
+        if name in self.skip_names or name in self.exclude_names:
+            return False
+        return self._exclude_regex is None or self._exclude_regex.search(_to_posix(os.path.join(parent, name))) is None
+
+    def is_include_prefix(self, parts: tuple, folder: str = '') -> bool:
+        """
+        Check if a folder under a project can contain a folder to find, because its path from the project is the start of an include pattern,
+        ie. ('Saved',) for 'Saved/Logs'. It's used by the project-aware search, which only visits these folders of a project. The regular expressions are not checked.
+        The include patterns of an ignore file are checked against the path of the folder from the folder of the ignore file.
+        :param parts: The names of the folders from the project folder to the folder.
+        :param folder: The path of the folder. If '', the include patterns of the ignore files are not checked.
+        """
+        if self._is_prefix_of(parts, self.include_prefixes):
+            return True
+        for base, prefixes in self.folder_include_prefixes.items():
+            if folder.startswith(base) and self._is_prefix_of(tuple(folder[len(base):].split(os.sep)), prefixes):
+                return True
+        return False
+
+    @staticmethod
+    def _is_prefix_of(parts: tuple, prefixes: frozenset) -> bool:
+        """
+        Check if the names of some folders are the start of one of the prefixes of the include patterns.
+        :param parts: The names of the folders.
+        :param prefixes: The prefixes, see _get_include_prefixes().
+        """
+        for prefix in prefixes:
+            if '**' in prefix:
+                return True
+            if len(prefix) >= len(parts) and all(fnmatchcase(name, pattern) for name, pattern in zip(parts, prefix)):
+                return True
+        return False
+
+    def with_ignore_file(self, folder: str) -> 'CleaningRules':
+        """
+        Get the rules that apply under a folder that contains an ignore file. The result is cached until the ignore file changes.
+        :param folder: The folder.
+        :return: The rules, or these rules if the ignore file can't be read or is empty.
+        """
+        filename = os.path.join(folder, ignore_filename)
+        try:
+            mtime_ns = os.stat(filename).st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        cached = self._children.get(folder)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+        include = []
+        exclude = []
+        include_patterns = []
+        try:
+            with open(filename, 'r', encoding='utf-8') as file:
+                for line in file:
+                    line = line.strip()
+                    if not line or line.startswith('#'):
+                        continue
+                    if line.startswith('!'):
+                        include.append(glob_to_regex(line[1:], base=folder))
+                        include_patterns.append(line[1:])
+                    else:
+                        exclude.append(glob_to_regex(line, base=folder))
+        except (OSError, UnicodeDecodeError):
+            pass
+        if not include and not exclude:
+            rules = self
+        else:
+            rules = CleaningRules.__new__(CleaningRules)
+            rules.__dict__.update(self.__dict__)
+            rules._include_sources = self._include_sources + include
+            rules._exclude_sources = self._exclude_sources + exclude
+            rules._compile()
+            rules._children = {}
+            # the folders that lead to the includes of the file must be visited, even if their names are skipped (ie. Saved for '!Saved/Logs')
+            prefixes = self._get_include_prefixes(include_patterns)
+            if prefixes:
+                rules.folder_include_prefixes = dict(self.folder_include_prefixes)
+                rules.folder_include_prefixes[os.path.normpath(folder) + os.sep] = prefixes
+                rules.skip_names = self.skip_names.difference(part for prefix in prefixes for part in prefix)
+        self._children[folder] = (mtime_ns, rules)
+        return rules
+
+    def get_folder_rules(self, root: str, folder: str) -> 'CleaningRules':
+        """
+        Get the rules that apply to the sub folders of a folder, reading the ignore files of the folders between the root and the folder.
+        It's used when the folders are not visited from the root, ie. for a folder created after a scan.
+        :param root: The folder the scan started from.
+        :param folder: The folder, under the root.
+        """
+        root = os.path.normpath(root)
+        folder = os.path.normpath(folder)
+        parent = os.path.dirname(folder)
+        if folder == root or not folder.startswith(root + os.sep) or parent == folder:
+            rules = self
+        else:
+            rules = self.get_folder_rules(root, parent)
+        if os.path.isfile(os.path.join(folder, ignore_filename)):
+            rules = rules.with_ignore_file(folder)
+        return rules
@@ -0,0 +1,200 @@
+# coding=utf-8
+"""
+Implementation for:
+- ConfigStore: The process-wide store of the configuration values of all the tools.
+- get_config_store: Get the shared ConfigStore of a configuration file.
+"""
+import atexit
+import configparser
+import io
+import json
+import os
+import threading
+
+from modules.functions import atomic_write, FileLock
+
+# delay between the last change of a value and the save of the configuration file, in seconds
+default_save_delay = 1.0
+
+_stores = {}  # {config file: ConfigStore}
+_stores_lock = threading.Lock()
+
+
+def to_text(value) -> str:
+    """
+    Convert a typed value to the text stored in the configuration file.
+    :param value: The value: str, int, float, bool, list or tuple.
+    :return: The text.
+    """
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (list, tuple)):
+        return json.dumps(list(value))
+    return str(value)
+
+
+def from_text(text: str, default):
+    """
+    Convert a text read from the configuration file to the type of the default value.
+    :param text: The text.
+    :param default: The default value, returned if the text can't be converted. Its type is the type of the result.
+    :return: The typed value.
+    """
+    try:
+        if isinstance(default, bool):
+            return text.strip().lower() in ('1', 'true', 'yes', 'on')
+        if isinstance(default, int):
+            return int(text)
+        if isinstance(default, float):
+            return float(text)
+        if isinstance(default, (list, tuple)):
+            value = json.loads(text) if text.strip().startswith('[') else [line for line in text.splitlines() if line.strip()]
+            return list(value) if isinstance(value, list) else default
+    except ValueError:
+        return default
+    return text
+
+
+class ConfigStore:
+    """
+    The process-wide store of the configuration values of all the tools. Use get_config_store() to get it.
+    The file is loaded once and serves all the sections. The changes are kept in memory and saved after a delay, so a burst of changes
+    (ie. a value set on each keystroke) is written only once.
+    A save merges the changed values into the current content of the file, under a lock shared with the other processes,
+    so two tools or two instances of the application never overwrite each other's values. The file is written atomically.
+    :param config_file: The configuration file.
+    :param save_delay: The delay between the last change and the save, in seconds. If 0, the values are saved on flush() only.
+    """
+
+    def __init__(self, config_file: str, save_delay: float = default_save_delay):
+        self.config_file = config_file
+        self.save_delay = save_delay
+        self.values = {}  # {section: {option: text}}
+        self.saves = 0  # number of times the file has been written
+        self._changed = {}  # {section: {option: text}}, the values changed since the last save
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()  # one save at a time, so an older content never replaces a newer one
+        self._timer = None
+        self.load()
+
+    def _read_file(self) -> dict:
+        """
+        Read the configuration file.
+        :return: The values: {section: {option: text}}.
+        """
+        parser = configparser.ConfigParser(interpolation=None)
+        try:
+            parser.read(self.config_file, encoding='utf-8')
+        except configparser.Error:
+            return {}
+        return {section: dict(parser.items(section)) for section in parser.sections()}
+
+    def load(self) -> None:
+        """
+        Load the values from the configuration file. The changes not saved yet are kept.
+        """
+        values = self._read_file()
+        with self._lock:
+            for section, options in self._changed.items():
+                values.setdefault(section, {}).update(options)
+            self.values = values
+
+    def get(self, section: str, option: str, default=None):
+        """
+        Get a value.
+        :param section: The section of the tool.
+        :param option: The option.
+        :param default: The value returned if the option is not set. If not None, the value is converted to its type.
+        :return: The value.
+        """
+        with self._lock:
+            text = self.values.get(section, {}).get(option)
+        if text is None:
+            return default
+        return text if default is None else from_text(text, default)
+
+    def set(self, section: str, option: str, value) -> None:
+        """
+        Set a value. The configuration file is saved after a delay.
+        :param section: The section of the tool.
+        :param option: The option.
+        :param value: The value: str, int, float, bool, list or tuple.
+        """
+        text = to_text(value)
+        with self._lock:
+            if self.values.get(section, {}).get(option) == text:
+                return
+            self.values.setdefault(section, {})[option] = text
+            self._changed.setdefault(section, {})[option] = text
+            self._schedule_save()
+
+    def _schedule_save(self) -> None:
+        """
+        Save the file after the delay, or restart the delay if a save is already scheduled.
+        """
+        if self.save_delay <= 0:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.save_delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def flush(self) -> None:
+        """
+        Save the changed values now, if any.
+        The changes are merged into the current content of the file under a file lock, and the file is written atomically.
+        The values changed by other processes are read back.
+        The store is not locked while waiting for the file lock: set() is called by the tk variables, it must never wait for another process.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                changed = self._changed
+                self._changed = {}
+            if not changed:
+                return
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.config_file)), exist_ok=True)
+                with FileLock(self.config_file + '.lock'):
+                    values = self._read_file()
+                    for section, options in changed.items():
+                        values.setdefault(section, {}).update(options)
+                    parser = configparser.ConfigParser(interpolation=None)
+                    parser.read_dict(values)
+                    content = io.StringIO()
+                    parser.write(content)
+                    atomic_write(self.config_file, content.getvalue().encode('utf-8'))
+            except BaseException:
+                # not saved: the changes are saved by the next flush, unless they have been changed again since
+                with self._lock:
+                    for section, options in changed.items():
+                        for option, text in options.items():
+                            self._changed.setdefault(section, {}).setdefault(option, text)
+                raise
+            with self._lock:
+                # the values set while the file was written are kept, they are saved by the next flush
+                for section, options in self._changed.items():
+                    values.setdefault(section, {}).update(options)
+                self.values = values
+                self.saves += 1
+
+
+def get_config_store(config_file: str = None) -> ConfigStore:
+    """
+    Get the shared ConfigStore of a configuration file. It's created on the first call and saved when the process exits.
+    :param config_file: The configuration file. If None, the default configuration file is used (see globals.py)
+    :return: The store.
+    """
+    if config_file is None:
+        from modules.globals import config_folder, config_filename
+        config_file = os.path.join(config_folder, config_filename)
+    with _stores_lock:
+        store = _stores.get(config_file)
+        if store is None:
+            store = ConfigStore(config_file)
+            _stores[config_file] = store
+            atexit.register(store.flush)
+        return store
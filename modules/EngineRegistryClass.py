@@ -0,0 +1,190 @@
+# coding=utf-8
+"""
+Implementation for:
+- EngineRegistry: A persistent registry of the engine installs and of their Build IDs.
+"""
+import json
+import os
+from collections import Counter
+from typing import Callable
+
+from modules.FolderScannerClass import FolderScanner, default_names_to_skip
+from modules.functions import atomic_write
+
+# folders of an engine that never contain a .modules file with the engine Build ID, they are not visited
+engine_names_to_skip = [
+    'Build', 'Config', 'Content', 'DerivedDataCache', 'Documentation', 'Extras', 'Intermediate', 'Marketplace', 'Programs', 'Resources', 'Shaders', 'Source', 'ThirdParty'
+] + default_names_to_skip
+
+
+class EngineRegistry:
+    """
+    A persistent registry of the engine installs and of their Build IDs.
+    The Build ID of an engine is read from all the .modules files of the engine (not from a single hard-coded plugin), and checked for consistency:
+    the most common value is used and the files with another value are listed.
+    The values are cached with the modification time of each file. If none of the files has changed, the engine folder is not scanned again.
+    :param registry_file: The file used to save the registry between two runs. If None, the registry is only kept in memory.
+    """
+
+    def __init__(self, registry_file: str = None):
+        self.registry_file = registry_file
+        # {engine folder: {'plugins_folder': str, 'build_id': str, 'files': {modules file: [mtime_ns, build_id]}, 'inconsistent_files': [modules file]}}
+        self.entries = {}
+        self.error_list = []
+        self.load()
+
+    def load(self) -> None:
+        """
+        Load the registry from the registry file.
+        """
+        if self.registry_file is None or not os.path.isfile(self.registry_file):
+            return
+        try:
+            with open(self.registry_file, 'r', encoding='utf-8') as file:
+                self.entries = json.load(file)['engines']
+        except (OSError, ValueError, KeyError, TypeError):
+            self.entries = {}
+
+    def save(self) -> None:
+        """
+        Save the registry to the registry file.
+        """
+        if self.registry_file is None:
+            return
+        os.makedirs(os.path.dirname(self.registry_file), exist_ok=True)
+        # a crash or a concurrent reader never sees a truncated registry, which would be thrown away
+        atomic_write(self.registry_file, json.dumps({'engines': self.entries}, indent=2).encode('utf-8'))
+
+    @staticmethod
+    def get_engine_root(engine_folder: str) -> str:
+        """
+        Get the 'Engine' folder of an engine install. The install folder (ie. 'UE_5.2') and its 'Engine' sub folder are both accepted.
+        :param engine_folder: The engine folder.
+        :return: The normalized path of the 'Engine' folder.
+        """
+        engine_folder = os.path.normpath(engine_folder)
+        sub_folder = os.path.join(engine_folder, 'Engine')
+        return sub_folder if os.path.isdir(sub_folder) else engine_folder
+
+    @property
+    def engine_folders(self) -> list:
+        """
+        The folders of the registered engines, sorted.
+        """
+        return sorted(self.entries)
+
+    def add(self, engine_folder: str, plugins_folder: str = None) -> dict:
+        """
+        Register an engine. If it's already registered, its plugins folder is updated.
+        :param engine_folder: The engine folder.
+        :param plugins_folder: The folder that contains the plugins to update for this engine. If None, the 'Plugins/Marketplace' folder of the engine is used.
+        :return: The entry of the engine.
+        """
+        engine_root = self.get_engine_root(engine_folder)
+        entry = self.entries.setdefault(engine_root, {'plugins_folder': '', 'build_id': '', 'files': {}, 'inconsistent_files': []})
+        if plugins_folder:
+            entry['plugins_folder'] = os.path.normpath(plugins_folder)
+        elif not entry['plugins_folder']:
+            entry['plugins_folder'] = os.path.join(engine_root, 'Plugins', 'Marketplace')
+        return entry
+
+    def remove(self, engine_folder: str) -> bool:
+        """
+        Unregister an engine.
+        :param engine_folder: The engine folder.
+        :return: True if the engine was registered.
+        """
+        return self.entries.pop(self.get_engine_root(engine_folder), None) is not None
+
+    def get_entry(self, engine_folder: str):
+        """
+        Get the entry of a registered engine.
+        :param engine_folder: The engine folder.
+        :return: The entry of the engine, or None if the engine is not registered.
+        """
+        return self.entries.get(self.get_engine_root(engine_folder))
+
+    def find_modules_files(self, engine_root: str, excluded_folder: str = None, should_stop: Callable[[], bool] = None) -> list:
+        """
+        Find the .modules files of an engine. Only the 'Binaries' folders are read, the large folders of the engine (Source, Content...) are not visited.
+        :param engine_root: The 'Engine' folder of the engine.
+        :param excluded_folder: A folder whose files are ignored, ie. the folder of the plugins to update.
+        :param should_stop: A function called regularly. If it returns True, the search stops.
+        :return: The paths of the .modules files.
+        """
+        excluded_prefix = os.path.normpath(excluded_folder) + os.sep if excluded_folder else None
+        scanner = FolderScanner(names_to_find=['Binaries'], names_to_skip=engine_names_to_skip)
+        modules_files = []
+        for binaries_folder in scanner.scan(engine_root, should_stop=should_stop):
+            if excluded_prefix is not None and binaries_folder.startswith(excluded_prefix):
+                continue
+            try:
+                with os.scandir(binaries_folder) as platforms:
+                    platform_folders = [entry.path for entry in platforms if entry.is_dir(follow_symlinks=False)]
+                for platform_folder in platform_folders:
+                    with os.scandir(platform_folder) as entries:
+                        modules_files.extend(entry.path for entry in entries if entry.name.endswith('.modules') and entry.is_file())
+            except OSError as error:
+                self.error_list.append(f'Could not scan {binaries_folder}: error {error!r}')
+        self.error_list.extend(scanner.error_list)
+        return modules_files
+
+    @staticmethod
+    def _read_build_id(modules_file: str) -> str:
+        """
+        Read the BuildId of a .modules file.
+        :param modules_file: The path to the file.
+        :return: The Build ID, or an empty string if the file has no BuildId.
+        """
+        with open(modules_file, 'r', encoding='utf-8-sig') as file:
+            return json.load(file).get('BuildId', '')
+
+    def _is_cache_valid(self, entry: dict) -> bool:
+        """
+        Check if the cached Build ID of an engine is still valid, ie. none of its .modules files has changed.
+        :param entry: The entry of the engine.
+        """
+        if not entry['build_id'] or not entry['files']:
+            return False
+        for modules_file, (mtime_ns, _build_id) in entry['files'].items():
+            try:
+                if os.stat(modules_file).st_mtime_ns != mtime_ns:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def get_build_id(self, engine_folder: str, rescan: bool = False, should_stop: Callable[[], bool] = None) -> str:
+        """
+        Get the Build ID of an engine. The engine is registered if it's not already.
+        :param engine_folder: The engine folder.
+        :param rescan: Whether to scan the engine folder again even if none of its .modules files has changed.
+        :param should_stop: A function called regularly. If it returns True, the search stops.
+        :return: The Build ID, or an empty string if it could not be read.
+        """
+        entry = self.add(engine_folder)
+        if not rescan and self._is_cache_valid(entry):
+            return entry['build_id']
+
+        engine_root = self.get_engine_root(engine_folder)
+        cached_files = entry['files']
+        files = {}
+        for modules_file in self.find_modules_files(engine_root, excluded_folder=entry['plugins_folder'], should_stop=should_stop):
+            try:
+                mtime_ns = os.stat(modules_file).st_mtime_ns
+                cached = cached_files.get(modules_file)
+                build_id = cached[1] if cached is not None and cached[0] == mtime_ns else self._read_build_id(modules_file)
+            except (OSError, ValueError, AttributeError) as error:
+                self.error_list.append(f'Could not read {modules_file}: error {error!r}')
+                continue
+            if build_id:
+                files[modules_file] = [mtime_ns, build_id]
+
+        counts = Counter(build_id for _mtime_ns, build_id in files.values())
+        build_id = counts.most_common(1)[0][0] if counts else ''
+        entry['build_id'] = build_id
+        entry['files'] = files
+        entry['inconsistent_files'] = sorted(modules_file for modules_file, (_mtime_ns, value) in files.items() if value != build_id)
+        if not build_id:
+            self.error_list.append(f'Could not find any .modules file with a BuildId in {engine_root}.\nThe engine path is probably wrong.')
+        return build_id
@@ -3,8 +3,9 @@
 Implementation for:
 - FolderCleaner: A window to clean UE projects from build and intermediate folders.
 """
+import itertools
 import os
-import shutil
+import time
 import tkinter as tk
 from tkinter import ttk, messagebox as messagebox
 # https://ttkwidgets.readthedocs.io/en/sphinx_doc/ttkwidgets
@@ -15,43 +16,109 @@ import ttkwidgets as ttkw
 # noinspection PyUnresolvedReferences
 from ttkwidgets import tooltips
 
+from modules.BackgroundTaskClass import BackgroundTask
+from modules.ChangePlanClass import ChangePlan
+from modules.CleaningRulesClass import CleaningRules, default_include_patterns, default_names_to_skip
+from modules.FolderCleanerEngineClass import FolderCleanerEngine
+from modules.FolderDeleterClass import default_delete_workers
+from modules.FolderPrunerClass import FolderPruner, default_prune_patterns, default_prune_max_size, default_prune_max_days, PRUNE_BY_ACCESS
+from modules.FolderSizerClass import default_size_workers
+from modules.FolderTrashClass import FolderTrash, default_trash_max_size, default_trash_max_days
+from modules.FolderTreeModelClass import FolderTreeModel, CHECKED, UNCHECKED, TRISTATE
+from modules.ResultLogClass import ResultLog
 from modules.ToolConfigClass import ToolConfig
-from modules.functions import browse_folder
-from modules.globals import config_folder, config_filename
+from modules.functions import browse_folder, format_size
+from modules.globals import config_folder, config_filename, scan_index_filename, sizes_cache_filename, plan_filename_suffix, stats_filename_suffix, profile_filename_suffix, \
+    trash_registry_filename
+
+# the check boxes displayed before the name of the rows of the treeview
+check_glyphs = {CHECKED: '\u2611', UNCHECKED: '\u2610', TRISTATE: '\u25a3'}
+# the name of the group of the folders that are not in a project
+no_project_label = '(orphans: not in a project)'
 
 
 class FolderCleaner(tk.Toplevel):
     """
     A window to clean UE projects from build and intermediate folders.
     :param master: The parent window.
-    :param display_callback: A callback function to display the result.
+    :param result_log: The log the results are written to, displayed by the main window.
+    :param scheduler: The JobScheduler of the main window. If set, the cleaning runs as a job of the main window, else in this window.
     """
 
-    def __init__(self, master, display_callback=None):
+    def __init__(self, master, result_log: ResultLog = None, scheduler=None):
         super().__init__(master)
+        self.scheduler = scheduler
         self.name = 'FolderCleaner'
         self.description = 'Clean UE projects from build and intermediate folders.'
         self.width = 500
-        self.height = 600
+        self.height = 735
         self.config_file, self.config = self.init_config(self.name)
         self.build_id = ''
-        self.result = f'\n###########\nRUNNING {self.name}\n###########\n'
-        self.display_callback = display_callback
-        self.error_list = []
+        self.engine = FolderCleanerEngine(
+            index_file=os.path.join(config_folder, scan_index_filename),
+            sizes_cache_file=os.path.join(config_folder, sizes_cache_filename),
+            delete_workers=self.config.get('delete_workers'),
+            size_workers=self.config.get('size_workers'),
+            result_log=result_log,
+            profile_file=os.path.join(config_folder, self.name + profile_filename_suffix) if self.config.get('profile') else None,
+            rules=CleaningRules(include=self.config.get('include_patterns'), exclude=self.config.get('exclude_patterns'), skip=self.config.get('skip_names')),
+            trash=FolderTrash(
+                registry_file=os.path.join(config_folder, trash_registry_filename), max_size=self.config.get('trash_max_size_gb') * 1024 ** 3, max_days=self.config.get('trash_max_days')
+            ),
+            use_trash=self.config.get('use_trash'),
+            pruner=FolderPruner(
+                patterns=self.config.get('prune_patterns'), max_size=self.config.get('prune_max_size_gb') * 1024 ** 3, max_days=self.config.get('prune_max_days'),
+                order=self.config.get('prune_by'), max_workers=self.config.get('delete_workers')
+            ),
+            use_prune=self.config.get('use_prune')
+        )
+        self.plan_file = os.path.join(config_folder, self.name + plan_filename_suffix)
+        self.stats_file = os.path.join(config_folder, self.name + stats_filename_suffix)
         self.folder_list = []  # List of ALL the folders that have been found
+        self.model = FolderTreeModel()  # the folders grouped by project, with their check state and the totals
+        self.projects_folder = ''  # the folder of the last search
+        self.project_items = {}  # {project folder: treeview item}
+        self.item_projects = {}  # {treeview item: project folder}
+        self.folder_items = {}  # {folder path: treeview item}, only for the projects that have been expanded
+        self.item_folders = {}  # {treeview item: folder path}
+        self.populated_projects = set()  # the projects whose folder rows have been created
+        self.sort_reverse = {}  # {column: True if the column is sorted in descending order}
+        self.sort_column = ''  # the column the rows are sorted by, '' if they are not sorted
 
         self.title('Projects Cleaner')
         self.resizable(False, False)
         self.geometry(f'{self.width}x{self.height}')
 
+        self.task = None  # The BackgroundTask running the current job
+        self.size_task = None  # The BackgroundTask computing the sizes of the folders found
+        self.watch_task = None  # The BackgroundTask watching the projects folder after a search
+        self.btn_find = None
         self.btn_execute = None
+        self.btn_cancel = None
+        self.btn_plan = None
+        self.btn_execute_plan = None
+        self.progress_bar = None
+        self.plan_var = tk.StringVar()
+        self.progress_var = tk.StringVar()
+        self.checked_total_var = tk.StringVar()
+        self.full_rescan_var = tk.BooleanVar(value=False)
+        self.orphans_var = tk.BooleanVar(value=self.config.get('show_orphans'))
+        self.orphans_var.trace_add('write', lambda *args: self.config.set('show_orphans', self.orphans_var.get()))
+        self.use_trash_var = tk.BooleanVar(value=self.config.get('use_trash'))
+        self.use_trash_var.trace_add('write', lambda *args: self._on_use_trash_toggled())
+        self.use_prune_var = tk.BooleanVar(value=self.config.get('use_prune'))
+        self.use_prune_var.trace_add('write', lambda *args: self._on_use_prune_toggled())
+        self.watch_var = tk.BooleanVar(value=self.config.get('watch'))
+        self.watch_var.trace_add('write', lambda *args: self._on_watch_toggled())
         self.content_tree = None  # The treeview widget, with the list of SELECTED folders
         self.projects_folder_var = tk.StringVar()
         self.projects_folder_var.trace_add("write", lambda *args: self.config.set('projects_folder', self.projects_folder_var.get()))
         self.create_widgets()
         self.bind('<Key>', self.on_key)
         self.protocol("WM_DELETE_WINDOW", self.on_close)
-        self.grab_set()  # Captures keyboard events in the Toplevel window
+        self.focus_set()  # Captures keyboard events in the Toplevel window
+        # the folders staged by the previous runs are purged once they have expired
+        self.engine.purge_trash_in_background()
 
     @staticmethod
     def init_config(section: str) -> tuple[str, ToolConfig]:
@@ -61,10 +128,25 @@ class FolderCleaner(tk.Toplevel):
         """
         defaults = {
             'projects_folder': '',  #
+            'delete_workers': default_delete_workers,  # number of threads used to delete the files
+            'size_workers': default_size_workers,  # number of threads used to compute the folder sizes
+            'profile': False,  # profile the phases with cProfile, for a deep dive (see PhaseStats)
+            'watch': False,  # keep the list of folders up to date after a search by watching the projects folder
+            'show_orphans': False,  # also list the folders to clean that are not in a project nor in a plugin
+            'use_trash': False,  # move the folders to the trash of their volume instead of deleting them, they are purged in the background (see FolderTrash)
+            'trash_max_size_gb': default_trash_max_size // 1024 ** 3,  # the size of the most recent folders kept in the trash for a restore
+            'trash_max_days': default_trash_max_days,  # the number of days a folder is kept in the trash
+            'use_prune': False,  # evict the least recently used files of the cache folders instead of deleting them (see FolderPruner)
+            'prune_patterns': default_prune_patterns,  # the folders pruned instead of being deleted, same syntax as include_patterns
+            'prune_max_size_gb': default_prune_max_size // 1024 ** 3,  # the size kept for the pruned folders of each project, 0 for no size target
+            'prune_max_days': default_prune_max_days,  # the files not used for this number of days are evicted, 0 for no age threshold
+            'prune_by': PRUNE_BY_ACCESS,  # 'access' or 'modification': the time used to find the least recently used files
+            'include_patterns': default_include_patterns,  # the folders to clean: names, globs ('Plugins/*/Intermediate', 'Saved/Logs') or 're:' regexes
+            'exclude_patterns': [],  # the folders never cleaned nor visited, same syntax. A project can add its own in its .uetoolsignore file
+            'skip_names': default_names_to_skip,  # the names of the folders never visited, unless needed by an include pattern
         }
         config_file = os.path.join(os.path.join(config_folder, config_filename))
         config = ToolConfig(init_values=defaults, section=section)
-        config.load()
         return config_file, config
 
     def create_widgets(self):
@@ -81,29 +163,61 @@ class FolderCleaner(tk.Toplevel):
         # Folder list frame
         lblf_content = ttk.LabelFrame(self, text='List of folders to clean')
         lblf_content.pack(fill=tk.X, **pack_def_options)
-        content_tree = ttkw.CheckboxTreeview(lblf_content, selectmode='extended', columns='Folder')
-        content_tree.column('#0', width=30, stretch=tk.NO)
-        content_tree.heading('#0', text='Ck', anchor=tk.W)
-        content_tree.heading('Folder', text='Subfolder', anchor=tk.CENTER)
+        # the folders are grouped by project. The rows of the folders of a project are only created when the project is expanded
+        content_tree = ttk.Treeview(lblf_content, selectmode='extended', columns=('Size', 'Files'), show='tree headings')
+        content_tree.column('#0', width=300, stretch=tk.YES)
+        content_tree.column('Size', width=70, stretch=tk.NO, anchor=tk.E)
+        content_tree.column('Files', width=60, stretch=tk.NO, anchor=tk.E)
+        content_tree.heading('#0', text='Project / Subfolder', anchor=tk.CENTER, command=lambda: self._sort_tree('Folder'))
+        content_tree.heading('Size', text='Size', anchor=tk.CENTER, command=lambda: self._sort_tree('Size'))
+        content_tree.heading('Files', text='Files', anchor=tk.CENTER, command=lambda: self._sort_tree('Files'))
+        content_tree.bind('<<TreeviewOpen>>', self._on_tree_open)
+        content_tree.bind('<Button-1>', self._on_tree_click)
+        content_tree.bind('<space>', lambda _event: self._toggle_items(self.content_tree.selection()))
+        ttk.Label(lblf_content, textvariable=self.checked_total_var).pack(side=tk.BOTTOM, fill=tk.X)
         scrollbar = ttkw.AutoHideScrollbar(lblf_content, command=content_tree.yview)
         content_tree.configure(yscrollcommand=scrollbar.set)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         content_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         self.content_tree = content_tree
+        lblf_progress = tk.LabelFrame(self, text='Progress')
+        lblf_progress.pack(fill=tk.X, **pack_def_options)
+        lblf_plan = tk.LabelFrame(self, text='Plan (preview the changes, then run the approved plan without scanning again)')
+        lblf_plan.pack(fill=tk.X, **pack_def_options)
         lblf_bottom = tk.LabelFrame(self, text='Commands')
         lblf_bottom.pack(fill=tk.X, **pack_def_options)
 
+        self.progress_bar = ttk.Progressbar(lblf_progress, orient=tk.HORIZONTAL, mode='determinate')
+        self.progress_bar.pack(side=tk.LEFT, fill=tk.X, expand=True, **pack_def_options)
+        ttk.Label(lblf_progress, textvariable=self.progress_var, width=35).pack(side=tk.LEFT, **pack_def_options)
+
         # noinspection DuplicatedCode
         entry_projects = ttk.Entry(lblf_top, textvariable=self.projects_folder_var)
         entry_projects.pack(side=tk.LEFT, fill=tk.X, expand=True, **pack_def_options)
         btn_projects = ttk.Button(lblf_top, text='Browse', command=self._browse_projects)
         btn_projects.pack(side=tk.LEFT, **pack_def_options)
+        ttk.Checkbutton(lblf_top, text='Full rescan', variable=self.full_rescan_var).pack(side=tk.LEFT, **pack_def_options)
+        ttk.Checkbutton(lblf_top, text='Orphans', variable=self.orphans_var).pack(side=tk.LEFT, **pack_def_options)
+        ttk.Checkbutton(lblf_top, text='Watch', variable=self.watch_var).pack(side=tk.LEFT, **pack_def_options)
+
+        # noinspection DuplicatedCode
+        self.btn_plan = ttk.Button(lblf_plan, text='Preview Changes', command=self.plan, state=tk.DISABLED)
+        self.btn_plan.pack(side=tk.LEFT, **pack_def_options)
+        self.btn_execute_plan = ttk.Button(lblf_plan, text='Run Approved Plan', command=self.execute_plan, state=tk.DISABLED)
+        self.btn_execute_plan.pack(side=tk.LEFT, **pack_def_options)
+        ttk.Label(lblf_plan, textvariable=self.plan_var).pack(side=tk.LEFT, fill=tk.X, expand=True, **pack_def_options)
 
         # noinspection DuplicatedCode
         ttk.Button(lblf_bottom, text='Close', command=self.close_window).pack(**pack_def_options, side=tk.RIGHT)
-        ttk.Button(lblf_bottom, text='Find folders', command=self.find, state=tk.NORMAL).pack(side=tk.LEFT, **pack_def_options)
+        self.btn_find = ttk.Button(lblf_bottom, text='Find folders', command=self.find, state=tk.NORMAL)
+        self.btn_find.pack(side=tk.LEFT, **pack_def_options)
         self.btn_execute = ttk.Button(lblf_bottom, text='Clean projects', command=self.execute, state=tk.DISABLED)
         self.btn_execute.pack(side=tk.LEFT, **pack_def_options)
+        self.btn_cancel = ttk.Button(lblf_bottom, text='Cancel', command=self.cancel, state=tk.DISABLED)
+        self.btn_cancel.pack(side=tk.LEFT, **pack_def_options)
+        ttk.Checkbutton(lblf_bottom, text='Move to trash', variable=self.use_trash_var).pack(side=tk.LEFT, **pack_def_options)
+        ttk.Checkbutton(lblf_bottom, text='Prune caches', variable=self.use_prune_var).pack(side=tk.LEFT, **pack_def_options)
+        ttk.Button(lblf_bottom, text='Trash', command=self.show_trash).pack(side=tk.LEFT, **pack_def_options)
 
         self._update_widgets_from_config()
 
@@ -112,6 +226,22 @@ class FolderCleaner(tk.Toplevel):
         Update the widgets with the configuration file values.
         """
         self.projects_folder_var.set(self.config.get('projects_folder'))
+        self._update_plan_status()
+
+    def _update_plan_status(self) -> None:
+        """
+        Show the date of the saved plan, if any, and enable the button to run it.
+        """
+        try:
+            plan = ChangePlan.load(self.plan_file)
+        except (OSError, ValueError, KeyError):
+            plan = None
+        if plan is None or plan.tool != self.name:
+            self.plan_var.set('No saved plan')
+            self.btn_execute_plan.config(state=tk.DISABLED)
+        else:
+            self.plan_var.set(f'Saved plan: {plan.created}, {len(plan.items)} folders')
+            self.btn_execute_plan.config(state=tk.NORMAL)
 
     def _browse_projects(self):
         path = browse_folder()
@@ -119,53 +249,576 @@ class FolderCleaner(tk.Toplevel):
             self.config.set('projects_folder', path)
             self.projects_folder_var.set(path)
 
-    def _find_folders(self) -> list:
+    def _find_folders(self, task: BackgroundTask, projects_folder: str, full_rescan: bool = False, include_orphans: bool = False) -> list:
         """
         Recursively find all the folder to clean from a given directory.
+        Run in a worker thread: the folders found are sent to the main thread by the task.
+        :param task: The task running this job.
+        :param projects_folder: The folder to scan.
+        :param full_rescan: Whether to invalidate the scan index before scanning.
+        :param include_orphans: Whether to find the folders that are not in a project nor in a plugin.
         :return: A list of folder paths.
         """
-        names_to_clean = ['Binaries', 'Build', 'DerivedDataCache', 'Intermediate']
-        folder_list = []
-        self.content_tree.delete(*self.content_tree.get_children())
-        for root, dirs, files in os.walk(self.config.get('projects_folder')):
-            for to_clean in names_to_clean:
-                for dir_name in dirs:
-                    if to_clean == dir_name:
-                        path = os.path.join(root, dir_name)
-                        path = os.path.normpath(path)
-                        text = path.replace('\\', '/').replace(
-                            " ", "\\ "
-                        )  # escape spaces and backslashes bnecause they can't be displayed in the treeview
-                        folder_list.append(path)
-                        # values field will be displayed in the treeview
-                        # text field are used to retrieve the path when the folder is selected
-                        self.content_tree.insert('', 'end', text=path, values=text, tags='checked')
-        return folder_list
+        # the project of each folder is found in the worker thread, by the search
+        return self.engine.find_folders(
+            projects_folder, full_rescan, should_stop=lambda: task.is_cancelled, on_found=lambda path: task.put((self.engine.get_project_root(path), path)), on_progress=task.progress,
+            include_orphans=include_orphans
+        )
+
+    def _add_folders_to_tree(self, folders: list) -> None:
+        """
+        Add a batch of folders to the model. Only the rows of the new projects are created. Run in the main thread.
+        :param folders: A list of (project folder, folder).
+        """
+        with self.engine.stats.phase('ui') as counters:
+            touched = set()
+            for project, path in folders:
+                if self.model.add(project, path):
+                    item = self.content_tree.insert('', 'end')
+                    # a placeholder row, so the project can be expanded. It's replaced by the folder rows on the first expansion
+                    self.content_tree.insert(item, 'end', text='...')
+                    self.project_items[project] = item
+                    self.item_projects[item] = project
+                elif project in self.populated_projects:
+                    self._insert_folder_row(project, path)
+                touched.add(project)
+            for project in touched:
+                self._refresh_project_row(project)
+            self._update_checked_total()
+            counters['items'] = len(folders)
+
+    def _remove_folders_from_tree(self, folders: list) -> None:
+        """
+        Remove a batch of folders from the model and their rows from the treeview. Run in the main thread.
+        :param folders: The folders to remove.
+        """
+        with self.engine.stats.phase('ui') as counters:
+            touched = set()
+            for path in folders:
+                project = self.model.remove(path)
+                if project is None:
+                    continue
+                if path in self.folder_list:
+                    self.folder_list.remove(path)
+                item = self.folder_items.pop(path, None)
+                if item is not None:
+                    del self.item_folders[item]
+                    self.content_tree.delete(item)
+                touched.add(project)
+            for project in touched:
+                if project in self.model.projects:
+                    self._refresh_project_row(project)
+                else:
+                    item = self.project_items.pop(project)
+                    del self.item_projects[item]
+                    self.content_tree.delete(item)
+                    self.populated_projects.discard(project)
+            self._update_checked_total()
+            counters['items'] = len(folders)
+
+    def _get_project_name(self, project: str) -> str:
+        """
+        Get the name of a project displayed in the treeview: its path relative to the scanned folder.
+        :param project: The project folder.
+        """
+        if not project:
+            return no_project_label
+        if project.startswith(self.projects_folder):
+            return project[len(self.projects_folder):].lstrip('\\/') or os.path.basename(project)
+        return project
+
+    def _refresh_project_row(self, project: str) -> None:
+        """
+        Update the row of a project: check state, number of folders and totals.
+        :param project: The project folder.
+        """
+        size, count = self.model.project_totals[project]
+        text = f'{check_glyphs[self.model.get_project_state(project)]} {self._get_project_name(project)} ({len(self.model.projects[project])} folders)'
+        self.content_tree.item(self.project_items[project], text=text, values=(format_size(size) if count else '', count if count else ''))
+
+    def _insert_folder_row(self, project: str, path: str) -> None:
+        """
+        Create the row of a folder, under the row of its project.
+        :param project: The project folder.
+        :param path: The folder.
+        """
+        item = self.content_tree.insert(self.project_items[project], 'end')
+        self.folder_items[path] = item
+        self.item_folders[item] = path
+        self._refresh_folder_row(path)
+
+    def _refresh_folder_row(self, path: str) -> None:
+        """
+        Update the row of a folder, if it has been created: check state and size.
+        :param path: The folder.
+        """
+        item = self.folder_items.get(path)
+        if item is None:
+            return
+        project = self.model.folder_project[path]
+        name = path[len(project):].lstrip('\\/') if project else path
+        size, count = self.model.sizes.get(path, (0, 0))
+        is_sized = path in self.model.sizes
+        text = f'{check_glyphs[CHECKED if self.model.is_checked(path) else UNCHECKED]} {name}'
+        self.content_tree.item(item, text=text, values=(format_size(size) if is_sized else '', count if is_sized else ''))
+
+    def _populate_project(self, project: str) -> None:
+        """
+        Create the rows of the folders of a project, replacing the placeholder row.
+        :param project: The project folder.
+        """
+        item = self.project_items[project]
+        self.content_tree.delete(*self.content_tree.get_children(item))
+        folders = self.model.projects[project]
+        if self.sort_column:
+            folders = sorted(folders, key=self._get_folder_sort_key(self.sort_column), reverse=not self.sort_reverse[self.sort_column])
+        for path in folders:
+            self._insert_folder_row(project, path)
+        self.populated_projects.add(project)
+
+    def _on_tree_open(self, _event=None) -> None:
+        """
+        Event when a row of the treeview is expanded: create the rows of the folders of the project on the first expansion.
+        :param _event: the event that triggered the call of this function
+        """
+        project = self.item_projects.get(self.content_tree.focus())
+        if project is not None and project not in self.populated_projects:
+            self._populate_project(project)
+
+    def _on_tree_click(self, event) -> None:
+        """
+        Event when the treeview is clicked: a click on the name of a row toggles its check box.
+        :param event: the event that triggered the call of this function
+        """
+        if self.content_tree.identify_region(event.x, event.y) != 'tree':
+            return
+        if 'indicator' in self.content_tree.identify_element(event.x, event.y):
+            return  # the project is expanded or collapsed
+        item = self.content_tree.identify_row(event.y)
+        if item:
+            self._toggle_items([item])
 
-    def _clean_folders(self) -> None:
+    def _toggle_items(self, items) -> None:
+        """
+        Toggle the check box of some rows. Toggling a project checks or unchecks all its folders, without creating their rows.
+        :param items: The treeview items.
+        """
+        touched = set()
+        for item in items:
+            project = self.item_projects.get(item)
+            if project is not None:
+                self.model.set_project_checked(project, self.model.get_project_state(project) != CHECKED)
+                if project in self.populated_projects:
+                    for path in self.model.projects[project]:
+                        self._refresh_folder_row(path)
+                touched.add(project)
+                continue
+            path = self.item_folders.get(item)
+            if path is not None:
+                self.model.set_checked(path, not self.model.is_checked(path))
+                self._refresh_folder_row(path)
+                touched.add(self.model.folder_project[path])
+        for project in touched:
+            self._refresh_project_row(project)
+        self._update_checked_total()
+
+    def _compute_sizes(self, task: BackgroundTask, folder_list: list) -> int:
+        """
+        Compute the size of the folders concurrently. The sizes are cached between two runs.
+        Run in a worker thread: the sizes are sent to the main thread by the task.
+        :param task: The task running this job.
+        :param folder_list: The folders.
+        :return: The number of folders that have been read from the disk, ie. not found in the cache.
+        """
+        return self.engine.compute_sizes(folder_list, on_result=lambda folder, size, count: task.put((folder, size, count)), should_stop=lambda: task.is_cancelled)
+
+    def _update_sizes(self, sizes: list) -> None:
+        """
+        Display a batch of folder sizes in the treeview. Run in the main thread.
+        :param sizes: A list of (folder, size in bytes, number of files).
+        """
+        with self.engine.stats.phase('ui') as counters:
+            touched = set()
+            for path, size, count in sizes:
+                project = self.model.set_size(path, size, count)
+                if project is not None:
+                    self._refresh_folder_row(path)
+                    touched.add(project)
+            # only the rows of the projects that have changed are updated
+            for project in touched:
+                self._refresh_project_row(project)
+            self._update_checked_total()
+            counters['items'] = len(sizes)
+
+    def _on_sizes_done(self, dirs_read, error) -> None:
+        """
+        Event when the sizes of the folders have been computed. Run in the main thread.
+        :param dirs_read: The number of folders that have been read from the disk.
+        :param error: The exception raised by the job, if any.
+        """
+        self.size_task = None
+        if error is not None:
+            self.log(f'Failed to compute the folder sizes: error {error!r}')
+        elif self.task is None:
+            self.progress_var.set(f'{self.engine.scan_stats}. Sizes: {dirs_read} read')
+        self.btn_cancel.config(state=tk.NORMAL if self.task is not None else tk.DISABLED)
+
+    def _update_checked_total(self) -> None:
+        """
+        Update the total size of the checked folders. The totals are kept up to date by the model.
+        """
+        self.checked_total_var.set(f'Checked: {self.model.checked_count}/{self.model.folder_count} folders, {format_size(self.model.checked_bytes)} reclaimable')
+
+    def _get_folder_sort_key(self, column: str):
+        """
+        Get the function used to sort the folders by a column.
+        :param column: The column.
+        """
+        if column == 'Size':
+            return lambda path: self.model.sizes.get(path, (-1, -1))[0]
+        if column == 'Files':
+            return lambda path: self.model.sizes.get(path, (-1, -1))[1]
+        return lambda path: path.lower()
+
+    def _sort_tree(self, column: str) -> None:
+        """
+        Sort the treeview by a column. Each call on the same column reverses the order.
+        The projects are sorted by their totals. Only the folders of the expanded projects are sorted, the others are sorted when expanded.
+        :param column: The column to sort by.
+        """
+        reverse = self.sort_reverse.get(column, column != 'Folder')  # the biggest folders first by default
+        self.sort_reverse[column] = not reverse
+        self.sort_column = column
+        if column == 'Size':
+            project_key = lambda project: self.model.project_totals[project][0]
+        elif column == 'Files':
+            project_key = lambda project: self.model.project_totals[project][1]
+        else:
+            project_key = lambda project: self._get_project_name(project).lower()
+        for index, project in enumerate(sorted(self.model.projects, key=project_key, reverse=reverse)):
+            self.content_tree.move(self.project_items[project], '', index)
+        folder_key = self._get_folder_sort_key(column)
+        for project in self.populated_projects:
+            parent = self.project_items[project]
+            for index, path in enumerate(sorted(self.model.projects[project], key=folder_key, reverse=reverse)):
+                self.content_tree.move(self.folder_items[path], parent, index)
+
+    def _clean_folders(self, task: BackgroundTask, folder_list: list) -> dict:
         """
         Clean all the folders in the list.
+        Run in a worker thread.
+        :param task: The task running this job.
+        :param folder_list: The folders to clean.
+        :return: The stats of each cleaned folder.
+        """
+        return self.engine.clean_folders(folder_list, should_stop=lambda: task.is_cancelled, on_progress=task.progress)
+
+    def _plan_clean(self, task: BackgroundTask, folder_list: list, projects_folder: str) -> ChangePlan:
         """
+        Make the plan of the cleaning of the folders and save it.
+        Run in a worker thread.
+        :param task: The task running this job.
+        :param folder_list: The folders to clean.
+        :param projects_folder: The scanned folder, stored in the plan.
+        :return: The plan.
+        """
+        plan = self.engine.plan_clean(folder_list, should_stop=lambda: task.is_cancelled, parameters={'projects_folder': projects_folder})
+        plan.save(self.plan_file)
+        return plan
 
-        # get selected folders
-        selected_indexes = self.content_tree.get_checked()
-        if len(selected_indexes) == 0:
-            self.result += 'No folder to clean has been selected.'
+    def _execute_plan(self, task: BackgroundTask) -> dict:
+        """
+        Execute the saved plan, without scanning again.
+        Run in a worker thread.
+        :param task: The task running this job.
+        :return: The stats of each cleaned folder, empty if the plan is out of date.
+        """
+        return self.engine.execute_plan(ChangePlan.load(self.plan_file), should_stop=lambda: task.is_cancelled, on_progress=task.progress)
+
+    def _start_task(self, target, args=(), on_items=None, on_done=None) -> None:
+        """
+        Run a job in a worker thread and update the widgets while it's running.
+        :param target: The job to run.
+        :param args: The parameters of the job.
+        :param on_items: A callback called with the batches of items sent by the job.
+        :param on_done: A callback called with the result of the job and its exception.
+        """
+        self.task = BackgroundTask(self, target, args=args, on_items=on_items, on_progress=self._on_progress, on_done=on_done)
+        self._set_running(True)
+        self.task.start()
+
+    def _set_running(self, is_running: bool) -> None:
+        """
+        Update the widgets when a job starts or stops.
+        :param is_running: Whether a job is running.
+        """
+        state = tk.DISABLED if is_running else tk.NORMAL
+        self.btn_find.config(state=state)
+        self.btn_execute.config(state=tk.DISABLED if is_running or not self.folder_list else tk.NORMAL)
+        self.btn_plan.config(state=tk.DISABLED if is_running or not self.folder_list else tk.NORMAL)
+        self.btn_execute_plan.config(state=tk.DISABLED if is_running or not os.path.isfile(self.plan_file) else tk.NORMAL)
+        self.btn_cancel.config(state=tk.NORMAL if is_running else tk.DISABLED)
+        self.progress_bar.config(value=0)
+        self.progress_var.set('')
+
+    def _on_progress(self, done: int, total: int) -> None:
+        """
+        Update the progress bar. Run in the main thread.
+        :param done: The number of elements done.
+        :param total: The total number of elements, 0 if unknown.
+        """
+        with self.engine.stats.phase('ui'):
+            if total:
+                self.progress_bar.config(mode='determinate', maximum=total, value=done)
+                self.progress_var.set(f'{done}/{total} folders cleaned')
+            else:
+                # the total is unknown when scanning: just show some activity
+                self.progress_bar.config(mode='indeterminate')
+                self.progress_bar.step()
+                self.progress_var.set(f'{done} folders scanned')
+
+    def _on_find_done(self, folder_list, error) -> None:
+        """
+        Event when the search of the folders to clean is finished. Run in the main thread.
+        :param folder_list: The folders found.
+        :param error: The exception raised by the job, if any.
+        """
+        self.task = None
+        if error is not None:
+            self.log(f'Failed to find the folders to clean: error {error!r}')
+            folder_list = []
+        self.folder_list = folder_list or []
+        self._set_running(False)
+        self.progress_var.set(self.engine.scan_stats)
+        if not self.folder_list:
+            messagebox.showinfo('Command Result', f'No folder to clean has been found.')
             return
-        folder_list = []
-        for index in selected_indexes:
-            # path = self.content_tree.item(index)['values'][0]
-            path = self.content_tree.item(index)['text']
-            folder_list.append(path)
-
-        for folder in folder_list:
-            try:
-                # check if the folder is still there, it could have been deleted when its parent was deleted
-                if os.path.isdir(folder):
-                    shutil.rmtree(folder)
-                    self.result += f'Cleaned {folder}\n'
-            except Exception as error:
-                self.result += f'Failed to clean {folder}: error {error!r}\n'
+        self.size_task = BackgroundTask(self, self._compute_sizes, args=(list(self.folder_list), ), on_items=self._update_sizes, on_done=self._on_sizes_done)
+        self.size_task.start()
+        self.btn_cancel.config(state=tk.NORMAL)
+        if self.watch_var.get():
+            self._start_watch()
+
+    def _watch_folders(self, task: BackgroundTask, projects_folder: str, folder_list: list) -> str:
+        """
+        Watch the projects folder and send the changes of the folders to clean to the main thread, until the task is cancelled.
+        Run in a worker thread.
+        :param task: The task running this job.
+        :param projects_folder: The folder to watch.
+        :param folder_list: The folders found by the last search.
+        :return: The backend used to watch the folder.
+        """
+        return self.engine.watch_folders(projects_folder, folder_list, on_event=task.put, should_stop=lambda: task.is_cancelled)
+
+    def _start_watch(self) -> None:
+        """
+        Start watching the projects folder of the last search.
+        """
+        self._stop_watch()
+        self.watch_task = BackgroundTask(self, self._watch_folders, args=(self.projects_folder, list(self.folder_list)), on_items=self._on_watch_events, on_done=self._on_watch_done)
+        self.watch_task.start()
+
+    def _stop_watch(self) -> None:
+        """
+        Stop watching the projects folder.
+        """
+        if self.watch_task is not None:
+            self.watch_task.cancel()
+            self.watch_task.stop_polling()
+            self.watch_task = None
+
+    def _on_watch_toggled(self) -> None:
+        """
+        Event when the watch option is changed: start or stop watching the projects folder of the last search.
+        """
+        is_watching = self.watch_var.get()
+        self.config.set('watch', is_watching)
+        if not is_watching:
+            self._stop_watch()
+        elif self.folder_list and self.task is None:
+            self._start_watch()
+
+    def _on_use_trash_toggled(self) -> None:
+        """
+        Event when the trash option is changed.
+        """
+        self.engine.use_trash = self.use_trash_var.get()
+        self.config.set('use_trash', self.engine.use_trash)
+
+    def _on_use_prune_toggled(self) -> None:
+        """
+        Event when the prune option is changed.
+        """
+        self.engine.use_prune = self.use_prune_var.get()
+        self.config.set('use_prune', self.engine.use_prune)
+
+    def _purge_trash(self, task: BackgroundTask) -> dict:
+        """
+        Purge all the items of the trash.
+        Run in a worker thread.
+        :param task: The task running this job.
+        :return: The stats of each purged item.
+        """
+        return self.engine.purge_trash(purge_all=True, should_stop=lambda: task.is_cancelled, on_progress=task.progress)
+
+    def _on_purge_done(self, _stats, error) -> None:
+        """
+        Event when the purge of the trash is finished. Run in the main thread.
+        :param _stats: The stats of each purged item (unused).
+        :param error: The exception raised by the job, if any.
+        """
+        self.task = None
+        self._set_running(False)
+        if error is not None:
+            self.log(f'Failed to purge the trash: error {error!r}')
+
+    def show_trash(self) -> None:
+        """
+        Show the folders in the trash, to restore or purge them.
+        """
+        dialog = tk.Toplevel(self)
+        dialog.title('Trash')
+        dialog.transient(self)
+        pack_def_options = {'ipadx': 5, 'ipady': 5, 'padx': 3, 'pady': 3}
+        tree = ttk.Treeview(dialog, selectmode='extended', columns=('Size', 'Staged'), show='tree headings', height=12)
+        tree.column('#0', width=380, stretch=tk.YES)
+        tree.column('Size', width=70, stretch=tk.NO, anchor=tk.E)
+        tree.column('Staged', width=120, stretch=tk.NO, anchor=tk.CENTER)
+        tree.heading('#0', text='Folder', anchor=tk.CENTER)
+        tree.heading('Size', text='Size', anchor=tk.CENTER)
+        tree.heading('Staged', text='Moved to the trash', anchor=tk.CENTER)
+        tree.pack(fill=tk.BOTH, expand=True, **pack_def_options)
+        frame = ttk.Frame(dialog)
+        frame.pack(fill=tk.X, **pack_def_options)
+        item_folders = {}  # {treeview item: folder of the trash item}
+
+        def refresh() -> None:
+            if not tree.winfo_exists():
+                return
+            tree.delete(*tree.get_children())
+            item_folders.clear()
+            for item in self.engine.trash.list_items():
+                row = tree.insert('', 'end', text=item['path'], values=(format_size(item['bytes']), time.strftime('%Y-%m-%d %H:%M', time.localtime(item['staged']))))
+                item_folders[row] = item['item']
+
+        def restore() -> None:
+            results = self.engine.restore_from_trash([item_folders[row] for row in tree.selection()])
+            errors = [error for error in results.values() if error]
+            if errors:
+                messagebox.showerror('Error', '\n'.join(errors), parent=dialog)
+            refresh()
+
+        def purge() -> None:
+            if self.task is not None or not item_folders:
+                return
+            if not messagebox.askyesno('Purge', f'Delete the {len(item_folders)} folders of the trash ?\nThey can not be restored anymore.', parent=dialog):
+                return
+            self._start_task(self._purge_trash, on_done=lambda stats, error: (self._on_purge_done(stats, error), refresh()))
+
+        def close() -> None:
+            dialog.grab_release()
+            dialog.destroy()
+
+        ttk.Button(frame, text='Close', command=close).pack(side=tk.RIGHT, **pack_def_options)
+        ttk.Button(frame, text='Restore selected', command=restore).pack(side=tk.LEFT, **pack_def_options)
+        ttk.Button(frame, text='Purge all', command=purge).pack(side=tk.LEFT, **pack_def_options)
+        dialog.protocol("WM_DELETE_WINDOW", close)
+        refresh()
+        dialog.grab_set()
+
+    def _on_watch_events(self, events: list) -> None:
+        """
+        Apply a batch of changes reported by the watch to the treeview. Run in the main thread.
+        :param events: A list of ('added', project folder, folder), ('removed', folder) or ('size', folder, size in bytes, number of files).
+        """
+        # consecutive events of the same kind are applied together, in the order they were sent
+        for kind, group in itertools.groupby(events, key=lambda event: event[0]):
+            values = [event[1:] for event in group]
+            if kind == 'added':
+                values = [(project, path) for project, path in values if path not in self.model.folder_project]
+                self.folder_list.extend(path for _project, path in values)
+                self._add_folders_to_tree(values)
+            elif kind == 'removed':
+                self._remove_folders_from_tree([path for (path, ) in values])
+            else:
+                self._update_sizes(values)
+        if self.task is None:
+            self.btn_execute.config(state=tk.NORMAL if self.folder_list else tk.DISABLED)
+            self.btn_plan.config(state=tk.NORMAL if self.folder_list else tk.DISABLED)
+
+    def _on_watch_done(self, _backend, error) -> None:
+        """
+        Event when the watch is stopped. Run in the main thread.
+        :param _backend: The backend used to watch the folder (unused).
+        :param error: The exception raised by the job, if any.
+        """
+        self.watch_task = None
+        if error is not None:
+            self.log(f'Failed to watch the projects folder: error {error!r}')
+
+    def _on_plan_done(self, plan, error) -> None:
+        """
+        Event when the plan is made. Run in the main thread.
+        :param plan: The plan.
+        :param error: The exception raised by the job, if any.
+        """
+        self.task = None
+        self._set_running(False)
+        self._update_plan_status()
+        if error is not None:
+            self.log(f'Failed to make the plan: error {error!r}')
+            messagebox.showerror('Error', str(error))
+            return
+        self.engine.report(plan.to_text())
+        messagebox.showinfo('Command Result', 'The plan is displayed in the results pane.\nClick on "Run Approved Plan" to execute it.')
+
+    def _on_execute_plan_done(self, stats, error) -> None:
+        """
+        Event when the execution of the saved plan is finished. Run in the main thread.
+        :param stats: The stats of each cleaned folder, empty if the plan is out of date.
+        :param error: The exception raised by the job, if any.
+        """
+        if error is None and not stats and self.engine.error_list:
+            self.task = None
+            self._set_running(False)
+            messagebox.showerror('Error', f'{self.engine.error_list[0]}\nSee the console for the changed folders.')
+            self.engine.error_list = []
+            return
+        self._on_clean_done(stats, error)
+
+    def _on_clean_done(self, _result, error) -> None:
+        """
+        Event when the cleaning is finished. Run in the main thread.
+        :param _result: The result of the job (unused).
+        :param error: The exception raised by the job, if any.
+        """
+        is_cancelled = self.task.is_cancelled
+        self.task = None
+        self._set_running(False)
+        if error is not None:
+            self.log(f'Failed to clean the folders: error {error!r}')
+        if self.engine.use_trash:
+            self.engine.purge_trash_in_background()
+        if is_cancelled:
+            messagebox.showinfo('Command Result', 'Cleaning cancelled. Some folders have not been cleaned.')
+        elif self.engine.use_trash:
+            messagebox.showinfo('Command Result', 'Folders moved to the trash. They can be restored with the Trash button until they are purged.')
+        else:
+            messagebox.showinfo('Command Result', 'Folder cleaned successfully.')
+
+        self.config.save()
+        self._end_report()
+        self.close_window()
+
+    def _end_report(self) -> None:
+        """
+        Write the summary of the run to the result log, and the timing of its phases to the stats file.
+        """
+        self.engine.end_report()
+        try:
+            self.engine.stats.save(self.stats_file)
+        except OSError as error:
+            self.log(f'Could not save {self.stats_file}: error {error!r}')
 
     def on_close(self, _event=None) -> None:
         """
@@ -186,6 +839,10 @@ class FolderCleaner(tk.Toplevel):
         """
         Close the window
         """
+        for task in (self.task, self.size_task):
+            if task is not None:
+                task.stop_polling()
+        self._stop_watch()
         self.config.save()
         self.destroy()
 
@@ -194,24 +851,37 @@ class FolderCleaner(tk.Toplevel):
         Log a message to the console.
         :param message: The message to log.
         """
-        print(f'[{self.__class__.__name__}] {message}')
-        self.error_list.append(message)
+        self.engine.log(message)
 
     def find(self) -> None:
         """
         Find the projects to clean.
         """
-        if not self.config.get('projects_folder'):
+        projects_folder = self.config.get('projects_folder')
+        if not projects_folder:
             messagebox.showerror('Error', 'Projects Directory not specified.')
             return
+        if (self.watch_task is not None and self.projects_folder == os.path.normpath(projects_folder) and not self.full_rescan_var.get()
+                and self.engine.include_orphans == self.orphans_var.get()):
+            # the list is already up to date
+            self.progress_var.set(f'Watching: {self.model.folder_count} folders, up to date')
+            return
 
-        self.folder_list = self._find_folders()
-        count = len(self.folder_list)
-        if count > 0:
-            self.btn_execute.config(state=tk.NORMAL)
-        else:
-            messagebox.showinfo('Command Result', f'No folder to clean has been found.')
-            self.btn_execute.config(state=tk.DISABLED)
+        self._stop_watch()
+        if self.size_task is not None:
+            self.size_task.stop_polling()
+            self.size_task = None
+        self.folder_list = []
+        self.model = FolderTreeModel()
+        self.projects_folder = os.path.normpath(projects_folder)
+        self.project_items = {}
+        self.item_projects = {}
+        self.folder_items = {}
+        self.item_folders = {}
+        self.populated_projects = set()
+        self.checked_total_var.set('')
+        self.content_tree.delete(*self.content_tree.get_children())
+        self._start_task(self._find_folders, args=(projects_folder, self.full_rescan_var.get(), self.orphans_var.get()), on_items=self._add_folders_to_tree, on_done=self._on_find_done)
 
     def execute(self) -> None:
         """
@@ -221,17 +891,68 @@ class FolderCleaner(tk.Toplevel):
             messagebox.showerror('Error', 'The list of project to clean is empty.')
             return
 
-        self._clean_folders()
-        messagebox.showinfo('Command Result', 'Folder cleaned successfully.')
+        folder_list = self._get_checked_folders()
+        if not folder_list:
+            return
+
+        if self.scheduler is not None:
+            self._submit_clean_job(folder_list)
+            return
+        self._stop_watch()
+        if self.size_task is not None:
+            self.size_task.stop_polling()
+            self.size_task = None
+        self._start_task(self._clean_folders, args=(folder_list, ), on_done=self._on_clean_done)
 
+    def _submit_clean_job(self, folder_list: list) -> None:
+        """
+        Submit the cleaning of the folders as a job of the main window, then close this window. The job is displayed in the main window.
+        :param folder_list: The folders to clean.
+        """
+        from modules.jobs import JOB_CLEAN
+        parameters = {
+            'projects_folder': self.config.get('projects_folder'), 'folders': folder_list, 'use_trash': self.engine.use_trash, 'use_prune': self.engine.use_prune
+        }
+        job = self.scheduler.submit(JOB_CLEAN, parameters, title=f'Clean {len(folder_list)} folders in {self.config.get("projects_folder")}')
+        self.engine.report(f'Cleaning submitted as job {job.name}')
         self.config.save()
-        if len(self.error_list) > 0:
-            self.result += '\n###########\nErrors\n###########\n'
-            self.result += '\n'.join(self.error_list)
-        else:
-            self.result += '\n###########\nNo Errors\n###########\n'
-        try:
-            self.display_callback(self.result)
-        except AttributeError:
-            self.log('No display callback specified.')
         self.close_window()
+
+    def _get_checked_folders(self) -> list:
+        """
+        Get the checked folders, including the folders of the projects that have not been expanded. Show an error if none is checked.
+        :return: The folders.
+        """
+        folder_list = self.model.get_checked_folders()
+        if not folder_list:
+            messagebox.showerror('Error', 'No folder to clean has been selected.')
+        return folder_list
+
+    def plan(self) -> None:
+        """
+        Make the plan of the cleaning of the checked folders, display it and save it.
+        """
+        folder_list = self._get_checked_folders()
+        if not folder_list:
+            return
+        self._start_task(self._plan_clean, args=(folder_list, self.config.get('projects_folder')), on_done=self._on_plan_done)
+
+    def execute_plan(self) -> None:
+        """
+        Execute the saved plan, without scanning again.
+        """
+        if not messagebox.askyesno('Run Approved Plan', f'{self.plan_var.get()}\nClean the folders of this plan ?'):
+            return
+        self._stop_watch()
+        if self.size_task is not None:
+            self.size_task.stop_polling()
+            self.size_task = None
+        self._start_task(self._execute_plan, on_done=self._on_execute_plan_done)
+
+    def cancel(self) -> None:
+        """
+        Cancel the running job.
+        """
+        for task in (self.task, self.size_task):
+            if task is not None:
+                task.cancel()
@@ -0,0 +1,568 @@
+# coding=utf-8
+"""
+Implementation for:
+- FolderCleanerEngine: The GUI-free part of the FolderCleaner tool.
+"""
+import os
+import sys
+import time
+from typing import Callable
+
+from modules.ChangePlanClass import ChangePlan, ACTION_DELETE, ACTION_PRUNE
+from modules.CleaningRulesClass import CleaningRules
+from modules.FolderDeleterClass import FolderDeleter, default_delete_workers
+from modules.FolderPrunerClass import FolderPruner
+from modules.FolderScannerClass import FolderScanner, is_project_file, is_root_file
+from modules.FolderSizerClass import FolderSizer, default_size_workers
+from modules.FolderTrashClass import FolderTrash
+from modules.FolderWatcherClass import FolderWatcher, default_poll_interval
+from modules.PhaseStatsClass import PhaseStats
+from modules.ResultLogClass import ResultLog, LEVEL_INFO, LEVEL_WARNING, LEVEL_ERROR
+from modules.ScanIndexClass import ScanIndex
+from modules.functions import format_size
+
+
+class FolderCleanerEngine:
+    """
+    The GUI-free part of the FolderCleaner tool: find and clean the build and intermediate folders of UE projects.
+    It can be used by the FolderCleaner window or from the command line. It never imports tkinter.
+    :param index_file: The file of the scan index. If None, the index is only kept in memory.
+    :param sizes_cache_file: The file of the folder sizes cache. If None, the cache is only kept in memory.
+    :param delete_workers: The number of threads used to delete the files.
+    :param size_workers: The number of threads used to compute the folder sizes.
+    :param result_log: The log the results are written to. If None, the results are only kept in a private log.
+    :param profile_file: The .prof file the phases are profiled to, see PhaseStats. If None, the phases are only timed.
+    :param rules: The rules that select the folders to clean. If None, the default rules are used.
+    :param trash: The trash the folders are moved to by stage_folders(), see FolderTrash. If None, a trash whose list of folders is only kept in memory is used.
+    :param use_trash: Whether clean_folders() moves the folders to the trash instead of deleting them.
+    :param pruner: The pruner of the cache folders, see FolderPruner. If None, the default limits are used.
+    :param use_prune: Whether clean_folders() prunes the folders that can be pruned (see FolderPruner.can_prune()) instead of deleting them.
+    """
+
+    def __init__(self, index_file: str = None, sizes_cache_file: str = None, delete_workers: int = default_delete_workers, size_workers: int = default_size_workers,
+                 result_log: ResultLog = None, profile_file: str = None, rules: CleaningRules = None, trash: FolderTrash = None,
+                 use_trash: bool = False, pruner: FolderPruner = None, use_prune: bool = False):
+        self.name = 'FolderCleaner'
+        self.index_file = index_file
+        self.sizes_cache_file = sizes_cache_file
+        self.delete_workers = delete_workers
+        self.size_workers = size_workers
+        self.rules = CleaningRules() if rules is None else rules
+        self.trash = FolderTrash() if trash is None else trash
+        self.use_trash = use_trash
+        self.pruner = FolderPruner(max_workers=delete_workers) if pruner is None else pruner
+        self.use_prune = use_prune
+        self.result_log = ResultLog() if result_log is None else result_log
+        self.error_list = []
+        self.stats = PhaseStats(self.name, profile_file=profile_file)  # the timing and the counters of each phase
+        self.scan_stats = ''  # stats of the scan index for the last search
+        self.scan_index = None  # the scan index of the last search
+        self.projects_folder = ''  # the folder of the last search
+        self.include_orphans = False  # whether the last search has found the orphans
+        self._project_roots = {}  # {parent of a folder to clean: its project folder, '' for an orphan}
+        self.report(f'###########\nRUNNING {self.name}\n###########')
+
+    def log(self, message: str) -> None:
+        """
+        Log an error message to the console (stderr, to keep stdout clean for the command line output) and to the result log.
+        :param message: The message to log.
+        """
+        print(f'[{self.__class__.__name__}] {message}', file=sys.stderr)
+        self.error_list.append(message)
+        self.result_log.write(self.name, message, LEVEL_ERROR)
+
+    def report(self, message: str, level: str = LEVEL_INFO) -> None:
+        """
+        Write a result message to the result log.
+        :param message: The message. A multi lines message is written as one record per line.
+        :param level: The level of the message: LEVEL_INFO or LEVEL_WARNING. The errors are written by log().
+        """
+        self.result_log.write(self.name, message, level)
+
+    def find_folders(self, projects_folder: str, full_rescan: bool = False, should_stop: Callable[[], bool] = None, on_found: Callable[[str], None] = None,
+                     on_progress: Callable[[int, int], None] = None, include_orphans: bool = False) -> list:
+        """
+        Find the folders to clean of the projects and plugins of a given directory, see FolderScanner.scan_projects().
+        Only the folders that have changed since the last scan are read, the others are reused from the scan index.
+        :param projects_folder: The folder to scan.
+        :param full_rescan: Whether to invalidate the scan index before scanning.
+        :param should_stop: A function called regularly. If it returns True, the search stops.
+        :param on_found: A function called with the path of each folder found. Its project is already known by get_project_root().
+        :param on_progress: A function called with (folders scanned, 0) while scanning.
+        :param include_orphans: Whether to find the folders to clean that are not in a project nor in a plugin.
+        :return: A list of folder paths.
+        """
+        with self.stats.phase('index_load') as counters:
+            index = ScanIndex(index_file=self.index_file)
+            if full_rescan:
+                index.invalidate(projects_folder)
+            counters['dirs'] = len(index.entries)
+        self.scan_index = index
+        self.projects_folder = os.path.normpath(projects_folder)
+        self.include_orphans = include_orphans
+        self._project_roots = {}
+        scanner = FolderScanner(index=index, rules=self.rules)
+        folder_list = []
+        orphan_count = 0
+        with self.stats.phase('scan') as counters:
+            for project, path in scanner.scan_projects(projects_folder, should_stop=should_stop, include_orphans=include_orphans):
+                folder_list.append(path)
+                self._project_roots[os.path.dirname(path)] = project
+                orphan_count += not project
+                if on_found is not None:
+                    on_found(path)
+                if on_progress is not None:
+                    on_progress(scanner.dirs_visited, 0)
+            if on_progress is not None:
+                on_progress(scanner.dirs_visited, 0)
+            counters.update(dirs=scanner.dirs_visited, items=len(folder_list), errors=len(scanner.error_list))
+        with self.stats.phase('index_save') as counters:
+            index.error_list = []  # the errors of the scan are in the errors of the scanner
+            index.save()
+            counters['dirs'] = len(index.entries)
+        self.scan_stats = index.stats_text()
+        self.report(f'Scan index: {self.scan_stats}')
+        if include_orphans:
+            self.report(f'{orphan_count} orphan folders found, not in a project nor in a plugin')
+        for message in scanner.error_list + index.error_list:
+            self.log(message)
+        return folder_list
+
+    def get_project_root(self, folder: str, from_disk: bool = False) -> str:
+        """
+        Get the project folder of a folder to clean, as grouped by the last search: the closest parent folder that contains a .uproject file,
+        or the plugin folder for a plugin that is not in a project. See FolderScanner.scan_projects().
+        The files are read from the scan index, and the projects of the folders found by the last search are cached.
+        :param folder: The folder to clean.
+        :param from_disk: Whether to read the files from the disk instead of the scan index, ie. for a folder created after the search.
+        :return: The project folder, or '' if the folder is an orphan, ie. not in a project nor in a plugin, or not in a folder of a project the search visits.
+        """
+        top = self.projects_folder
+        parent = os.path.dirname(folder)
+        if not from_disk and parent in self._project_roots:
+            return self._project_roots[parent]
+        parts = []  # the names of the folders from the closest project or plugin folder to the parent folder
+        root = ''  # the closest project or plugin folder
+        project_root = ''
+        path = parent
+        while path:
+            entry = self.scan_index.entries.get(path) if self.scan_index is not None and not from_disk else None
+            if entry is not None:
+                file_names = entry[2]
+            else:
+                try:
+                    file_names = os.listdir(path)
+                except OSError:
+                    file_names = []
+            # the same check as the search, see FolderScanner.scan_projects()
+            is_project = any(is_project_file(name) for name in file_names)
+            if not root and (is_project or any(is_root_file(name) for name in file_names)):
+                root = path
+            if is_project:
+                project_root = path
+                break
+            if not root:
+                parts.insert(0, os.path.basename(path))
+            next_path = os.path.dirname(path)
+            if path == top or len(path) <= len(top) or next_path == path:
+                break
+            path = next_path
+        if not root or (parts and not self.rules.get_folder_rules(top, parent).is_include_prefix(tuple(parts), parent)):
+            project_root = ''
+        else:
+            project_root = project_root or root
+        if not from_disk:
+            self._project_roots[parent] = project_root
+        return project_root
+
+    def watch_folders(self, projects_folder: str, folder_list: list, on_event: Callable[[tuple], None], should_stop: Callable[[], bool],
+                      poll_interval: float = default_poll_interval) -> str:
+        """
+        Watch the projects folder after a search and report the folders to clean that appear, grow or disappear, until should_stop() returns True.
+        It uses inotify on Linux, and scans the folder regularly on the other systems, see FolderWatcher.
+        The sizes of the folders that appear or change are computed again (only their changed sub folders are read, see FolderSizer).
+        The folders are found like the search (see FolderScanner.scan_projects()), and the orphans are only reported if the last search has found them.
+        :param projects_folder: The folder to watch, the folder of the last search.
+        :param folder_list: The folders found by the last search.
+        :param on_event: A function called with each event: ('added', project folder, folder), ('removed', folder) or ('size', folder, size in bytes, number of files).
+        :param should_stop: A function called regularly. If it returns True, the watch stops.
+        :param poll_interval: The delay between two scans when inotify is not available, in seconds.
+        :return: The backend used: WATCH_INOTIFY or WATCH_POLLING.
+        """
+        # a private copy of the index: it's read by the watcher thread while a new search can update the shared one
+        watcher = FolderWatcher(
+            projects_folder, self.rules, index=ScanIndex(index_file=self.index_file), poll_interval=poll_interval, include_orphans=self.include_orphans
+        )
+        error_count = 0
+
+        def on_change(added: list, removed: list, changed: list) -> None:
+            nonlocal error_count
+            for message in watcher.error_list[error_count:]:
+                self.log(message)
+            error_count = len(watcher.error_list)
+            self.report(f'Watch ({watcher.backend}): {len(added)} folders added, {len(removed)} removed, {len(changed)} changed')
+            for folder in removed:
+                on_event(('removed', folder))
+            for folder in added:
+                on_event(('added', watcher.folders[folder], folder))
+            self.compute_sizes(added + changed, on_result=lambda folder, size, count: on_event(('size', folder, size, count)), should_stop=should_stop)
+
+        self.report(f'Watching {projects_folder} for changes')
+        watcher.run(folder_list, on_change, should_stop)
+        for message in watcher.error_list[error_count:]:
+            self.log(message)
+        return watcher.backend
+
+    def compute_sizes(self, folder_list: list, on_result: Callable[[str, int, int], None], should_stop: Callable[[], bool] = None) -> int:
+        """
+        Compute the size of the folders concurrently. The sizes are cached between two runs.
+        :param folder_list: The folders.
+        :param on_result: A function called with (folder, size in bytes, number of files) each time a size is computed.
+        :param should_stop: A function called regularly. If it returns True, the computation stops.
+        :return: The number of folders that have been read from the disk, ie. not found in the cache.
+        """
+        totals = [0, 0]  # bytes, files
+
+        def on_size(folder: str, size: int, count: int) -> None:
+            totals[0] += size
+            totals[1] += count
+            on_result(folder, size, count)
+
+        with self.stats.phase('size') as counters:
+            sizer = FolderSizer(max_workers=self.size_workers, cache_file=self.sizes_cache_file)
+            sizer.compute(folder_list, on_result=on_size, should_stop=should_stop)
+            counters.update(dirs=sizer.dirs_read, items=len(folder_list), bytes=totals[0], files=totals[1], errors=len(sizer.error_list))
+        for message in sizer.error_list:
+            self.log(message)
+        return sizer.dirs_read
+
+    def clean_folders(self, folder_list: list, should_stop: Callable[[], bool] = None, on_progress: Callable[[int, int], None] = None, use_trash: bool = None,
+                      use_prune: bool = None) -> dict:
+        """
+        Clean all the folders in the list: delete them, or move them to the trash if use_trash is set (see stage_folders()).
+        :param folder_list: The folders to clean.
+        :param should_stop: A function called regularly. If it returns True, the cleaning stops.
+        :param on_progress: A function called with (folders done, folders total) each time a folder is cleaned.
+        :param use_trash: Whether to move the folders to the trash instead of deleting them. If None, the use_trash setting of the engine is used.
+        :param use_prune: Whether to prune the folders that can be pruned instead of deleting them. If None, the use_prune setting of the engine is used.
+        :return: The stats of each cleaned folder (see FolderDeleter.delete()).
+        """
+        use_trash = self.use_trash if use_trash is None else use_trash
+        use_prune = self.use_prune if use_prune is None else use_prune
+        if use_prune:
+            pruned = [folder for folder in folder_list if self.pruner.can_prune(folder)]
+            others = [folder for folder in folder_list if not self.pruner.can_prune(folder)]
+            stats = self.prune_folders(pruned, should_stop=should_stop, on_progress=self._shift_progress(on_progress, 0, len(folder_list))) if pruned else {}
+            if others:
+                stats.update(self.clean_folders(
+                    others, should_stop=should_stop, on_progress=self._shift_progress(on_progress, len(pruned), len(folder_list)), use_trash=use_trash, use_prune=False
+                ))
+            return stats
+        if use_trash:
+            return self.stage_folders(folder_list, should_stop=should_stop, on_progress=on_progress)
+        deleter = FolderDeleter(max_workers=self.delete_workers)
+        start = time.perf_counter()
+        with self.stats.phase('delete') as counters:
+            stats = deleter.delete(folder_list, should_stop=should_stop, on_progress=on_progress)
+            self._count_stats(stats, counters)
+        total_duration = time.perf_counter() - start
+        total_files = 0
+        total_bytes = 0
+        for folder, folder_stats in stats.items():
+            duration = folder_stats['duration']
+            throughput = format_size(folder_stats['bytes'] / duration) if duration else '-'
+            if folder_stats['errors']:
+                self.report(f'Failed to clean {folder}: {len(folder_stats["errors"])} errors', LEVEL_WARNING)
+                for message in folder_stats['errors']:
+                    self.log(message)
+            else:
+                self.report(f'Cleaned {folder}')
+            self.result_log.add_item(
+                self.name, 'clean', folder, status='failed' if folder_stats['errors'] else 'cleaned', bytes=folder_stats['bytes'], files=folder_stats['files'],
+                duration=round(duration, 4), error=folder_stats['errors'][0] if folder_stats['errors'] else ''
+            )
+            self.report(f'    {folder_stats["files"]} files deleted, {format_size(folder_stats["bytes"])} freed in {duration:.2f}s ({throughput}/s)')
+            total_files += folder_stats['files']
+            total_bytes += folder_stats['bytes']
+        if should_stop is not None and should_stop():
+            self.report('Cleaning cancelled by user.', LEVEL_WARNING)
+        self._forget_sizes(stats)
+        throughput = format_size(total_bytes / total_duration) if total_duration else '-'
+        self.report(f'Total: {len(stats)} folders, {total_files} files deleted, {format_size(total_bytes)} freed in {total_duration:.2f}s ({throughput}/s)')
+        return stats
+
+    @staticmethod
+    def _shift_progress(on_progress: Callable[[int, int], None], offset: int, total: int) -> Callable[[int, int], None]:
+        """
+        Get the progress function of a phase of a cleaning made of several phases, so the progress goes on from one phase to the next.
+        :param on_progress: The progress function of the whole cleaning, called with (folders done, folders total). May be None.
+        :param offset: The number of folders of the previous phases.
+        :param total: The number of folders of all the phases.
+        :return: A function called with the progress of the phase, None if on_progress is None.
+        """
+        if on_progress is None:
+            return None
+        return lambda done, _total: on_progress(offset + done, total)
+
+    @staticmethod
+    def _count_stats(stats: dict, counters: dict) -> None:
+        """
+        Set the counters of a phase from the stats of the folders, see FolderDeleter.delete().
+        """
+        counters.update(
+            items=len(stats), files=sum(folder_stats['files'] for folder_stats in stats.values()), bytes=sum(folder_stats['bytes'] for folder_stats in stats.values()),
+            errors=sum(len(folder_stats['errors']) for folder_stats in stats.values())
+        )
+
+    def _forget_sizes(self, folder_list) -> None:
+        """
+        Remove the folders that have been cleaned from the sizes cache: their sizes are useless now.
+        """
+        sizer = FolderSizer(cache_file=self.sizes_cache_file)
+        for folder in folder_list:
+            sizer.forget(folder)
+        sizer.save()
+        # the folders have been cleaned anyway: the cleaning does not fail
+        for message in sizer.error_list:
+            self.log(message)
+
+    def stage_folders(self, folder_list: list, should_stop: Callable[[], bool] = None, on_progress: Callable[[int, int], None] = None) -> dict:
+        """
+        Move the folders to the trash of their volume. A move takes the same time whatever the size of the folder: the space is used by the trash
+        until the folders are purged, see purge_trash(). A folder can be restored until then, see restore_from_trash().
+        The folders that can't be moved are deleted instead.
+        :param folder_list: The folders to clean.
+        :param should_stop: A function called regularly. If it returns True, the cleaning stops.
+        :param on_progress: A function called with (folders done, folders total) each time a folder is staged.
+        :return: The stats of each cleaned folder (see FolderTrash.stage()).
+        """
+        # the sizes are read from the cache filled when the folders were found, they are stored with the items
+        sizer = FolderSizer(cache_file=self.sizes_cache_file)
+        start = time.perf_counter()
+        with self.stats.phase('stage') as counters:
+            stats = self.trash.stage(folder_list, should_stop=should_stop, on_progress=on_progress, get_size=sizer.get_cached_size)
+            self._count_stats(stats, counters)
+        total_duration = time.perf_counter() - start
+        failed = [folder for folder, folder_stats in stats.items() if not folder_stats['staged']]
+        for folder, folder_stats in stats.items():
+            if folder_stats['staged']:
+                self.report(f'Staged {folder} ({format_size(folder_stats["bytes"])}) in {folder_stats["duration"]:.3f}s')
+                self.result_log.add_item(
+                    self.name, 'clean', folder, status='staged', bytes=folder_stats['bytes'], files=folder_stats['files'], duration=round(folder_stats['duration'], 4),
+                    error=''
+                )
+            else:
+                for message in folder_stats['errors']:
+                    self.report(message, LEVEL_WARNING)
+        staged_bytes = sum(folder_stats['bytes'] for folder_stats in stats.values() if folder_stats['staged'])
+        self.report(f'Time to free: {len(stats) - len(failed)} folders, {format_size(staged_bytes)} moved to the trash in {total_duration:.2f}s')
+        self._forget_sizes(stats)
+        if failed:
+            self.report(f'{len(failed)} folders could not be moved to the trash, they are deleted instead', LEVEL_WARNING)
+            stats.update(self.clean_folders(failed, should_stop=should_stop, use_trash=False, use_prune=False))
+        return stats
+
+    def get_prune_groups(self, folder_list: list) -> dict:
+        """
+        Group the folders to prune by project: the folders of a project (and of its plugins) share the size target of the pruner.
+        An orphan folder is its own group.
+        :param folder_list: The folders to prune.
+        :return: {project folder: folders}.
+        """
+        groups = {}
+        for folder in folder_list:
+            groups.setdefault(self.get_project_root(folder) or folder, []).append(folder)
+        return groups
+
+    def plan_prune(self, folder_list: list, should_stop: Callable[[], bool] = None, pruner: FolderPruner = None) -> dict:
+        """
+        Find the files to evict from the folders to prune, project by project, see FolderPruner.plan(). Nothing is deleted.
+        :param folder_list: The folders to prune.
+        :param should_stop: A function called regularly. If it returns True, the listing stops.
+        :param pruner: The pruner whose limits are used. If None, the pruner of the engine is used.
+        :return: The preview of each folder, see FolderPruner.plan().
+        """
+        pruner = self.pruner if pruner is None else pruner
+        previews = {}
+        with self.stats.phase('prune_scan') as counters:
+            for project, folders in self.get_prune_groups(folder_list).items():
+                if should_stop is not None and should_stop():
+                    break
+                group = pruner.plan(folders, should_stop=should_stop)
+                previews.update(group)
+                if group:
+                    to_free = sum(preview['bytes'] for preview in group.values())
+                    kept = sum(preview['kept_bytes'] for preview in group.values())
+                    self.report(
+                        f'Prune {project}: {sum(preview["files"] for preview in group.values())} files to evict, {format_size(to_free)} to free, '
+                        f'{sum(preview["kept_files"] for preview in group.values())} files kept, {format_size(kept)}'
+                    )
+            counters.update(
+                items=len(previews), files=sum(preview['files'] + preview['kept_files'] for preview in previews.values()),
+                bytes=sum(preview['bytes'] for preview in previews.values()), errors=sum(len(preview['errors']) for preview in previews.values())
+            )
+        return previews
+
+    def prune_folders(self, folder_list: list, should_stop: Callable[[], bool] = None, on_progress: Callable[[int, int], None] = None, pruner: FolderPruner = None) -> dict:
+        """
+        Prune the folders: evict their least recently used files, down to the size target of their project or the age threshold of the pruner.
+        The files used recently are kept, so the editor does not rebuild them.
+        :param folder_list: The folders to prune.
+        :param should_stop: A function called regularly. If it returns True, the pruning stops.
+        :param on_progress: A function called with (folders done, folders total) each time a folder is pruned.
+        :param pruner: The pruner whose limits are used. If None, the pruner of the engine is used.
+        :return: The stats of each pruned folder (see FolderPruner.prune()).
+        """
+        pruner = self.pruner if pruner is None else pruner
+        previews = self.plan_prune(folder_list, should_stop=should_stop, pruner=pruner)
+        start = time.perf_counter()
+        with self.stats.phase('prune') as counters:
+            stats = pruner.prune(previews, should_stop=should_stop, on_progress=on_progress)
+            self._count_stats(stats, counters)
+        total_duration = time.perf_counter() - start
+        for folder, folder_stats in stats.items():
+            for message in folder_stats['errors']:
+                self.log(message)
+            self.report(
+                f'Pruned {folder}: {folder_stats["files"]} files deleted, {format_size(folder_stats["bytes"])} freed, '
+                f'{folder_stats["kept_files"]} files kept, {format_size(folder_stats["kept_bytes"])}'
+            )
+            self.result_log.add_item(
+                self.name, 'clean', folder, status='failed' if folder_stats['errors'] else 'pruned', bytes=folder_stats['bytes'], files=folder_stats['files'],
+                duration=round(folder_stats['duration'], 4), error=folder_stats['errors'][0] if folder_stats['errors'] else ''
+            )
+        if should_stop is not None and should_stop():
+            self.report('Pruning cancelled by user.', LEVEL_WARNING)
+        self._forget_sizes(stats)
+        total_bytes = sum(folder_stats['bytes'] for folder_stats in stats.values())
+        self.report(f'Total pruned: {len(stats)} folders, {format_size(total_bytes)} freed in {total_duration:.2f}s')
+        return stats
+
+    def purge_trash(self, purge_all: bool = False, should_stop: Callable[[], bool] = None, on_progress: Callable[[int, int], None] = None) -> dict:
+        """
+        Delete the content of the trash, at a low priority: the expired items (see FolderTrash.get_expired_items()), or all the items.
+        :param purge_all: Whether to purge all the items, not only the expired ones.
+        :param should_stop: A function called regularly. If it returns True, the purge stops.
+        :param on_progress: A function called with (items done, items total) each time an item is purged.
+        :return: The stats of each purged item (see FolderTrash.purge()).
+        """
+        start = time.perf_counter()
+        with self.stats.phase('purge') as counters:
+            stats = self.trash.purge(self.trash.list_items() if purge_all else None, should_stop=should_stop, on_progress=on_progress)
+            self._count_stats(stats, counters)
+        self._report_purge(stats, time.perf_counter() - start)
+        return stats
+
+    def purge_trash_in_background(self) -> bool:
+        """
+        Purge the expired items of the trash in a daemon thread, see FolderTrash.purge_in_background(). The results are written to the result log.
+        :return: False if a purge is already running.
+        """
+        start = time.perf_counter()
+        return self.trash.purge_in_background(on_done=lambda stats: self._report_purge(stats, time.perf_counter() - start))
+
+    def _report_purge(self, stats: dict, duration: float) -> None:
+        """
+        Write the results of a purge to the result log.
+        :param stats: The stats of each purged item.
+        :param duration: The duration of the purge, in seconds.
+        """
+        if not stats:
+            return
+        for folder_stats in stats.values():
+            for message in folder_stats['errors']:
+                self.log(message)
+            self.result_log.add_item(
+                self.name, 'purge', folder_stats['path'], status='failed' if folder_stats['errors'] else 'purged', bytes=folder_stats['bytes'], files=folder_stats['files'],
+                duration=round(folder_stats['duration'], 4), error=folder_stats['errors'][0] if folder_stats['errors'] else ''
+            )
+        total_bytes = sum(folder_stats['bytes'] for folder_stats in stats.values())
+        total_files = sum(folder_stats['files'] for folder_stats in stats.values())
+        self.report(f'Time to purge: {len(stats)} trash items, {total_files} files deleted, {format_size(total_bytes)} freed in {duration:.2f}s')
+
+    def restore_from_trash(self, item_folders: list) -> dict:
+        """
+        Move items of the trash back to their original path.
+        :param item_folders: The folders of the items, see FolderTrash.list_items().
+        :return: {original path: error message, '' if restored}.
+        """
+        results = self.trash.restore(item_folders)
+        for path, error in results.items():
+            if error:
+                self.log(error)
+            else:
+                self.report(f'Restored {path}')
+            self.result_log.add_item(self.name, 'restore', path, status='failed' if error else 'restored', error=error)
+        return results
+
+    def plan_clean(self, folder_list: list, should_stop: Callable[[], bool] = None, parameters: dict = None) -> ChangePlan:
+        """
+        Make the plan of a cleaning: the folders to clean with their sizes. Nothing is deleted. The plan can be executed later by execute_plan().
+        If use_prune is set, the folders that can be pruned are listed with the bytes to free and the bytes kept, see plan_prune().
+        :param folder_list: The folders to clean.
+        :param should_stop: A function called regularly. If it returns True, the computation of the sizes stops.
+        :param parameters: The parameters to store in the plan, ie. the projects folder.
+        :return: The plan.
+        """
+        previews = self.plan_prune([folder for folder in folder_list if self.pruner.can_prune(folder)], should_stop=should_stop) if self.use_prune else {}
+        folder_list = [folder for folder in folder_list if folder not in previews]
+        sizes = {}
+        self.compute_sizes(folder_list, on_result=lambda folder, size, count: sizes.update({folder: (size, count)}), should_stop=should_stop)
+        plan = ChangePlan(self.name)
+        plan.parameters = parameters or {}
+        if previews:
+            plan.parameters.update(self.pruner.get_parameters())
+        for folder, preview in previews.items():
+            values = {'bytes': preview['bytes'], 'files': preview['files'], 'kept_bytes': preview['kept_bytes'], 'kept_files': preview['kept_files']}
+            plan.add(ACTION_PRUNE, folder, **values)
+            self.result_log.add_item(self.name, 'plan', folder, status=ACTION_PRUNE, **values)
+        for folder in folder_list:
+            size, count = sizes.get(folder, (0, 0))
+            plan.add(ACTION_DELETE, folder, bytes=size, files=count)
+            self.result_log.add_item(self.name, 'plan', folder, status=ACTION_DELETE, bytes=size, files=count)
+        return plan
+
+    def execute_plan(self, plan: ChangePlan, should_stop: Callable[[], bool] = None, on_progress: Callable[[int, int], None] = None) -> dict:
+        """
+        Execute a plan made by plan_clean(), without scanning the projects folder again.
+        The plan is not executed if one of its folders has changed since the plan was made.
+        The files to evict from the folders to prune are found again, with the limits stored in the plan: the files used since the plan are kept.
+        :param plan: The plan.
+        :param should_stop: A function called regularly. If it returns True, the cleaning stops.
+        :param on_progress: A function called with (folders done, folders total) each time a folder is cleaned.
+        :return: The stats of each cleaned folder (see FolderDeleter.delete()), empty if the plan has not been executed.
+        """
+        if plan.tool != self.name:
+            raise ValueError(f'This plan has been made by {plan.tool}, not by {self.name}.')
+        stale_items = plan.get_stale_items()
+        if stale_items:
+            self.log(f'The plan of {plan.created} is out of date: {len(stale_items)} folders have changed since. Make the plan again.')
+            for item in stale_items:
+                self.log(f'    Changed: {item["path"]}')
+            return {}
+        self.report(f'Executing the plan of {plan.created}')
+        stats = {}
+        pruned = [item['path'] for item in plan.get_items(ACTION_PRUNE)]
+        deleted = [item['path'] for item in plan.get_items(ACTION_DELETE)]
+        if pruned:
+            pruner = FolderPruner(
+                patterns=self.pruner.patterns, max_size=plan.parameters.get('prune_max_size', self.pruner.max_size),
+                max_days=plan.parameters.get('prune_max_days', self.pruner.max_days), order=plan.parameters.get('prune_by', self.pruner.order),
+                max_workers=self.pruner.max_workers
+            )
+            stats.update(self.prune_folders(pruned, should_stop=should_stop, on_progress=self._shift_progress(on_progress, 0, len(pruned) + len(deleted)), pruner=pruner))
+        if deleted or not pruned:
+            stats.update(self.clean_folders(
+                deleted, should_stop=should_stop, on_progress=self._shift_progress(on_progress, len(pruned), len(pruned) + len(deleted)), use_prune=False
+            ))
+        return stats
+
+    def end_report(self) -> None:
+        """
+        Write the summary of the phases and of the errors to the result log. The errors themselves have been written when they occurred.
+        """
+        self.report(self.stats.to_text())
+        if len(self.error_list) > 0:
+            self.report(f'###########\n{len(self.error_list)} Errors\n###########', LEVEL_WARNING)
+        else:
+            self.report('###########\nNo Errors\n###########')
@@ -0,0 +1,214 @@
+# coding=utf-8
+"""
+Implementation for:
+- FolderDeleter: A class to delete folders in parallel, at the file level.
+"""
+import os
+import stat
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+default_delete_workers = 8
+# number of files deleted by each job submitted to the pool
+_files_per_job = 64
+
+
+def lower_thread_priority() -> None:
+    """
+    Lower the CPU and I/O priority of the current thread, so it does not slow down the other applications, ie. a background purge.
+    On Windows, the thread enters the background processing mode. On Linux, its nice value is raised (the default I/O priority follows it).
+    It does nothing on the other systems or if the priority can't be changed.
+    """
+    try:
+        if sys.platform == 'win32':
+            import ctypes
+            thread_mode_background_begin = 0x00010000
+            ctypes.windll.kernel32.SetThreadPriority(ctypes.windll.kernel32.GetCurrentThread(), thread_mode_background_begin)
+        elif sys.platform.startswith('linux'):
+            # on Linux, the priority of a thread is set with its thread id
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (OSError, AttributeError):
+        pass
+
+
+class FolderDeleter:
+    """
+    A class to delete folders in parallel, at the file level.
+    The files of all the folders are deleted by a bounded pool of threads, then the empty folders are removed bottom-up.
+    :param max_workers: The number of threads used to delete the files.
+    :param low_priority: Whether the threads run at a low priority, see lower_thread_priority().
+    """
+
+    def __init__(self, max_workers: int = default_delete_workers, low_priority: bool = False):
+        self.max_workers = max(1, max_workers)
+        self.low_priority = low_priority
+        self.stats = {}  # stats for each deleted folder, see _new_stats()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def remove_nested_folders(folder_list: list) -> list:
+        """
+        Remove the folders that are inside another folder of the list, because they are deleted with their parent.
+        :param folder_list: The list of folders.
+        :return: The list of folders without the nested ones, sorted.
+        """
+        result = []
+        for folder in sorted(set(os.path.normpath(os.path.abspath(folder)) for folder in folder_list)):
+            # with a sorted list, a parent is always just before its children
+            if result and folder.startswith(result[-1].rstrip(os.sep) + os.sep):
+                continue
+            result.append(folder)
+        return result
+
+    @staticmethod
+    def _new_stats() -> dict:
+        """
+        Create the stats for a folder.
+        """
+        return {'files': 0, 'bytes': 0, 'errors': [], 'duration': 0.0, 'start': 0.0}
+
+    @staticmethod
+    def _list_folder(folder: str, errors: list) -> tuple[list, list]:
+        """
+        List the files and the sub folders of a folder.
+        :param folder: The folder to list.
+        :param errors: The list to add the errors to.
+        :return: A list of (file path, file size) and a list of the sub folders, parents first.
+        """
+        files = []
+        dirs = [folder]
+        index = 0
+        while index < len(dirs):
+            try:
+                with os.scandir(dirs[index]) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                dirs.append(entry.path)
+                            else:
+                                files.append((entry.path, entry.stat(follow_symlinks=False).st_size))
+                        except OSError as error:
+                            errors.append(f'Could not read {entry.path}: error {error!r}')
+            except OSError as error:
+                errors.append(f'Could not scan {dirs[index]}: error {error!r}')
+            index += 1
+        return files, dirs
+
+    def _delete_files(self, files: list, stats: dict) -> None:
+        """
+        Delete a list of files. Run in a thread of the pool.
+        :param files: A list of (file path, file size).
+        :param stats: The stats of the folder the files belong to.
+        """
+        count = 0
+        size = 0
+        errors = []
+        for path, file_size in files:
+            try:
+                try:
+                    os.unlink(path)
+                except PermissionError:
+                    # read-only files can't be deleted on Windows
+                    os.chmod(path, stat.S_IWRITE)
+                    os.unlink(path)
+                count += 1
+                size += file_size
+            except OSError as error:
+                errors.append(f'Could not delete {path}: error {error!r}')
+        with self._lock:
+            stats['files'] += count
+            stats['bytes'] += size
+            stats['errors'].extend(errors)
+
+    def delete(self, folder_list: list, should_stop: Callable[[], bool] = None, on_progress: Callable[[int, int], None] = None) -> dict:
+        """
+        Delete a list of folders. Nested folders are removed from the list first.
+        :param folder_list: The folders to delete.
+        :param should_stop: A function called regularly. If it returns True, no more files are deleted.
+        :param on_progress: A function called with (folders done, folders total) each time a folder is deleted.
+        :return: The stats of each deleted folder: number of files deleted, bytes freed, errors and duration.
+        """
+        folder_list = self.remove_nested_folders(folder_list)
+        total = len(folder_list)
+        self.stats = {}
+        # bound the number of jobs waiting in the pool to keep the memory usage low
+        slots = threading.BoundedSemaphore(self.max_workers * 4)
+        pending = []  # (folder, dirs, futures) for the folders whose files are being deleted
+        done = 0
+        if self.low_priority:
+            lower_thread_priority()  # the thread that lists the folders
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='FolderDeleter', initializer=lower_thread_priority if self.low_priority else None) as executor:
+            for folder in folder_list:
+                if should_stop is not None and should_stop():
+                    break
+                stats = self._new_stats()
+                stats['start'] = time.perf_counter()
+                self.stats[folder] = stats
+                if os.path.islink(folder):
+                    # never delete the content of the target of a link
+                    files, dirs = [(folder, 0)], []
+                else:
+                    files, dirs = self._list_folder(folder, stats['errors'])
+                futures = []
+                for start in range(0, len(files), _files_per_job):
+                    if should_stop is not None and should_stop():
+                        break
+                    slots.acquire()
+                    future = executor.submit(self._delete_files, files[start:start + _files_per_job], stats)
+                    future.add_done_callback(lambda _future: slots.release())
+                    futures.append(future)
+                pending.append((folder, dirs, futures))
+                # finish the folders whose files are already deleted while the next ones are listed
+                while pending and all(future.done() for future in pending[0][2]):
+                    done += 1
+                    self._finish_folder(pending.pop(0), done, total, on_progress)
+            while pending:
+                done += 1
+                self._finish_folder(pending.pop(0), done, total, on_progress)
+        return self.stats
+
+    def delete_files(self, files: list, should_stop: Callable[[], bool] = None) -> dict:
+        """
+        Delete a list of files, ie. the files evicted from a cache. Their folders are not removed.
+        :param files: A list of (file path, file size).
+        :param should_stop: A function called regularly. If it returns True, no more files are deleted.
+        :return: The stats of the files: number of files deleted, bytes freed, errors and duration.
+        """
+        stats = self._new_stats()
+        stats['start'] = time.perf_counter()
+        slots = threading.BoundedSemaphore(self.max_workers * 4)
+        if self.low_priority:
+            lower_thread_priority()
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='FolderDeleter', initializer=lower_thread_priority if self.low_priority else None) as executor:
+            for start in range(0, len(files), _files_per_job):
+                if should_stop is not None and should_stop():
+                    break
+                slots.acquire()
+                executor.submit(self._delete_files, files[start:start + _files_per_job], stats).add_done_callback(lambda _future: slots.release())
+        stats['duration'] = time.perf_counter() - stats.pop('start')
+        return stats
+
+    def _finish_folder(self, pending: tuple, done: int, total: int, on_progress: Callable[[int, int], None] = None) -> None:
+        """
+        Wait for the files of a folder to be deleted, then remove its (now empty) sub folders, children first.
+        :param pending: The folder, its sub folders (parents first) and the futures of the jobs deleting its files.
+        :param done: The number of folders done, including this one.
+        :param total: The total number of folders.
+        :param on_progress: A function called with (done, total).
+        """
+        folder, dirs, futures = pending
+        stats = self.stats[folder]
+        for future in futures:
+            future.result()
+        for path in reversed(dirs):
+            try:
+                os.rmdir(path)
+            except OSError as error:
+                if os.path.isdir(path):
+                    stats['errors'].append(f'Could not remove {path}: error {error!r}')
+        stats['duration'] = time.perf_counter() - stats.pop('start')
+        if on_progress is not None:
+            on_progress(done, total)
@@ -0,0 +1,168 @@
+# coding=utf-8
+"""
+Implementation for:
+- FolderPruner: Partially clean cache folders by evicting their least recently used files, down to a size target or an age threshold.
+"""
+import os
+import time
+from typing import Callable
+
+from modules.CleaningRulesClass import CleaningRules
+from modules.FolderDeleterClass import FolderDeleter, default_delete_workers
+
+# the folders that can be pruned file by file instead of being deleted. They can be changed in the configuration file
+default_prune_patterns = ['DerivedDataCache', 'Intermediate']
+default_prune_max_size = 10 * 1024 ** 3  # the size kept for the pruned folders of a project, in bytes
+default_prune_max_days = 30  # the files not used for this number of days are evicted
+
+# the time used to order the files
+PRUNE_BY_ACCESS = 'access'  # the last access, or the last modification if it's more recent (ie. a volume mounted with noatime)
+PRUNE_BY_MODIFICATION = 'modification'  # the last modification, ie. when the access times are not updated by the system
+
+
+class FolderPruner:
+    """
+    Partially clean cache folders (ie. DerivedDataCache) by evicting their least recently used files, down to a size target or an age threshold.
+    A cache deleted as a whole is rebuilt at the next launch of the editor, which can take a long time for the shaders. Pruning it only evicts
+    the files that have not been used for a while: the hot entries survive.
+    The files of all the folders of a plan share the same size target, so the folders of a project are pruned together, see plan().
+    :param patterns: The patterns of the folders that can be pruned, see CleaningRules. If None, the default patterns are used.
+    :param max_size: The size to keep for the folders of a plan, in bytes. The least recently used files above it are evicted. 0 for no size target.
+    :param max_days: The number of days a file is kept after its last use. 0 for no age threshold.
+    :param order: The time used to order the files: PRUNE_BY_ACCESS or PRUNE_BY_MODIFICATION.
+    :param max_workers: The number of threads used to delete the files.
+    """
+
+    def __init__(self, patterns=None, max_size: int = default_prune_max_size, max_days: int = default_prune_max_days, order: str = PRUNE_BY_ACCESS,
+                 max_workers: int = default_delete_workers):
+        self.patterns = list(default_prune_patterns if patterns is None else patterns)
+        self.rules = CleaningRules(include=self.patterns, exclude=[], skip=[])
+        self.max_size = max(0, max_size)
+        self.max_days = max(0, max_days)
+        self.order = order if order in (PRUNE_BY_ACCESS, PRUNE_BY_MODIFICATION) else PRUNE_BY_ACCESS
+        self.max_workers = max_workers
+
+    def get_parameters(self) -> dict:
+        """
+        Get the limits of the pruner, ie. to store them in a plan.
+        """
+        return {'prune_max_size': self.max_size, 'prune_max_days': self.max_days, 'prune_by': self.order}
+
+    def can_prune(self, folder: str) -> bool:
+        """
+        Check if a folder can be pruned instead of being deleted.
+        :param folder: The folder.
+        """
+        return self.rules.is_match(os.path.dirname(folder), os.path.basename(folder))
+
+    def _list_files(self, folder: str, errors: list) -> list:
+        """
+        List the files of a folder with their size and their time of last use. The stats come from scandir: on Windows they are read with the
+        folder itself, without opening each file.
+        :param folder: The folder.
+        :param errors: The list to add the errors to.
+        :return: A list of (time of last use, size, file path).
+        """
+        by_access = self.order == PRUNE_BY_ACCESS
+        files = []
+        dirs = [folder]
+        while dirs:
+            path = dirs.pop()
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                dirs.append(entry.path)
+                                continue
+                            stats = entry.stat(follow_symlinks=False)
+                        except OSError as error:
+                            errors.append(f'Could not read {entry.path}: error {error!r}')
+                            continue
+                        last_use = max(stats.st_atime, stats.st_mtime) if by_access else stats.st_mtime
+                        files.append((last_use, stats.st_size, entry.path))
+            except OSError as error:
+                errors.append(f'Could not scan {path}: error {error!r}')
+        return files
+
+    def plan(self, folder_list: list, should_stop: Callable[[], bool] = None) -> dict:
+        """
+        Find the files to evict from a group of folders, ie. the pruned folders of a project: the files older than max_days,
+        then the least recently used files until the size of the files kept is under max_size. Nothing is deleted.
+        :param folder_list: The folders of the group.
+        :param should_stop: A function called before each folder. If it returns True, the listing stops and nothing is evicted.
+        :return: A preview of each folder: {'bytes' and 'files' to free, 'kept_bytes', 'kept_files', 'oldest_kept': time of last use of the oldest file kept,
+            'errors', 'evict': list of (file path, size) to delete, see prune()}.
+        """
+        previews = {}
+        files = []  # (time of last use, size, path, folder) of all the folders
+        for folder in folder_list:
+            if should_stop is not None and should_stop():
+                return {}
+            preview = {'bytes': 0, 'files': 0, 'kept_bytes': 0, 'kept_files': 0, 'oldest_kept': 0.0, 'errors': [], 'evict': []}
+            previews[folder] = preview
+            files.extend(item + (folder,) for item in self._list_files(folder, preview['errors']))
+        files.sort()
+        kept_size = sum(item[1] for item in files)
+        min_time = time.time() - self.max_days * 86400 if self.max_days else 0
+        # the least recently used files first: once a file is kept, all the more recent ones are kept too
+        index = 0
+        while index < len(files):
+            last_use, size, path, folder = files[index]
+            if last_use >= min_time and (not self.max_size or kept_size <= self.max_size):
+                break
+            preview = previews[folder]
+            preview['evict'].append((path, size))
+            preview['bytes'] += size
+            preview['files'] += 1
+            kept_size -= size
+            index += 1
+        for last_use, size, path, folder in files[index:]:
+            preview = previews[folder]
+            if not preview['kept_files']:
+                preview['oldest_kept'] = last_use
+            preview['kept_bytes'] += size
+            preview['kept_files'] += 1
+        return previews
+
+    def prune(self, previews: dict, should_stop: Callable[[], bool] = None, on_progress: Callable[[int, int], None] = None) -> dict:
+        """
+        Delete the files to evict of a plan, then the sub folders they leave empty. The pruned folders themselves are kept.
+        :param previews: The previews of the folders, see plan().
+        :param should_stop: A function called regularly. If it returns True, no more files are deleted.
+        :param on_progress: A function called with (folders done, folders total) each time a folder is pruned.
+        :return: The stats of each pruned folder, see FolderDeleter.delete(), with the size and the number of files kept in 'kept_bytes' and 'kept_files'.
+        """
+        deleter = FolderDeleter(max_workers=self.max_workers)
+        stats = {}
+        for done, (folder, preview) in enumerate(previews.items(), 1):
+            if should_stop is not None and should_stop():
+                break
+            folder_stats = deleter.delete_files(preview['evict'], should_stop=should_stop)
+            folder_stats['errors'] = preview['errors'] + folder_stats['errors']
+            folder_stats['kept_bytes'] = preview['kept_bytes'] + preview['bytes'] - folder_stats['bytes']
+            folder_stats['kept_files'] = preview['kept_files'] + preview['files'] - folder_stats['files']
+            self._remove_empty_folders(folder, preview['evict'])
+            stats[folder] = folder_stats
+            if on_progress is not None:
+                on_progress(done, len(previews))
+        return stats
+
+    @staticmethod
+    def _remove_empty_folders(folder: str, files: list) -> None:
+        """
+        Remove the sub folders of a pruned folder that are empty once its files have been evicted, children first.
+        :param folder: The pruned folder, kept even if it's empty.
+        :param files: The evicted files, as (file path, size).
+        """
+        parents = set()
+        for path, _size in files:
+            parent = os.path.dirname(path)
+            while parent != folder and parent not in parents and parent.startswith(folder + os.sep):
+                parents.add(parent)
+                parent = os.path.dirname(parent)
+        for parent in sorted(parents, key=len, reverse=True):
+            try:
+                os.rmdir(parent)
+            except OSError:
+                pass  # not empty: it contains files that are kept
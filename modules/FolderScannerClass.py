@@ -0,0 +1,265 @@
+# coding=utf-8
+"""
+Implementation for:
+- FolderScanner: A fast folder scanner based on os.scandir.
+"""
+import os
+from typing import Callable, Iterator
+
+from modules.CleaningRulesClass import CleaningRules, default_names_to_skip, ignore_filename  # noqa: F401  default_names_to_skip is imported from here by the tools
+from modules.ScanIndexClass import ScanIndex
+
+# the files that mark the root of a project or of a plugin
+project_suffix = '.uproject'
+plugin_suffix = '.uplugin'
+root_suffixes = (project_suffix, plugin_suffix)
+# the folder of a project where its plugins are
+plugins_folder_name = 'Plugins'
+
+
+def is_project_file(name: str) -> bool:
+    """
+    Check if a file marks the folder of a project. The comparison is case-sensitive, like the files kept by the scan index (see ScanIndex),
+    so a folder is a project for a search from the index and for a search from the disk alike.
+    :param name: The name of the file.
+    """
+    return name.endswith(project_suffix)
+
+
+def is_root_file(name: str) -> bool:
+    """
+    Check if a file marks the folder of a project or of a plugin. See is_project_file().
+    :param name: The name of the file.
+    """
+    return name.endswith(root_suffixes)
+
+
+# modes of the project-aware search, see FolderScanner.scan_projects()
+_SEARCH = 0  # searching the projects, outside of any project or plugin
+_IN_ROOT = 1  # in a project or a plugin, only the folders that can contain a folder to find are visited
+_IN_PLUGINS = 2  # in the plugins folder of a project, searching its plugins
+# the state of the root of a project-aware search, see FolderScanner.iter_projects()
+search_state = (_SEARCH, '', ())
+
+
+class FolderScanner:
+    """
+    A fast folder scanner based on os.scandir.
+    It yields the folders selected by the cleaning rules and does not descend into them.
+    Folders that are skipped or excluded by the rules are neither yielded nor descended into.
+    The ignore files found during the scan change the rules of the folders under them.
+    :param names_to_find: The names of the folders to find. Not used if rules is given.
+    :param names_to_skip: The names of the folders to skip. If None, default_names_to_skip is used. Not used if rules is given.
+    :param index: The scan index used to read only the folders that have changed since the last scan. If None, all the folders are read.
+    :param rules: The cleaning rules. If None, rules are made from names_to_find and names_to_skip.
+    """
+
+    def __init__(self, names_to_find=(), names_to_skip=None, index: ScanIndex = None, rules: CleaningRules = None):
+        self.rules = CleaningRules(include=names_to_find, skip=names_to_skip) if rules is None else rules
+        self.index = index
+        self.dirs_visited = 0
+        self.error_list = []
+
+    def scan(self, root: str, should_stop: Callable[[], bool] = None) -> Iterator[str]:
+        """
+        Scan a folder and yield the path of the folders to find, in a top-down order.
+        :param root: The folder to scan.
+        :param should_stop: A function called before reading each folder. If it returns True, the scan stops.
+        :return: An iterator on the normalized paths of the folders found.
+        """
+        for _path, found in self.iter_folders(root, should_stop):
+            yield from found
+
+    def iter_folders(self, root: str, should_stop: Callable[[], bool] = None, rules: CleaningRules = None,
+                     before_read: Callable[[str], None] = None) -> Iterator[tuple[str, list]]:
+        """
+        Scan a folder and yield each visited folder with the folders to find it contains, in a top-down order.
+        :param root: The folder to scan.
+        :param should_stop: A function called before reading each folder. If it returns True, the scan stops.
+        :param rules: The rules that apply to the content of the root, ie. from CleaningRules.get_folder_rules(). If None, the rules of the scanner are used.
+        :param before_read: A function called with each folder before it is read, ie. to watch it.
+        :return: An iterator on (normalized path of the folder, normalized paths of the folders found in it).
+        """
+        self.dirs_visited = 0
+        self.error_list = []
+        if self.index is not None:
+            self.index.error_list = []
+        join = os.path.join
+        rules_stack = [('', self.rules if rules is None else rules)]  # (folder of the ignore file + os.sep, rules), the last one applies
+        stack = [os.path.normpath(root)]
+        while stack:
+            if should_stop is not None and should_stop():
+                break
+            path = stack.pop()
+            self.dirs_visited += 1
+            if before_read is not None:
+                before_read(path)
+            dirs, files = self._list_dir(path)
+            rules = self._get_rules(rules_stack, path, files)
+            is_match = rules.is_match
+            should_visit = rules.should_visit
+            found = []
+            sub_dirs = []
+            for name in dirs:
+                if is_match(path, name):
+                    # no need to go deeper: the whole folder will be cleaned
+                    found.append(join(path, name))
+                elif should_visit(path, name):
+                    sub_dirs.append(join(path, name))
+            yield path, found
+            # reversed to keep the listing order when popping from the stack
+            stack.extend(reversed(sub_dirs))
+        if self.index is not None:
+            self.error_list.extend(self.index.error_list)
+
+    def scan_projects(self, root: str, should_stop: Callable[[], bool] = None, include_orphans: bool = False) -> Iterator[tuple[str, str]]:
+        """
+        Scan a folder for projects and yield the folders to find of each project, in a top-down order.
+        A project is a folder that contains a .uproject file, a plugin a folder that contains a .uplugin file. The plugins of a project are searched
+        in its Plugins folder. A plugin that is not in a project is its own project.
+        In a project or a plugin, only its folders to find and the folders that start an include pattern (ie. Saved for 'Saved/Logs') are visited,
+        so the sources and the contents are never read and the cost of the scan depends on the number of projects, not on the number of folders.
+        The folders to find that are not in a project nor in a plugin are orphans, ie. a Build folder of scripts: they are only yielded if include_orphans is True.
+        :param root: The folder to scan.
+        :param should_stop: A function called before reading each folder. If it returns True, the scan stops.
+        :param include_orphans: Whether to yield the orphans.
+        :return: An iterator on (project folder, normalized path of the folder found). The project folder of an orphan is ''.
+        """
+        for _path, _state, found in self.iter_projects(root, should_stop=should_stop, include_orphans=include_orphans):
+            yield from found
+
+    def iter_projects(self, root: str, should_stop: Callable[[], bool] = None, include_orphans: bool = False, state: tuple = search_state,
+                      rules: CleaningRules = None, before_read: Callable[[str, tuple], None] = None) -> Iterator[tuple[str, tuple, list]]:
+        """
+        Scan a folder for projects like scan_projects(), and yield each visited folder with the folders to find it contains, in a top-down order.
+        The state of a folder tells what the search does with its content: (mode, project folder, names of the folders from the project or plugin folder).
+        :param root: The folder to scan.
+        :param should_stop: A function called before reading each folder. If it returns True, the scan stops.
+        :param include_orphans: Whether to yield the orphans.
+        :param state: The state the root is visited with, ie. from get_sub_state() for a folder created after a scan. By default, the root is searched for projects.
+        :param rules: The rules that apply to the content of the root, ie. from CleaningRules.get_folder_rules(). If None, the rules of the scanner are used.
+        :param before_read: A function called with each folder and the state it's visited with, before it is read, ie. to watch it.
+        :return: An iterator on (normalized path of the folder, state of its content, [(project folder, normalized path of a folder found in it)]).
+        """
+        self.dirs_visited = 0
+        self.error_list = []
+        if self.index is not None:
+            self.index.error_list = []
+        join = os.path.join
+        rules_stack = [('', self.rules if rules is None else rules)]
+        stack = [(os.path.normpath(root), state)]
+        while stack:
+            if should_stop is not None and should_stop():
+                break
+            path, state = stack.pop()
+            self.dirs_visited += 1
+            if before_read is not None:
+                before_read(path, state)
+            dirs, files = self._list_dir(path)
+            rules = self._get_rules(rules_stack, path, files)
+            state = self.get_content_state(state, path, files)
+            mode = state[0]
+            found = []
+            sub_dirs = []
+            for name in dirs:
+                if rules.is_match(path, name):
+                    # no need to go deeper: the whole folder will be cleaned
+                    if mode == _IN_ROOT or include_orphans:
+                        found.append((self.get_project(state), join(path, name)))
+                else:
+                    sub_state = self.get_sub_state(rules, path, name, state)
+                    if sub_state is not None:
+                        sub_dirs.append((join(path, name), sub_state))
+            yield path, state, found
+            # reversed to keep the listing order when popping from the stack
+            stack.extend(reversed(sub_dirs))
+        if self.index is not None:
+            self.error_list.extend(self.index.error_list)
+
+    @staticmethod
+    def get_content_state(state: tuple, path: str, files: list) -> tuple:
+        """
+        Get the state of the content of a folder of the project-aware search, from the state it's visited with and its files.
+        :param state: The state the folder is visited with, see iter_projects().
+        :param path: The folder.
+        :param files: The names of its files, at least its project and plugin files.
+        :return: The state of its content.
+        """
+        mode, project, parts = state
+        if mode != _IN_ROOT and any(is_root_file(name) for name in files):
+            # the plugins of a project are grouped with it
+            if mode == _SEARCH or any(is_project_file(name) for name in files):
+                project = path
+            return _IN_ROOT, project, ()
+        return state
+
+    @staticmethod
+    def get_project(state: tuple) -> str:
+        """
+        Get the project of the folders to find in a folder of the project-aware search.
+        :param state: The state of the content of the folder, see get_content_state().
+        :return: The project folder, or '' if the folders to find are orphans.
+        """
+        return state[1] if state[0] == _IN_ROOT else ''
+
+    @staticmethod
+    def get_sub_state(rules: CleaningRules, path: str, name: str, state: tuple):
+        """
+        Get the state a sub folder is visited with by the project-aware search, if it's visited. The folders to find are not visited.
+        :param rules: The rules of the content of the folder.
+        :param path: The folder.
+        :param name: The name of the sub folder.
+        :param state: The state of the content of the folder, see get_content_state().
+        :return: The state of the sub folder, or None if it's not visited.
+        """
+        mode, project, parts = state
+        if not rules.should_visit(path, name):
+            return None
+        if mode != _IN_ROOT:
+            return mode, project, ()
+        if not parts and name == plugins_folder_name:
+            return _IN_PLUGINS, project, ()
+        if rules.is_include_prefix(parts + (name, ), os.path.join(path, name)):
+            return _IN_ROOT, project, parts + (name, )
+        return None
+
+    @staticmethod
+    def _get_rules(rules_stack: list, path: str, files: list) -> CleaningRules:
+        """
+        Get the rules of the content of a folder and update the stack of the rules of the ignore files.
+        :param rules_stack: The stack of (folder of an ignore file + os.sep, rules). The first item are the rules of the scan.
+        :param path: The folder being read.
+        :param files: The tracked files of the folder.
+        """
+        # the scan is a depth-first walk: the rules of the folders that have been left are at the top
+        while len(rules_stack) > 1 and not path.startswith(rules_stack[-1][0]):
+            rules_stack.pop()
+        rules = rules_stack[-1][1]
+        if ignore_filename in files:
+            rules = rules.with_ignore_file(path)
+            rules_stack.append((path + os.sep, rules))
+        return rules
+
+    def _list_dir(self, path: str) -> tuple[list, list]:
+        """
+        Read a folder, from the scan index if there is one.
+        :param path: The normalized path of the folder.
+        :return: The names of the sub folders, links excluded, and the names of the project, plugin and ignore files.
+        """
+        if self.index is not None:
+            return self.index.list_dir(path)
+        dirs = []
+        files = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            dirs.append(entry.name)
+                        elif is_root_file(entry.name) or entry.name == ignore_filename:
+                            files.append(entry.name)
+                    except OSError:
+                        continue
+        except OSError as error:
+            self.error_list.append(f'Could not scan {path}: error {error!r}')
+        return dirs, files
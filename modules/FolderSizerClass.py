@@ -0,0 +1,196 @@
+# coding=utf-8
+"""
+Implementation for:
+- FolderSizer: A class to compute the size of folders concurrently, with a cache based on the folder modification times.
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable
+
+from modules.functions import atomic_write, FileLock
+
+default_size_workers = 8
+
+
+class FolderSizer:
+    """
+    A class to compute the size of folders concurrently, with a cache based on the folder modification times.
+    The cache stores the size of the files directly inside each folder. A folder is read again only if its modification time has changed.
+    Note: the modification time of a folder changes when a file is added, removed or renamed in it, not when a file is modified in place.
+    :param max_workers: The number of threads used to compute the sizes.
+    :param cache_file: The file used to save the cache between two runs. If None, the cache is only kept in memory.
+    """
+
+    def __init__(self, max_workers: int = default_size_workers, cache_file: str = None):
+        self.max_workers = max(1, max_workers)
+        self.cache_file = cache_file
+        self.cache = {}  # {folder path: [mtime_ns, bytes of its files, number of files, sub folder names]}
+        self.dirs_read = 0  # number of folders read from the disk, ie. not found in the cache
+        self.error_list = []
+        # the changes since the last load or save, merged into the cache file by save()
+        self._changed = set()  # the folders read from the disk
+        self._removed = []  # the folders removed with their sub folders
+        self.load()
+
+    def _read_cache(self) -> dict:
+        """
+        Read the cache file.
+        :return: The cache, empty if the file does not exist or can't be read.
+        """
+        if not os.path.isfile(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, 'r') as file:
+                cache = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        return cache if isinstance(cache, dict) else {}
+
+    def load(self) -> None:
+        """
+        Load the cache from the cache file.
+        """
+        if self.cache_file is not None:
+            self.cache = self._read_cache()
+
+    def save(self) -> None:
+        """
+        Save the cache to the cache file.
+        The cache is shared by the windows, the jobs and the command line: the changes since the load are merged into the current content of the file
+        under a file lock, and the file is written atomically. If it can't be saved, the error is added to error_list.
+        """
+        if self.cache_file is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            with FileLock(self.cache_file + '.lock'):
+                cache = self._read_cache()
+                for folder in self._removed:
+                    self._remove(cache, folder)
+                cache.update((path, self.cache[path]) for path in self._changed if path in self.cache)
+                atomic_write(self.cache_file, json.dumps(cache).encode('utf-8'))
+        except OSError as error:
+            # ie. the file is locked by another run for too long (TimeoutError): the folders are only read again by the next computation
+            self.error_list.append(f'Could not save the sizes cache to {self.cache_file}: error {error!r}')
+            return
+        self.cache = cache
+        self._changed = set()
+        self._removed = []
+
+    @staticmethod
+    def _remove(cache: dict, folder: str) -> None:
+        """
+        Remove a folder and its sub folders from a cache.
+        :param cache: The cache.
+        :param folder: The normalized path of the folder.
+        """
+        prefix = folder + os.sep
+        for path in [path for path in cache if path == folder or path.startswith(prefix)]:
+            del cache[path]
+
+    def forget(self, folder: str) -> None:
+        """
+        Remove a folder and its sub folders from the cache. Used when a folder has been deleted.
+        :param folder: The folder.
+        """
+        folder = os.path.normpath(folder)
+        self._remove(self.cache, folder)
+        self._removed.append(folder)
+
+    def _read_dir(self, path: str, mtime_ns: int) -> list:
+        """
+        Read the content of a folder and update the cache.
+        :param path: The folder to read.
+        :param mtime_ns: The modification time of the folder.
+        :return: The cache entry of the folder.
+        """
+        size = 0
+        count = 0
+        sub_dirs = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            sub_dirs.append(entry.name)
+                        else:
+                            size += entry.stat(follow_symlinks=False).st_size
+                            count += 1
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        self.dirs_read += 1
+        cached = [mtime_ns, size, count, sub_dirs]
+        self.cache[path] = cached
+        self._changed.add(path)
+        return cached
+
+    def get_size(self, folder: str, should_stop: Callable[[], bool] = None) -> tuple[int, int]:
+        """
+        Compute the size of a folder.
+        :param folder: The folder.
+        :param should_stop: A function called before reading each folder. If it returns True, the computation stops.
+        :return: The size in bytes and the number of files of the folder.
+        """
+        size = 0
+        count = 0
+        stack = [os.path.normpath(folder)]
+        while stack:
+            if should_stop is not None and should_stop():
+                break
+            path = stack.pop()
+            try:
+                mtime_ns = os.stat(path, follow_symlinks=False).st_mtime_ns
+            except OSError:
+                if self.cache.pop(path, None) is not None:
+                    self._removed.append(path)
+                continue
+            cached = self.cache.get(path)
+            if cached is None or cached[0] != mtime_ns:
+                cached = self._read_dir(path, mtime_ns)
+            size += cached[1]
+            count += cached[2]
+            stack.extend(os.path.join(path, name) for name in cached[3])
+        return size, count
+
+    def get_cached_size(self, folder: str) -> tuple[int, int]:
+        """
+        Get the size of a folder from the cache only, without reading the disk, ie. for a folder whose size has just been computed.
+        If the folder is not in the cache, its size is computed, see get_size().
+        :param folder: The folder.
+        :return: The size in bytes and the number of files of the folder.
+        """
+        folder = os.path.normpath(folder)
+        if folder not in self.cache:
+            return self.get_size(folder)
+        size = 0
+        count = 0
+        stack = [folder]
+        while stack:
+            path = stack.pop()
+            cached = self.cache.get(path)
+            if cached is None:
+                continue
+            size += cached[1]
+            count += cached[2]
+            stack.extend(os.path.join(path, name) for name in cached[3])
+        return size, count
+
+    def compute(self, folder_list: list, on_result: Callable[[str, int, int], None], should_stop: Callable[[], bool] = None) -> None:
+        """
+        Compute the sizes of a list of folders concurrently, then save the cache.
+        :param folder_list: The folders.
+        :param on_result: A function called with (folder, size in bytes, number of files) each time a size is computed.
+        :param should_stop: A function called regularly. If it returns True, the computation stops.
+        """
+        self.dirs_read = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='FolderSizer') as executor:
+            futures = {executor.submit(self.get_size, folder, should_stop): folder for folder in folder_list}
+            for future in as_completed(futures):
+                if should_stop is not None and should_stop():
+                    break
+                size, count = future.result()
+                on_result(futures[future], size, count)
+        self.save()
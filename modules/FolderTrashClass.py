@@ -0,0 +1,274 @@
+# coding=utf-8
+"""
+Implementation for:
+- FolderTrash: Stage folders in a trash folder of their volume, then purge them in the background or restore them.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Callable
+
+from modules.FolderDeleterClass import FolderDeleter
+from modules.functions import atomic_write
+
+# the name of the trash folder, created at the root of each volume, or in the highest writable folder of the volume
+trash_folder_name = '.uetools_trash'
+# the files of a staged item, in its folder of the trash
+item_filename = 'item.json'
+content_folder_name = 'content'
+
+default_purge_workers = 2  # the purge runs in the background, at a low priority
+default_trash_max_size = 20 * 1024 ** 3  # the size of the most recent items kept for a restore, in bytes
+default_trash_max_days = 7  # the items older than this are purged
+
+
+class FolderTrash:
+    """
+    Stage folders in a trash folder of their volume, then purge them in the background or restore them.
+    Staging a folder is a rename, so it takes the same time for an empty folder and for a 40 GB DerivedDataCache, as long as the trash
+    is on the same volume: the folder is freed at once, its content is deleted later by purge(), at a low priority.
+    Each staged item is a folder of the trash, with the staged folder (content) and its original path and size (item.json).
+    An item can be restored until it is purged. The purge keeps the most recent items up to the size cap, for the days set by max_days.
+    :param registry_file: The file of the list of the trash folders in use, so the items of all the volumes can be listed. If None, the list is only kept in memory.
+    :param max_size: The size cap of the trash, in bytes. The oldest items above it are purged by purge().
+    :param max_days: The number of days an item is kept. 0 to keep the items until they are above the size cap.
+    :param purge_workers: The number of threads used to purge the items.
+    """
+    _purge_lock = threading.Lock()  # only one purge at a time in the process: the trash folders are shared
+    _purger = None  # the thread of purge_in_background()
+
+    def __init__(self, registry_file: str = None, max_size: int = default_trash_max_size, max_days: int = default_trash_max_days, purge_workers: int = default_purge_workers):
+        self.registry_file = registry_file
+        self.max_size = max(0, max_size)
+        self.max_days = max(0, max_days)
+        self.purge_workers = max(1, purge_workers)
+        self.trash_folders = []  # the trash folders in use
+        self._volume_trash = {}  # {device id: trash folder}
+        self.load()
+
+    def load(self) -> None:
+        """
+        Load the list of the trash folders from the registry file.
+        """
+        if self.registry_file is None or not os.path.isfile(self.registry_file):
+            return
+        try:
+            with open(self.registry_file, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            self.trash_folders = [folder for folder in data.get('trash_folders', []) if isinstance(folder, str)]
+        except (OSError, ValueError, AttributeError):
+            self.trash_folders = []
+
+    def save(self) -> None:
+        """
+        Save the list of the trash folders to the registry file.
+        """
+        if self.registry_file is None:
+            return
+        os.makedirs(os.path.dirname(self.registry_file), exist_ok=True)
+        atomic_write(self.registry_file, json.dumps({'trash_folders': self.trash_folders}, indent=2).encode('utf-8'))
+
+    def get_trash_folder(self, folder: str) -> str:
+        """
+        Get the trash folder of the volume of a folder, and create it if needed.
+        It's created at the root of the volume, or in the highest folder of the volume that can be written, ie. the home folder.
+        :param folder: The folder to stage.
+        :return: The trash folder, or '' if no folder of the volume can be written.
+        """
+        try:
+            device = os.stat(folder, follow_symlinks=False).st_dev
+        except OSError:
+            return ''
+        trash = self._volume_trash.get(device)
+        if trash is not None:
+            return trash
+        parents = []
+        path = os.path.dirname(os.path.normpath(os.path.abspath(folder)))
+        while True:
+            parents.append(path)
+            parent = os.path.dirname(path)
+            if os.path.ismount(path) or parent == path:
+                break
+            path = parent
+        trash = ''
+        # from the root of the volume down to the parent of the folder
+        for parent in reversed(parents):
+            candidate = os.path.join(parent, trash_folder_name)
+            try:
+                os.makedirs(candidate, exist_ok=True)
+                if os.stat(candidate).st_dev == device and os.access(candidate, os.W_OK):
+                    trash = candidate
+                    break
+            except OSError:
+                continue
+        self._volume_trash[device] = trash
+        if trash and trash not in self.trash_folders:
+            self.trash_folders.append(trash)
+            self.save()
+        return trash
+
+    def stage(self, folder_list: list, should_stop: Callable[[], bool] = None, on_progress: Callable[[int, int], None] = None,
+              get_size: Callable[[str], tuple[int, int]] = None) -> dict:
+        """
+        Move a list of folders to the trash of their volume. Nested folders are removed from the list first.
+        A folder that can't be moved (ie. no trash on its volume, or a file in use on Windows) is not staged and has an error.
+        :param folder_list: The folders to stage.
+        :param should_stop: A function called before each folder. If it returns True, the staging stops.
+        :param on_progress: A function called with (folders done, folders total) each time a folder is staged.
+        :param get_size: A function that returns the size in bytes and the number of files of a folder, stored with the item. If None, the size is not known.
+        :return: The stats of each folder, see FolderDeleter.delete(), and the folder of its item in 'staged' ('' if not staged).
+        """
+        folder_list = FolderDeleter.remove_nested_folders(folder_list)
+        stats = {}
+        for done, folder in enumerate(folder_list, 1):
+            if should_stop is not None and should_stop():
+                break
+            start = time.perf_counter()
+            size, count = get_size(folder) if get_size is not None else (0, 0)
+            folder_stats = {'files': count, 'bytes': size, 'errors': [], 'duration': 0.0, 'staged': ''}
+            stats[folder] = folder_stats
+            trash = self.get_trash_folder(folder)
+            if not trash:
+                folder_stats['errors'].append(f'Could not stage {folder}: no writable folder for the trash on its volume')
+            else:
+                item_folder = os.path.join(trash, f'{time.time_ns()}_{os.path.basename(folder)}')
+                try:
+                    os.mkdir(item_folder)
+                    # the item is described before the move, so a folder moved by an interrupted run can still be restored
+                    atomic_write(os.path.join(item_folder, item_filename), json.dumps({'path': folder, 'bytes': size, 'files': count, 'staged': time.time()}).encode('utf-8'))
+                    os.rename(folder, os.path.join(item_folder, content_folder_name))
+                    folder_stats['staged'] = item_folder
+                except OSError as error:
+                    folder_stats['errors'].append(f'Could not stage {folder}: error {error!r}')
+                    shutil.rmtree(item_folder, ignore_errors=True)
+            folder_stats['duration'] = time.perf_counter() - start
+            if on_progress is not None:
+                on_progress(done, len(folder_list))
+        return stats
+
+    def list_items(self) -> list:
+        """
+        Get the staged items of all the trash folders, the oldest first.
+        :return: A list of {'item': item folder, 'path': original path, 'bytes', 'files', 'staged': time of the staging}.
+        """
+        items = []
+        for trash in self.trash_folders:
+            try:
+                with os.scandir(trash) as entries:
+                    item_folders = [entry.path for entry in entries if entry.is_dir(follow_symlinks=False)]
+            except OSError:
+                continue
+            for item_folder in item_folders:
+                try:
+                    with open(os.path.join(item_folder, item_filename), 'r', encoding='utf-8') as file:
+                        data = json.load(file)
+                    items.append({'item': item_folder, 'path': data['path'], 'bytes': data.get('bytes', 0), 'files': data.get('files', 0), 'staged': data.get('staged', 0)})
+                except (OSError, ValueError, KeyError, TypeError):
+                    continue  # an item being purged
+        items.sort(key=lambda item: item['staged'])
+        return items
+
+    def get_leftovers(self) -> list:
+        """
+        Get the folders of the trash folders that are not staged items, ie. the items of an interrupted purge.
+        """
+        leftovers = []
+        for trash in self.trash_folders:
+            try:
+                with os.scandir(trash) as entries:
+                    leftovers.extend(
+                        entry.path for entry in entries if entry.is_dir(follow_symlinks=False) and not os.path.isfile(os.path.join(entry.path, item_filename))
+                    )
+            except OSError:
+                continue
+        return leftovers
+
+    def restore(self, item_folders: list) -> dict:
+        """
+        Move staged items back to their original path.
+        :param item_folders: The folders of the items, see list_items().
+        :return: {original path: error message, '' if restored}.
+        """
+        results = {}
+        items = {item['item']: item for item in self.list_items()}
+        for item_folder in item_folders:
+            item = items.get(item_folder)
+            if item is None:
+                results[item_folder] = f'{item_folder} is not in the trash anymore'
+                continue
+            path = item['path']
+            if os.path.lexists(path):
+                results[path] = f'Could not restore {path}: the folder exists, it has been created again since it was staged'
+                continue
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.rename(os.path.join(item_folder, content_folder_name), path)
+                os.unlink(os.path.join(item_folder, item_filename))
+                os.rmdir(item_folder)
+                results[path] = ''
+            except OSError as error:
+                results[path] = f'Could not restore {path}: error {error!r}'
+        return results
+
+    def get_expired_items(self) -> list:
+        """
+        Get the items to purge: the items older than max_days, and the oldest items above the size cap.
+        :return: The items, see list_items().
+        """
+        items = self.list_items()
+        expired = []
+        kept_size = 0
+        min_time = time.time() - self.max_days * 86400 if self.max_days else 0
+        # the most recent items are kept first
+        for item in reversed(items):
+            if item['staged'] < min_time or kept_size + item['bytes'] > self.max_size:
+                expired.append(item)
+            else:
+                kept_size += item['bytes']
+        expired.reverse()
+        return expired
+
+    def purge(self, items: list = None, should_stop: Callable[[], bool] = None, on_progress: Callable[[int, int], None] = None) -> dict:
+        """
+        Delete staged items and the leftovers of an interrupted purge, at a low priority. Only one purge runs at a time, the others wait for it.
+        :param items: The items to purge, see list_items(). If None, the expired items are purged, see get_expired_items().
+        :param should_stop: A function called regularly. If it returns True, the purge stops. The items not purged stay in the trash.
+        :param on_progress: A function called with (items done, items total) each time an item is purged.
+        :return: The stats of each purged item folder, see FolderDeleter.delete(), with its original path in 'path'.
+        """
+        with self._purge_lock:
+            items = self.get_expired_items() if items is None else items
+            paths = {item['item']: item['path'] for item in items}
+            for item_folder in paths:
+                try:
+                    # once its description is removed, the item can't be restored nor listed anymore: it's a leftover until its folder is deleted
+                    os.unlink(os.path.join(item_folder, item_filename))
+                except OSError:
+                    pass
+            item_folders = list(paths) + [folder for folder in self.get_leftovers() if folder not in paths]
+            deleter = FolderDeleter(max_workers=self.purge_workers, low_priority=True)
+            stats = deleter.delete(item_folders, should_stop=should_stop, on_progress=on_progress)
+            for item_folder, folder_stats in stats.items():
+                folder_stats['path'] = paths.get(item_folder, item_folder)
+            return stats
+
+    def purge_in_background(self, on_done: Callable[[dict], None] = None) -> bool:
+        """
+        Purge the expired items in a daemon thread, at a low priority. An interrupted purge is resumed by the next one.
+        :param on_done: A function called in the thread with the stats of the purge, see purge().
+        :return: False if a purge is already running in the background.
+        """
+        purger = FolderTrash._purger
+        if purger is not None and purger.is_alive():
+            return False
+
+        def run() -> None:
+            stats = self.purge()
+            if on_done is not None:
+                on_done(stats)
+
+        FolderTrash._purger = threading.Thread(target=run, name='TrashPurger', daemon=True)
+        FolderTrash._purger.start()
+        return True
@@ -0,0 +1,157 @@
+# coding=utf-8
+"""
+Implementation for:
+- FolderTreeModel: The GUI-free model of the tree of the folders to clean, grouped by project.
+"""
+
+# check states of a project
+CHECKED = 'checked'
+UNCHECKED = 'unchecked'
+TRISTATE = 'tristate'
+
+
+class FolderTreeModel:
+    """
+    The GUI-free model of the tree of the folders to clean, grouped by project (the folder of the .uproject file).
+    It keeps the check state of each folder and the totals of each project and of the checked folders, updated incrementally,
+    so checking a whole project or receiving a size never needs to go through all the folders nor through the rows of the tree.
+    The folders are checked by default.
+    """
+
+    def __init__(self):
+        self.projects = {}  # {project folder: [folders]}. The folders that are not in a project are in the '' project
+        self.folder_project = {}  # {folder: project folder}
+        self.sizes = {}  # {folder: (size in bytes, number of files)}
+        self.unchecked = set()  # the unchecked folders
+        self.project_totals = {}  # {project folder: [size in bytes, number of files]}
+        self.project_unchecked = {}  # {project folder: number of unchecked folders}
+        self.checked_count = 0
+        self.checked_bytes = 0
+
+    @property
+    def folder_count(self) -> int:
+        """
+        The number of folders.
+        """
+        return len(self.folder_project)
+
+    def add(self, project: str, folder: str) -> bool:
+        """
+        Add a folder. It's checked.
+        :param project: The project folder of the folder, '' if the folder is not in a project.
+        :param folder: The folder.
+        :return: True if the project is new.
+        """
+        if folder in self.folder_project:
+            return False
+        is_new = project not in self.projects
+        if is_new:
+            self.projects[project] = []
+            self.project_totals[project] = [0, 0]
+            self.project_unchecked[project] = 0
+        self.projects[project].append(folder)
+        self.folder_project[folder] = project
+        self.checked_count += 1
+        return is_new
+
+    def remove(self, folder: str) -> str:
+        """
+        Remove a folder and update the totals. A project without folder is removed.
+        :param folder: The folder.
+        :return: The project folder of the folder, or None if the folder is unknown.
+        """
+        project = self.folder_project.pop(folder, None)
+        if project is None:
+            return None
+        size, count = self.sizes.pop(folder, (0, 0))
+        totals = self.project_totals[project]
+        totals[0] -= size
+        totals[1] -= count
+        if folder in self.unchecked:
+            self.unchecked.discard(folder)
+            self.project_unchecked[project] -= 1
+        else:
+            self.checked_count -= 1
+            self.checked_bytes -= size
+        folders = self.projects[project]
+        folders.remove(folder)
+        if not folders:
+            del self.projects[project]
+            del self.project_totals[project]
+            del self.project_unchecked[project]
+        return project
+
+    def set_size(self, folder: str, size: int, count: int) -> str:
+        """
+        Set the size of a folder and update the totals.
+        :param folder: The folder.
+        :param size: The size in bytes.
+        :param count: The number of files.
+        :return: The project folder of the folder, or None if the folder is unknown.
+        """
+        project = self.folder_project.get(folder)
+        if project is None:
+            return None
+        old_size, old_count = self.sizes.get(folder, (0, 0))
+        self.sizes[folder] = (size, count)
+        totals = self.project_totals[project]
+        totals[0] += size - old_size
+        totals[1] += count - old_count
+        if folder not in self.unchecked:
+            self.checked_bytes += size - old_size
+        return project
+
+    def is_checked(self, folder: str) -> bool:
+        """
+        Check if a folder is checked.
+        :param folder: The folder.
+        """
+        return folder not in self.unchecked
+
+    def set_checked(self, folder: str, checked: bool) -> None:
+        """
+        Check or uncheck a folder.
+        :param folder: The folder.
+        :param checked: True to check the folder.
+        """
+        if checked == (folder not in self.unchecked):
+            return
+        size = self.sizes.get(folder, (0, 0))[0]
+        project = self.folder_project[folder]
+        if checked:
+            self.unchecked.discard(folder)
+            self.project_unchecked[project] -= 1
+            self.checked_count += 1
+            self.checked_bytes += size
+        else:
+            self.unchecked.add(folder)
+            self.project_unchecked[project] += 1
+            self.checked_count -= 1
+            self.checked_bytes -= size
+
+    def get_project_state(self, project: str) -> str:
+        """
+        Get the check state of a project.
+        :param project: The project folder.
+        :return: CHECKED if all its folders are checked, UNCHECKED if none is checked, TRISTATE otherwise.
+        """
+        unchecked = self.project_unchecked[project]
+        if unchecked == 0:
+            return CHECKED
+        return UNCHECKED if unchecked == len(self.projects[project]) else TRISTATE
+
+    def set_project_checked(self, project: str, checked: bool) -> None:
+        """
+        Check or uncheck all the folders of a project.
+        :param project: The project folder.
+        :param checked: True to check the folders.
+        """
+        for folder in self.projects[project]:
+            self.set_checked(folder, checked)
+
+    def get_checked_folders(self) -> list:
+        """
+        Get the checked folders, grouped by project.
+        """
+        unchecked = self.unchecked
+        return [folder for folders in self.projects.values() for folder in folders if folder not in unchecked]
@@ -0,0 +1,450 @@
+# coding=utf-8
+"""
+Implementation for:
+- FolderWatcher: Watch a folder tree and report the folders to find that appear, change or disappear.
+"""
+import errno
+import os
+import select
+import struct
+import sys
+import time
+from typing import Callable
+
+from modules.CleaningRulesClass import CleaningRules, ignore_filename
+from modules.FolderScannerClass import FolderScanner, is_root_file, search_state
+from modules.FolderSizerClass import FolderSizer
+from modules.ScanIndexClass import ScanIndex
+
+# backends of the watcher
+WATCH_INOTIFY = 'inotify'
+WATCH_POLLING = 'polling'
+
+# delay between two scans of the polling backend, in seconds
+default_poll_interval = 5.0
+# the changes are reported when no event has been received for this delay, in seconds, so a build that writes thousands of files is reported once
+default_settle_delay = 1.0
+
+# inotify constants, see <sys/inotify.h>
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+# the events watched on the folders of the tree: a folder appears or disappears, or a project, plugin or ignore file
+_TREE_MASK = _IN_CREATE | _IN_DELETE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_DELETE_SELF | _IN_ONLYDIR
+# the events watched on the folders found and on all their sub folders: their content changes. The sizes are computed again by the caller
+_FOUND_MASK = _TREE_MASK | _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+class _Inotify:
+    """
+    A minimal wrapper of the Linux inotify API, using ctypes.
+    """
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._get_errno = ctypes.get_errno
+        self.fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            self._raise_error('inotify_init1')
+
+    def _raise_error(self, function: str, path: str = '') -> None:
+        error_number = self._get_errno()
+        raise OSError(error_number, f'{function} failed: {os.strerror(error_number)}', path or None)
+
+    def add_watch(self, path: str, mask: int) -> int:
+        """
+        Watch a folder.
+        :param path: The folder.
+        :param mask: The events to watch.
+        :return: The watch descriptor.
+        """
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            self._raise_error('inotify_add_watch', path)
+        return wd
+
+    def remove_watch(self, wd: int) -> None:
+        """
+        Stop watching a folder. The errors are ignored: the watch is removed by the kernel when the folder is deleted.
+        :param wd: The watch descriptor.
+        """
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self, timeout: float) -> list:
+        """
+        Wait for events.
+        :param timeout: The maximum time to wait, in seconds.
+        :return: A list of (watch descriptor, mask, name), empty if no event has been received.
+        """
+        readable, _writable, _errors = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """
+    Watch a folder tree and report the folders to find (ie. the folders to clean) that appear, change or disappear.
+    The folders are found like the project-aware search (see FolderScanner.scan_projects()): only the folders the search visits are watched,
+    ie. the folders outside of the projects, the project and plugin folders and the folders that can contain a folder to find, not the sources nor the contents.
+    On Linux, they are watched with inotify, with one watch per folder, and all the sub folders of the folders found are watched to detect a change,
+    ie. a build that writes in Intermediate/Build/Win64. If inotify is not available or if the watch limit is reached, the tree is scanned regularly instead,
+    using the scan index, so only the folders that have changed are read, and the modification times of the sub folders of the folders found are compared.
+    The changes are reported in batches, when the tree has been quiet for a short delay.
+    :param root: The folder to watch.
+    :param rules: The cleaning rules that select the folders to find and the folders that are not watched. If None, the default rules are used.
+      An ignore file created or removed while watching is used at once, an ignore file changed is used by the next search.
+    :param index: The scan index used to list the tree. If None, an index only kept in memory is used.
+    :param poll_interval: The delay between two scans of the polling backend, in seconds.
+    :param use_inotify: Whether to use inotify when available.
+    :param include_orphans: Whether to find the folders that are not in a project nor in a plugin.
+    """
+
+    def __init__(self, root: str, rules: CleaningRules = None, index: ScanIndex = None, poll_interval: float = default_poll_interval, use_inotify: bool = True,
+                 include_orphans: bool = False):
+        self.root = os.path.normpath(root)
+        self.rules = CleaningRules() if rules is None else rules
+        self.index = ScanIndex() if index is None else index
+        self.poll_interval = poll_interval
+        self.settle_delay = default_settle_delay
+        self.use_inotify = use_inotify and sys.platform.startswith('linux')
+        self.include_orphans = include_orphans
+        self.backend = None  # the backend used by run(): WATCH_INOTIFY or WATCH_POLLING
+        self.folders = {}  # the folders found: {folder: its project folder, '' for an orphan or a folder of the last search}
+        self.error_list = []
+        self._watches = {}  # {watch descriptor: (folder, the folder found it's in, '' for a folder of the tree)}
+        self._watched = {}  # {folder: watch descriptor}
+        self._states = {}  # {folder of the tree: (state it's visited with, state of its content)}, see FolderScanner.iter_projects()
+        self._added = set()
+        self._removed = set()
+        self._changed = set()
+
+    def run(self, folder_list: list, on_change: Callable[[list, list, list], None], should_stop: Callable[[], bool]) -> None:
+        """
+        Watch the tree until should_stop() returns True. Run it in a worker thread.
+        :param folder_list: The folders found by the last search. The differences with the current tree are reported by the first change.
+        :param on_change: A function called with (folders added, folders removed, folders changed) for each batch of changes, in the thread of the watch.
+          The project of a folder added is in folders.
+        :param should_stop: A function called regularly. If it returns True, the watch stops.
+        """
+        self.folders = dict.fromkeys(folder_list, '')
+        inotify = None
+        if self.use_inotify:
+            try:
+                inotify = _Inotify()
+            except (OSError, AttributeError) as error:
+                self._add_error(f'inotify is not available, the folders are scanned every {self.poll_interval}s: error {error!r}')
+        if inotify is not None:
+            try:
+                self.backend = WATCH_INOTIFY
+                found = self._watch_tree(inotify, self.root)
+                if found is not None:
+                    self._set_found(found)
+                    self._run_inotify(inotify, on_change, should_stop)
+                    return
+            finally:
+                inotify.close()
+        self._run_polling(on_change, should_stop)
+
+    def _add_error(self, message: str) -> None:
+        """
+        Record an error once: the polling backend meets the same errors on each scan.
+        """
+        if message not in self.error_list:
+            self.error_list.append(message)
+
+    def _flush(self, on_change: Callable[[list, list, list], None]) -> None:
+        """
+        Report the pending changes.
+        """
+        if not (self._added or self._removed or self._changed):
+            return
+        added = sorted(self._added)
+        removed = sorted(self._removed)
+        changed = sorted(self._changed.difference(self._added).difference(self._removed))
+        self._added, self._removed, self._changed = set(), set(), set()
+        on_change(added, removed, changed)
+
+    def _set_found(self, found: dict, root: str = '') -> None:
+        """
+        Update the folders found with the result of a scan and record the differences as pending changes.
+        :param found: The folders found by the scan: {folder: project folder}.
+        :param root: The folder scanned, if it's not the root of the watch: only the folders found under it can be removed.
+        """
+        for folder in [folder for folder in found if folder not in self.folders]:
+            self._add_found(folder, found[folder])
+        prefix = root + os.sep
+        for folder in [folder for folder in self.folders if folder not in found and (not root or folder.startswith(prefix))]:
+            self._remove_found(folder)
+
+    def _add_found(self, folder: str, project: str) -> None:
+        self.folders[folder] = project
+        if folder in self._removed:
+            self._removed.discard(folder)
+            self._changed.add(folder)  # removed then created again: its content is new
+        else:
+            self._added.add(folder)
+
+    def _remove_found(self, folder: str) -> None:
+        self.folders.pop(folder, None)
+        if folder in self._added:
+            self._added.discard(folder)
+        else:
+            self._removed.add(folder)
+
+    def _run_polling(self, on_change: Callable[[list, list, list], None], should_stop: Callable[[], bool]) -> None:
+        """
+        Watch the tree by scanning it regularly.
+        """
+        self.backend = WATCH_POLLING
+        scanner = FolderScanner(index=self.index, rules=self.rules)
+        # the modification times of the sub folders of the folders found, kept in memory: a folder has changed if one of them has been read again
+        sizer = FolderSizer(max_workers=1)
+        known = set()  # the folders found whose sub folders are in the sizer
+        while not should_stop():
+            found = {folder: project for project, folder in scanner.scan_projects(self.root, should_stop=should_stop, include_orphans=self.include_orphans)}
+            if should_stop():
+                return
+            for message in scanner.error_list:
+                self._add_error(message)
+            self._set_found(found)
+            for folder in found:
+                dirs_read = sizer.dirs_read
+                sizer.get_size(folder, should_stop=should_stop)
+                if folder in known and sizer.dirs_read != dirs_read:
+                    self._changed.add(folder)
+            for folder in known.difference(found):
+                sizer.forget(folder)
+            known = set(found)
+            self._flush(on_change)
+            deadline = time.monotonic() + self.poll_interval
+            while not should_stop() and time.monotonic() < deadline:
+                time.sleep(0.1)
+
+    def _watch_folder(self, inotify: _Inotify, folder: str, found: str = '') -> bool:
+        """
+        Add a watch on a folder.
+        :param found: The folder found the folder is in, '' for a folder of the tree.
+        :return: False if the watch limit has been reached.
+        """
+        try:
+            wd = inotify.add_watch(folder, _FOUND_MASK if found else _TREE_MASK)
+        except OSError as error:
+            if error.errno == errno.ENOSPC:  # the limit of fs.inotify.max_user_watches has been reached
+                self._add_error(f'Too many folders to watch with inotify (see fs.inotify.max_user_watches), the folders are scanned every {self.poll_interval}s instead')
+                return False
+            return True  # the folder has been removed in the meantime
+        self._watches[wd] = (folder, found)
+        self._watched[folder] = wd
+        return True
+
+    def _watch_found(self, inotify: _Inotify, root: str, found: str = '') -> bool:
+        """
+        Add a watch on a folder found and on all its sub folders, or on a folder created in a folder found and on its sub folders.
+        :param inotify: The inotify instance.
+        :param root: The folder.
+        :param found: The folder found the folder is in. If '', the folder is a folder found.
+        :return: False if the watch limit has been reached.
+        """
+        found = found or root
+        stack = [root]
+        while stack:
+            path = stack.pop()
+            # the watch is added before the folder is listed, so a folder created while listing is not missed
+            if not self._watch_folder(inotify, path, found):
+                return False
+            try:
+                with os.scandir(path) as entries:
+                    stack.extend(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+            except OSError:
+                continue  # the folder has been removed in the meantime
+        return True
+
+    def _watch_tree(self, inotify: _Inotify, root: str, state: tuple = search_state):
+        """
+        Add a watch on the folders of a tree visited by the project-aware search, and on the folders found in it.
+        :param inotify: The inotify instance.
+        :param root: The root of the tree.
+        :param state: The state the root is visited with, see FolderScanner.iter_projects().
+        :return: The folders found: {folder: project folder}, or None if the watch limit has been reached.
+        """
+        found = {}
+        is_full = False
+
+        def watch(path: str, visit_state: tuple) -> None:
+            nonlocal is_full
+            self._states[path] = (visit_state, visit_state)
+            is_full = is_full or not self._watch_folder(inotify, path)
+
+        scanner = FolderScanner(index=self.index, rules=self.rules)
+        rules = None if root == self.root else self.rules.get_folder_rules(self.root, os.path.dirname(root))
+        # the watch is added before the folder is listed, so a folder created while listing is not missed
+        for path, content_state, folders in scanner.iter_projects(root, should_stop=lambda: is_full, include_orphans=self.include_orphans, state=state,
+                                                                  rules=rules, before_read=watch):
+            self._states[path] = (self._states[path][0], content_state)
+            for project, folder in folders:
+                found[folder] = project
+                if not self._watch_found(inotify, folder):
+                    return None
+        if is_full:
+            return None
+        for message in scanner.error_list:
+            self._add_error(message)
+        return found
+
+    def _forget_tree(self, inotify: _Inotify, root: str, keep_found: bool = False) -> None:
+        """
+        Remove the watches and the folders found of a tree that has been removed or moved.
+        :param keep_found: Whether to keep the folders found, ie. when the tree is watched again.
+        """
+        prefix = root + os.sep
+        if not keep_found:
+            for folder in [folder for folder in self.folders if folder == root or folder.startswith(prefix)]:
+                self._remove_found(folder)
+        for folder in [folder for folder in self._watched if folder == root or folder.startswith(prefix)]:
+            wd = self._watched.pop(folder)
+            self._watches.pop(wd, None)
+            inotify.remove_watch(wd)
+        for folder in [folder for folder in self._states if folder == root or folder.startswith(prefix)]:
+            del self._states[folder]
+        self.index.invalidate(root)
+
+    def _run_inotify(self, inotify: _Inotify, on_change: Callable[[list, list, list], None], should_stop: Callable[[], bool]) -> None:
+        """
+        Watch the tree with inotify.
+        """
+        last_event = time.monotonic()
+        while not should_stop():
+            events = inotify.read_events(timeout=0.2)
+            if not events:
+                if time.monotonic() - last_event >= self.settle_delay:
+                    self._flush(on_change)
+                continue
+            last_event = time.monotonic()
+            for wd, mask, name in events:
+                if mask & _IN_Q_OVERFLOW:
+                    # events have been lost: watch the whole tree again
+                    for watched_wd in list(self._watches):
+                        inotify.remove_watch(watched_wd)
+                    self._watches, self._watched, self._states = {}, {}, {}
+                    found = self._watch_tree(inotify, self.root)
+                    if found is None:
+                        self._run_polling(on_change, should_stop)
+                        return
+                    self._set_found(found)
+                    continue
+                watch = self._watches.get(wd)
+                if watch is None:
+                    continue
+                folder, found = watch
+                if mask & _IN_IGNORED:
+                    # the folder has been removed, its watch has been removed by the kernel
+                    self._watches.pop(wd, None)
+                    if self._watched.get(folder) == wd:
+                        del self._watched[folder]
+                    continue
+                if found:
+                    self._changed.add(found)
+                    if not self._on_found_event(inotify, folder, found, mask, name):
+                        self._run_polling(on_change, should_stop)
+                        return
+                    continue
+                if not name or folder not in self._states:
+                    continue
+                if not self._on_tree_event(inotify, folder, mask, name):
+                    self._run_polling(on_change, should_stop)
+                    return
+        self._flush(on_change)
+
+    def _on_tree_event(self, inotify: _Inotify, folder: str, mask: int, name: str) -> bool:
+        """
+        Update the watches and the folders found after a change in a folder of the tree.
+        :param inotify: The inotify instance.
+        :param folder: The folder of the tree.
+        :param mask: The mask of the event.
+        :param name: The name of the file or of the sub folder.
+        :return: False if the watch limit has been reached.
+        """
+        path = os.path.join(folder, name)
+        visit_state, content_state = self._states[folder]
+        if not mask & _IN_ISDIR:
+            if (is_root_file(name) or name == ignore_filename) and mask & (_IN_CREATE | _IN_DELETE | _IN_MOVED_FROM | _IN_MOVED_TO):
+                # the folder becomes or is no longer a project or a plugin, or its rules have changed: its tree is watched again
+                self._forget_tree(inotify, folder, keep_found=True)
+                found = self._watch_tree(inotify, folder, visit_state)
+                if found is None:
+                    return False
+                self._set_found(found, folder)
+            return True
+        if mask & (_IN_CREATE | _IN_MOVED_TO):
+            rules = self.rules.get_folder_rules(self.root, folder)
+            if rules.is_match(folder, name):
+                project = FolderScanner.get_project(content_state)
+                if (project or self.include_orphans) and path not in self.folders:
+                    self._add_found(path, project)
+                    return self._watch_found(inotify, path)
+                return True
+            sub_state = FolderScanner.get_sub_state(rules, folder, name, content_state)
+            if sub_state is not None:
+                found = self._watch_tree(inotify, path, sub_state)
+                if found is None:
+                    return False
+                for sub_folder, project in found.items():
+                    if sub_folder not in self.folders:
+                        self._add_found(sub_folder, project)
+        elif mask & (_IN_DELETE | _IN_MOVED_FROM):
+            self._forget_tree(inotify, path)
+        return True
+
+    def _on_found_event(self, inotify: _Inotify, folder: str, found: str, mask: int, name: str) -> bool:
+        """
+        Update the watches after a change in a folder found or in one of its sub folders.
+        :param inotify: The inotify instance.
+        :param folder: The folder that has changed.
+        :param found: The folder found it's in.
+        :param mask: The mask of the event.
+        :param name: The name of the file or of the sub folder.
+        :return: False if the watch limit has been reached.
+        """
+        if not name or not mask & _IN_ISDIR:
+            return True
+        path = os.path.join(folder, name)
+        if mask & (_IN_CREATE | _IN_MOVED_TO):
+            return self._watch_found(inotify, path, found)
+        if mask & _IN_MOVED_FROM:
+            # a removed folder loses its watches by itself, not a moved one
+            prefix = path + os.sep
+            for sub_folder in [sub_folder for sub_folder in self._watched if sub_folder == path or sub_folder.startswith(prefix)]:
+                wd = self._watched.pop(sub_folder)
+                self._watches.pop(wd, None)
+                inotify.remove_watch(wd)
+        return True
@@ -0,0 +1,380 @@
+# coding=utf-8
+"""
+Implementation for:
+- Job: A run of a tool submitted to the JobScheduler, with its parameters, its state, its progress and its log.
+- JobScheduler: A persistent queue of jobs, run concurrently in worker threads under a global limit.
+"""
+import functools
+import json
+import os
+import threading
+import time
+
+from modules.ResultLogClass import ResultLog, LEVEL_WARNING
+from modules.functions import atomic_write
+
+# states of a job
+JOB_QUEUED = 'queued'
+JOB_PAUSED = 'paused'  # a job of the previous session, it's queued again by JobScheduler.start()
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+finished_states = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+# the tools read and write whole folder trees: more concurrent jobs only make them compete for the same disks
+default_max_running_jobs = 2
+# the threads of the pools of all the running jobs together, see Job.workers. The share of a job is the default pool size of the tools
+default_max_io_workers = 16
+
+
+class Job:
+    """
+    A run of a tool submitted to the JobScheduler, with its parameters, its state, its progress and its log.
+    The runner of the job checks is_cancelled regularly, reports its progress with progress() and writes its results to log.
+    :param job_id: The id of the job, unique in the queue.
+    :param kind: The kind of the job, the key of its runner in the JobScheduler.
+    :param parameters: The parameters of the runner. They are saved with the queue, so they must be JSON values.
+    :param title: The text displayed for the job. If '', the kind is displayed.
+    """
+
+    def __init__(self, job_id: int, kind: str, parameters: dict = None, title: str = ''):
+        self.id = job_id
+        self.kind = kind
+        self.parameters = dict(parameters or {})
+        self.title = title or kind
+        self.status = JOB_QUEUED
+        self.done = 0  # the progress of the job
+        self.total = 0  # 0 if unknown
+        self.workers = 0  # the maximum number of threads of the pools of the runner, set when the job starts. 0 if not limited
+        self.summary = ''  # the text returned by the runner
+        self.error = ''  # the exception raised by the runner
+        self.submitted = time.time()
+        self.started = 0.0
+        self.ended = 0.0
+        self.log = None  # the ResultLog of the job, see ResultLog.get_job_log()
+        self._cancel_event = threading.Event()
+
+    @property
+    def name(self) -> str:
+        """
+        Get the name of the job, used in the log: '#' and its id.
+        """
+        return f'#{self.id}'
+
+    @property
+    def is_cancelled(self) -> bool:
+        """
+        Check if the job has been cancelled. Must be checked regularly by the runner.
+        """
+        return self._cancel_event.is_set()
+
+    @property
+    def is_finished(self) -> bool:
+        """
+        Check if the job is done, failed or cancelled.
+        """
+        return self.status in finished_states
+
+    def cancel(self) -> None:
+        """
+        Ask the runner to stop. It stops at its next check of is_cancelled.
+        """
+        self._cancel_event.set()
+
+    def progress(self, done: int, total: int = 0) -> None:
+        """
+        Set the progress of the job. Called by the runner, in its thread.
+        :param done: The number of elements done.
+        :param total: The total number of elements, 0 if unknown.
+        """
+        self.done = done
+        self.total = total
+
+    def to_dict(self) -> dict:
+        """
+        Get the job as a dict, to save it with the queue. A running job is saved like a queued one: it's run again from the start, once it's started again.
+        """
+        return {'id': self.id, 'kind': self.kind, 'parameters': self.parameters, 'title': self.title, 'submitted': self.submitted}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """
+        Create a paused job from a dict made by to_dict().
+        :param data: The dict.
+        :return: The job.
+        """
+        job = cls(data['id'], data['kind'], data.get('parameters', {}), data.get('title', ''))
+        job.submitted = data.get('submitted', job.submitted)
+        job.status = JOB_PAUSED
+        return job
+
+
+class JobScheduler:
+    """
+    A persistent queue of jobs, run concurrently in worker threads under a global limit.
+    The tools submit jobs with their parameters, the runner of each kind of job does the work with the GUI-free engine of the tool.
+    At most max_running jobs run at the same time, whatever the tool: the jobs read and write the same disks, more of them would only slow each other down.
+    Two jobs that write the same state (see resources) never run at the same time: the later one waits, the next queued jobs may start before it.
+    A window that writes some of this state itself reserves it while it does, see reserve(): the jobs that write it wait the same way.
+    The running jobs share a budget of max_io_workers threads: each job gets its share in Job.workers, and its runner sizes its pools with it.
+    The queued and running jobs are saved to the queue file at each change, and loaded again by the next session as paused jobs.
+    They delete or change files: they only run again when they are started one by one, see start().
+    It never uses tkinter: a window displays the jobs by polling get_jobs() and changes, in its main thread.
+    :param runners: The runner of each kind of job: {kind: function called with the job in a worker thread, that returns a summary text}.
+    :param queue_file: The file the queue is saved to. If None, the queue is only kept in memory.
+    :param result_log: The log the records of the jobs are written to, see ResultLog.get_job_log(). If None, a private log is used.
+    :param max_running: The maximum number of jobs running at the same time.
+    :param resources: The state written by each kind of job: {kind: names of the files or caches its jobs write}. If None, the jobs share nothing.
+    :param max_io_workers: The maximum number of threads of the pools of all the running jobs together.
+    """
+
+    def __init__(self, runners: dict, queue_file: str = None, result_log: ResultLog = None, max_running: int = default_max_running_jobs, resources: dict = None,
+                 max_io_workers: int = default_max_io_workers):
+        self.runners = dict(runners)
+        self.resources = {kind: set(names) for kind, names in (resources or {}).items()}
+        self.queue_file = queue_file
+        self.result_log = ResultLog() if result_log is None else result_log
+        self.max_running = max(1, max_running)
+        self.max_io_workers = max(1, max_io_workers)
+        self.jobs = []  # the jobs of the session and the jobs loaded from the queue file, in the order of submission
+        self.changes = 0  # incremented each time a job is added, removed or changes its state, so a view is only refreshed when needed
+        self.error_list = []
+        self._reserved = set()  # the state reserved by the windows, see reserve()
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # the jobs are saved by the worker threads: the last snapshot must be the last written
+        self._is_closing = False
+        self.load()
+
+    def load(self) -> None:
+        """
+        Load the jobs saved by the previous session. They are paused, start() queues them again.
+        """
+        if self.queue_file is None or not os.path.isfile(self.queue_file):
+            return
+        try:
+            with open(self.queue_file, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            jobs = [Job.from_dict(item) for item in data.get('jobs', [])]
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as error:
+            self.error_list.append(f'Could not load the job queue from {self.queue_file}: error {error!r}')
+            return
+        with self._lock:
+            for job in jobs:
+                if job.kind not in self.runners:
+                    self.error_list.append(f'Job {job.name} ({job.title}) dropped: unknown kind of job "{job.kind}"')
+                    continue
+                job.log = self.result_log.get_job_log(job.name)
+                self.jobs.append(job)
+            self._next_id = max([data.get('next_id', 1)] + [job.id + 1 for job in self.jobs])
+            self.changes += 1
+
+    def save(self) -> None:
+        """
+        Save the queued and running jobs to the queue file.
+        """
+        if self.queue_file is None:
+            return
+        with self._save_lock:
+            with self._lock:
+                data = {'next_id': self._next_id, 'jobs': [job.to_dict() for job in self.jobs if not job.is_finished]}
+            try:
+                os.makedirs(os.path.dirname(self.queue_file), exist_ok=True)
+                atomic_write(self.queue_file, json.dumps(data, indent=2).encode('utf-8'))
+            except OSError as error:
+                self.error_list.append(f'Could not save the job queue to {self.queue_file}: error {error!r}')
+
+    def submit(self, kind: str, parameters: dict = None, title: str = '') -> Job:
+        """
+        Add a job to the queue. It starts as soon as fewer than max_running jobs are running.
+        :param kind: The kind of the job, see runners.
+        :param parameters: The parameters of its runner, JSON values.
+        :param title: The text displayed for the job.
+        :return: The job.
+        """
+        if kind not in self.runners:
+            raise ValueError(f'Unknown kind of job: "{kind}"')
+        with self._lock:
+            job = Job(self._next_id, kind, parameters, title)
+            self._next_id += 1
+            job.log = self.result_log.get_job_log(job.name)
+            self.jobs.append(job)
+            self.changes += 1
+        self.save()
+        self._dispatch()
+        return job
+
+    def start(self, job_id: int) -> None:
+        """
+        Queue a paused job again, ie. a job loaded from the queue file. It starts as soon as fewer than max_running jobs are running.
+        :param job_id: The id of the job.
+        """
+        job = self.get_job(job_id)
+        if job is None:
+            return
+        with self._lock:
+            if job.status != JOB_PAUSED:
+                return
+            job.status = JOB_QUEUED
+            self.changes += 1
+        self.save()
+        self._dispatch()
+
+    def get_paused_jobs(self) -> list:
+        """
+        Get the paused jobs, ie. the jobs not finished by the previous session.
+        """
+        with self._lock:
+            return [job for job in self.jobs if job.status == JOB_PAUSED]
+
+    def get_jobs(self) -> list:
+        """
+        Get the jobs, in the order of submission.
+        """
+        with self._lock:
+            return list(self.jobs)
+
+    def get_job(self, job_id: int):
+        """
+        Get a job by its id.
+        :param job_id: The id.
+        :return: The job, or None if it's not in the list.
+        """
+        with self._lock:
+            return next((job for job in self.jobs if job.id == job_id), None)
+
+    def cancel(self, job_id: int) -> None:
+        """
+        Cancel a job. A queued or paused job is cancelled at once, a running job stops at the next check of its runner.
+        :param job_id: The id of the job.
+        """
+        job = self.get_job(job_id)
+        if job is None or job.is_finished:
+            return
+        job.cancel()
+        with self._lock:
+            if job.status in (JOB_QUEUED, JOB_PAUSED):
+                job.status = JOB_CANCELLED
+                job.ended = time.time()
+            self.changes += 1
+        self.save()
+
+    def remove_finished(self) -> int:
+        """
+        Remove the finished jobs from the list.
+        :return: The number of jobs removed.
+        """
+        with self._lock:
+            count = len(self.jobs)
+            self.jobs = [job for job in self.jobs if not job.is_finished]
+            count -= len(self.jobs)
+            if count:
+                self.changes += 1
+        return count
+
+    def reserve(self, resources) -> bool:
+        """
+        Reserve some state for a task run by a window, outside of the scheduler: the queued jobs that write it wait until it's released.
+        :param resources: The names of the files or caches the task writes, see resources.
+        :return: False if a running job or another task writes some of them: the task must not run.
+        """
+        resources = set(resources)
+        with self._lock:
+            running_jobs = [job for job in self.jobs if job.status == JOB_RUNNING]
+            in_use = self._reserved.union(*(self.resources.get(job.kind, ()) for job in running_jobs))
+            if not in_use.isdisjoint(resources):
+                return False
+            self._reserved.update(resources)
+        return True
+
+    def release(self, resources) -> None:
+        """
+        Release the state reserved by reserve(), then start the jobs that waited for it.
+        :param resources: The names given to reserve().
+        """
+        with self._lock:
+            self._reserved.difference_update(resources)
+        self._dispatch()
+
+    def releasing(self, target, resources):
+        """
+        Get a function that runs a task reserved by reserve(), then releases its state, even if the task fails or its window has been closed.
+        :param target: The function of the task.
+        :param resources: The names given to reserve().
+        :return: The function, with the parameters of target.
+        """
+
+        @functools.wraps(target)
+        def run(*args, **kwargs):
+            try:
+                return target(*args, **kwargs)
+            finally:
+                self.release(resources)
+
+        return run
+
+    def _dispatch(self) -> None:
+        """
+        Start the oldest queued jobs while fewer than max_running jobs are running. A job waits while a running job or a window writes the same state.
+        """
+        to_start = []
+        with self._lock:
+            if self._is_closing:
+                return
+            running_jobs = [job for job in self.jobs if job.status == JOB_RUNNING]
+            running = len(running_jobs)
+            in_use = self._reserved.union(*(self.resources.get(job.kind, ()) for job in running_jobs))
+            for job in self.jobs:
+                if running >= self.max_running:
+                    break
+                if job.status == JOB_QUEUED:
+                    resources = self.resources.get(job.kind, set())
+                    if not in_use.isdisjoint(resources):
+                        continue
+                    job.status = JOB_RUNNING
+                    job.started = time.time()
+                    job.workers = max(1, self.max_io_workers // self.max_running)
+                    running += 1
+                    in_use.update(resources)
+                    to_start.append(job)
+            if to_start:
+                self.changes += 1
+        for job in to_start:
+            threading.Thread(target=self._run, args=(job,), name=f'Job-{job.id}', daemon=True).start()
+
+    def _run(self, job: Job) -> None:
+        """
+        Run a job in its worker thread, then start the next queued job.
+        :param job: The job.
+        """
+        status = JOB_DONE
+        try:
+            job.summary = self.runners[job.kind](job) or ''
+            if job.is_cancelled:
+                status = JOB_CANCELLED
+        except Exception as error:
+            status = JOB_FAILED
+            job.error = repr(error)
+            job.log.write(job.kind, f'Job {job.name} ({job.title}) failed: error {error!r}', LEVEL_WARNING)
+        with self._lock:
+            job.status = status
+            job.ended = time.time()
+            self.changes += 1
+            if self._is_closing:
+                # the job has been stopped by shutdown(): it stays in the saved queue, paused in the next session
+                return
+        self.save()
+        self._dispatch()
+
+    def shutdown(self) -> None:
+        """
+        Stop the scheduler, ie. when the application is closed: the queue is saved with the running jobs, then the running jobs are cancelled.
+        They are loaded as paused jobs by the next session, and run again from the start when they are started.
+        """
+        self.save()
+        with self._lock:
+            self._is_closing = True
+            running = [job for job in self.jobs if job.status == JOB_RUNNING]
+        for job in running:
+            job.cancel()
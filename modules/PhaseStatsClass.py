@@ -0,0 +1,140 @@
+# coding=utf-8
+"""
+Implementation for:
+- PhaseStats: Per-phase timing and counters of a tool, with an optional cProfile capture.
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from modules.functions import atomic_write, format_size
+
+# the counters of a phase, besides its duration and its number of calls
+counter_names = ('dirs', 'files', 'items', 'bytes', 'errors')
+
+
+class PhaseStats:
+    """
+    Per-phase timing and counters of a tool: wall time, number of calls, folders visited, files touched, items processed, bytes and errors.
+    The phases are measured by the engines with phase(). The overhead is two clock reads per phase, the counters are set once per phase,
+    never per file, so it's always on.
+    If a profile file is given, the outermost phases are also profiled with cProfile and the profile is written to this file after each phase,
+    for a deep dive with pstats or snakeviz. Only the thread that runs the phase is profiled, not the threads of its pool.
+    It's thread safe: the phases can be measured in the worker threads and in the main thread.
+    :param tool: The name of the tool.
+    :param profile_file: The .prof file the profile is written to. If None, nothing is profiled.
+    """
+
+    def __init__(self, tool: str, profile_file: str = None):
+        self.tool = tool
+        self.profile_file = profile_file
+        self.phases = {}  # {phase: {'calls', 'seconds', 'dirs', 'files', 'items', 'bytes', 'errors'}}, in the order they were first measured
+        self._lock = threading.Lock()
+        self._profiler = None
+        self._is_profiling = False
+
+    def add(self, name: str, seconds: float = 0.0, **counters) -> None:
+        """
+        Add a measure to a phase.
+        :param name: The name of the phase.
+        :param seconds: The wall time.
+        :param counters: The values to add to the counters, see counter_names.
+        """
+        with self._lock:
+            phase = self.phases.get(name)
+            if phase is None:
+                phase = {'calls': 0, 'seconds': 0.0, **{counter: 0 for counter in counter_names}}
+                self.phases[name] = phase
+            phase['calls'] += 1
+            phase['seconds'] += seconds
+            for counter, value in counters.items():
+                phase[counter] = phase.get(counter, 0) + value
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Measure a phase. Use it as: with stats.phase('scan') as counters: ...; counters['dirs'] = dirs_visited
+        :param name: The name of the phase.
+        :return: A dict of counters, filled by the caller and added to the phase at the end.
+        """
+        counters = {}
+        profiler = self._start_profiler()
+        start = time.perf_counter()
+        try:
+            yield counters
+        finally:
+            self.add(name, time.perf_counter() - start, **counters)
+            if profiler is not None:
+                self._stop_profiler(profiler)
+
+    def _start_profiler(self):
+        """
+        Start profiling the current thread, if a profile file is set and no phase is being profiled.
+        :return: The profiler, or None if the phase is not profiled.
+        """
+        if self.profile_file is None:
+            return None
+        with self._lock:
+            if self._is_profiling:
+                return None  # a nested phase, or a phase of another thread: only one phase is profiled at a time
+            self._is_profiling = True
+            if self._profiler is None:
+                import cProfile
+                self._profiler = cProfile.Profile()
+            profiler = self._profiler
+        profiler.enable()
+        return profiler
+
+    def _stop_profiler(self, profiler) -> None:
+        """
+        Stop profiling and write the profile of all the profiled phases so far.
+        :param profiler: The profiler returned by _start_profiler().
+        """
+        profiler.disable()
+        try:
+            profiler.dump_stats(self.profile_file)
+        finally:
+            with self._lock:
+                self._is_profiling = False
+
+    def reset(self) -> None:
+        """
+        Remove all the measures.
+        """
+        with self._lock:
+            self.phases = {}
+
+    def to_dict(self) -> dict:
+        """
+        Get the measures as a JSON serializable dict.
+        """
+        with self._lock:
+            phases = {name: dict(phase, seconds=round(phase['seconds'], 4)) for name, phase in self.phases.items()}
+        return {'tool': self.tool, 'phases': phases, 'profile_file': self.profile_file}
+
+    def to_text(self) -> str:
+        """
+        Get the measures as a summary block, one line per phase.
+        """
+        lines = ['Phases:']
+        for name, phase in self.to_dict()['phases'].items():
+            line = f'    {name:<16} {phase["seconds"]:8.3f}s'
+            if phase['calls'] > 1:
+                line += f' ({phase["calls"]} calls)'
+            counts = [f'{phase[counter]} {counter}' for counter in counter_names if counter != 'bytes' and phase[counter]]
+            if phase['bytes']:
+                counts.append(format_size(phase['bytes']))
+            if counts:
+                line += ': ' + ', '.join(counts)
+            lines.append(line)
+        if self.profile_file is not None:
+            lines.append(f'Profile written to {self.profile_file}')
+        return '\n'.join(lines)
+
+    def save(self, filename: str) -> None:
+        """
+        Write the measures to a JSON file.
+        :param filename: The file.
+        """
+        atomic_write(filename, json.dumps(self.to_dict(), indent=2).encode('utf-8'))
@@ -0,0 +1,287 @@
+# coding=utf-8
+"""
+Implementation for:
+- PluginBrowser: A window to search the inventory of the plugins of the registered engines and of the projects.
+"""
+import os
+import time
+import tkinter as tk
+from tkinter import ttk, messagebox as messagebox
+
+from modules.BackgroundTaskClass import BackgroundTask
+from modules.PluginVersionFixerEngineClass import default_update_workers
+from modules.ResultLogClass import ResultLog
+from modules.ToolConfigClass import ToolConfig
+from modules.cli import get_build_id_fixer_engine, get_plugin_inventory
+
+
+class PluginBrowser(tk.Toplevel):
+    """
+    A window to search the inventory of the plugins of the registered engines and of the projects.
+    The filters query the inventory in memory, the plugin files are only read by Refresh Inventory, and only if they have changed. See PluginInventory.
+    :param master: The parent window.
+    :param result_log: The log the results are written to, displayed by the main window.
+    :param scheduler: The JobScheduler of the main window. The refresh of the inventory is short and its result is displayed by this window: it runs in this window,
+        but the engine registry it writes is reserved in the scheduler while it runs, see JobScheduler.reserve().
+    """
+
+    def __init__(self, master, result_log: ResultLog = None, scheduler=None):
+        super().__init__(master)
+        self.scheduler = scheduler
+        self.name = 'PluginBrowser'
+        self.description = 'Search the plugins of the registered engines and of the projects folder. Refresh the inventory to read the plugins that have changed.'
+        self.width = 820
+        self.height = 520
+        self.view_max_rows = 2000  # number of plugins displayed, the others are counted
+        self.filter_delay = 200  # delay between the last change of a filter and the query, in ms
+        self.engine = get_build_id_fixer_engine(ToolConfig(init_values={}, section='PluginsBuildIdFixer').get('update_workers', default_update_workers), result_log)
+        self.inventory = get_plugin_inventory()
+        self.expected_build_ids = {}  # {plugins folder: Build ID of its engine}, see PluginsBuildIdFixerEngine.get_expected_build_ids()
+
+        self.title('Plugin Inventory')
+        self.resizable(False, False)
+        self.geometry(f'{self.width}x{self.height}')
+
+        self.task = None  # The BackgroundTask running the current job
+        self.btn_refresh = None
+        self.btn_cancel = None
+        self.cb_engine_version = None
+        self.plugins_tree = None
+        self.progress_bar = None
+        self._filter_after_id = None
+        self.status_var = tk.StringVar()
+        self.progress_var = tk.StringVar()
+        self.full_rescan_var = tk.BooleanVar(value=False)
+        self.stale_var = tk.BooleanVar(value=False)
+        self.filter_vars = {field: tk.StringVar() for field in ('name', 'engine_version', 'build_id', 'module', 'text')}
+        for var in self.filter_vars.values():
+            var.trace_add('write', lambda *args: self._schedule_filter())
+        self.stale_var.trace_add('write', lambda *args: self._schedule_filter())
+        self.create_widgets()
+        self.bind('<Key>', self.on_key)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.focus_set()  # Captures keyboard events in the Toplevel window
+        self.apply_filters()
+        # the Build IDs of the engines are cached by the registry, but their .modules files are checked: not in the main thread
+        self._start_task(self._get_expected_build_ids, on_done=self._on_build_ids_done)
+
+    def create_widgets(self):
+        """
+        Create the widgets for the window.
+        """
+        pack_def_options = {'ipadx': 5, 'ipady': 5, 'padx': 3, 'pady': 3}
+        lbl_description = ttk.Label(self, text=self.description, wraplength=int(self.width * .9), font='TkDefaultFont 9 bold')
+        lblf_filters = tk.LabelFrame(self, text='Filters (all must match)')
+        lblf_content = tk.LabelFrame(self, text='Plugins')
+        lblf_progress = tk.LabelFrame(self, text='Progress')
+        lblf_bottom = tk.LabelFrame(self, text='Commands')
+
+        lbl_description.pack(fill=tk.X, **pack_def_options)
+        lblf_filters.pack(fill=tk.X, **pack_def_options)
+        lblf_bottom.pack(side=tk.BOTTOM, fill=tk.X, **pack_def_options)
+        lblf_progress.pack(side=tk.BOTTOM, fill=tk.X, **pack_def_options)
+        lblf_content.pack(fill=tk.BOTH, expand=True, **pack_def_options)
+
+        for label, field, width in (('Name', 'name', 16), ('Search', 'text', 16), ('Module', 'module', 14), ('BuildId', 'build_id', 12)):
+            ttk.Label(lblf_filters, text=label).pack(side=tk.LEFT, padx=3, pady=3)
+            ttk.Entry(lblf_filters, textvariable=self.filter_vars[field], width=width).pack(side=tk.LEFT, padx=3, pady=3)
+        ttk.Label(lblf_filters, text='EngineVersion').pack(side=tk.LEFT, padx=3, pady=3)
+        self.cb_engine_version = ttk.Combobox(lblf_filters, textvariable=self.filter_vars['engine_version'], width=8)
+        self.cb_engine_version.pack(side=tk.LEFT, padx=3, pady=3)
+        ttk.Checkbutton(lblf_filters, text='Stale BuildId', variable=self.stale_var).pack(side=tk.LEFT, padx=3, pady=3)
+
+        columns = ('Version', 'EngineVersion', 'BuildId', 'Modules', 'Path')
+        plugins_tree = ttk.Treeview(lblf_content, selectmode='browse', columns=columns, show='tree headings')
+        plugins_tree.column('#0', width=150, stretch=tk.NO)
+        plugins_tree.heading('#0', text='Name', anchor=tk.CENTER)
+        for column, width in zip(columns, (60, 90, 90, 60, 330)):
+            plugins_tree.column(column, width=width, stretch=tk.YES if column == 'Path' else tk.NO, anchor=tk.W if column == 'Path' else tk.CENTER)
+            plugins_tree.heading(column, text=column, anchor=tk.CENTER)
+        scrollbar_y = ttk.Scrollbar(lblf_content, command=plugins_tree.yview)
+        plugins_tree.configure(yscrollcommand=scrollbar_y.set)
+        scrollbar_y.pack(side=tk.RIGHT, fill=tk.Y)
+        plugins_tree.pack(fill=tk.BOTH, expand=True)
+        self.plugins_tree = plugins_tree
+
+        self.progress_bar = ttk.Progressbar(lblf_progress, orient=tk.HORIZONTAL, mode='determinate')
+        self.progress_bar.pack(side=tk.LEFT, fill=tk.X, expand=True, **pack_def_options)
+        ttk.Label(lblf_progress, textvariable=self.progress_var, width=50).pack(side=tk.LEFT, **pack_def_options)
+
+        ttk.Button(lblf_bottom, text='Close', command=self.close_window).pack(**pack_def_options, side=tk.RIGHT)
+        self.btn_refresh = ttk.Button(lblf_bottom, text='Refresh Inventory', command=self.refresh)
+        self.btn_refresh.pack(side=tk.LEFT, **pack_def_options)
+        ttk.Checkbutton(lblf_bottom, text='Full rescan', variable=self.full_rescan_var).pack(side=tk.LEFT, **pack_def_options)
+        self.btn_cancel = ttk.Button(lblf_bottom, text='Cancel', command=self.cancel, state=tk.DISABLED)
+        self.btn_cancel.pack(side=tk.LEFT, **pack_def_options)
+        ttk.Button(lblf_bottom, text='Copy Path', command=self.copy_path).pack(side=tk.LEFT, **pack_def_options)
+        ttk.Label(lblf_bottom, textvariable=self.status_var).pack(side=tk.LEFT, fill=tk.X, expand=True, **pack_def_options)
+
+    def on_close(self, _event=None) -> None:
+        """
+        Event when the window is closing
+        :param _event: the event that triggered the call of this function
+        """
+        self.close_window()
+
+    def on_key(self, event) -> None:
+        """
+        Event when a key is pressed
+        :param event: the event that triggered the call of this function
+        """
+        if event.keysym == 'Escape':
+            self.on_close()
+
+    def close_window(self) -> None:
+        """
+        Close the window
+        """
+        if self.task is not None:
+            self.task.stop_polling()
+        if self._filter_after_id is not None:
+            self.after_cancel(self._filter_after_id)
+        self.destroy()
+
+    def _schedule_filter(self) -> None:
+        """
+        Query the inventory once the filters have not changed for filter_delay, so the list is not filled again for each key typed.
+        """
+        if self._filter_after_id is not None:
+            self.after_cancel(self._filter_after_id)
+        self._filter_after_id = self.after(self.filter_delay, self.apply_filters)
+
+    def apply_filters(self) -> None:
+        """
+        Query the inventory with the filters and display the plugins found.
+        """
+        self._filter_after_id = None
+        start = time.perf_counter()
+        plugins = self.inventory.query(
+            **{field: var.get().strip() for field, var in self.filter_vars.items()}, stale_build_ids=self.expected_build_ids if self.stale_var.get() else None
+        )
+        duration = (time.perf_counter() - start) * 1000
+        self.plugins_tree.delete(*self.plugins_tree.get_children())
+        for plugin in plugins[:self.view_max_rows]:
+            values = (plugin['version_name'] or plugin['version'], plugin['engine_version'], plugin['build_id'], len(plugin['modules']), plugin['path'])
+            self.plugins_tree.insert('', tk.END, iid=plugin['path'], text=plugin['name'] if not plugin['error'] else f'{plugin["name"]} (invalid)', values=values)
+        shown = f', {self.view_max_rows} displayed' if len(plugins) > self.view_max_rows else ''
+        self.status_var.set(f'{len(plugins)} of {len(self.inventory.entries)} plugins{shown} (query: {duration:.1f} ms)')
+        self.cb_engine_version.config(values=self.inventory.get_values('engine_version'))
+
+    def copy_path(self) -> None:
+        """
+        Copy the path of the selected plugin to the clipboard.
+        """
+        selection = self.plugins_tree.selection()
+        if not selection:
+            return
+        self.clipboard_clear()
+        self.clipboard_append(selection[0])
+
+    def _get_expected_build_ids(self, task: BackgroundTask) -> dict:
+        """
+        Get the BuildId expected in the plugins folder of each registered engine.
+        Run in a worker thread.
+        :param task: The task running this job.
+        :return: A dict {plugins folder: Build ID}.
+        """
+        return self.engine.get_expected_build_ids(should_stop=lambda: task.is_cancelled)
+
+    def _refresh_inventory(self, task: BackgroundTask, projects_folder: str, full_rescan: bool = False) -> dict:
+        """
+        Update the inventory with the plugins of the registered engines and of the projects folder.
+        Run in a worker thread.
+        :param task: The task running this job.
+        :param projects_folder: The projects folder. Not searched if ''.
+        :param full_rescan: Whether to scan the engine folders again and to invalidate the scan index before scanning.
+        :return: A dict {plugins folder: Build ID of its engine}.
+        """
+        folders = [projects_folder] if projects_folder and os.path.isdir(projects_folder) else []
+        self.engine.update_inventory(self.inventory, folders, full_rescan=full_rescan, should_stop=lambda: task.is_cancelled, on_progress=task.progress)
+        return self.engine.get_expected_build_ids(rescan=full_rescan, should_stop=lambda: task.is_cancelled)
+
+    def _start_task(self, target, args=(), on_done=None) -> None:
+        """
+        Run a job in a worker thread and update the widgets while it's running.
+        The job writes the engine registry: it doesn't start while a job of the main window writes it, and these jobs wait for its end.
+        :param target: The job to run.
+        :param args: The parameters of the job.
+        :param on_done: A callback called with the result of the job and its exception.
+        """
+        if self.scheduler is not None:
+            from modules.jobs import JOB_FIX_BUILD_ID, job_resources
+            resources = job_resources[JOB_FIX_BUILD_ID]
+            if not self.scheduler.reserve(resources):
+                messagebox.showerror('Error', 'A job of the main window is updating the plugins. Try again when it has ended.')
+                return
+            target = self.scheduler.releasing(target, resources)
+        self.task = BackgroundTask(self, target, args=args, on_progress=self._on_progress, on_done=on_done)
+        self._set_running(True)
+        self.task.start()
+
+    def _set_running(self, is_running: bool) -> None:
+        """
+        Update the widgets when a job starts or stops.
+        :param is_running: Whether a job is running.
+        """
+        self.btn_refresh.config(state=tk.DISABLED if is_running else tk.NORMAL)
+        self.btn_cancel.config(state=tk.NORMAL if is_running else tk.DISABLED)
+        self.progress_bar.config(value=0)
+        self.progress_var.set('')
+
+    def _on_progress(self, done: int, total: int) -> None:
+        """
+        Update the progress bar. Run in the main thread.
+        :param done: The number of elements done.
+        :param total: The total number of elements, 0 if unknown.
+        """
+        if total:
+            self.progress_bar.config(mode='determinate', maximum=total, value=done)
+            self.progress_var.set(f'{done}/{total} plugins read')
+        else:
+            # the total is unknown when scanning: just show some activity
+            self.progress_bar.config(mode='indeterminate')
+            self.progress_bar.step()
+            self.progress_var.set(f'{done} folders scanned')
+
+    def _on_build_ids_done(self, build_ids, error) -> None:
+        """
+        Event when the Build IDs of the engines have been read. Run in the main thread.
+        :param build_ids: The Build IDs, see _get_expected_build_ids().
+        :param error: The exception raised by the job, if any.
+        """
+        self.task = None
+        self._set_running(False)
+        if error is not None:
+            self.engine.log(f'Failed to read the Build IDs of the engines: error {error!r}')
+            return
+        self.expected_build_ids = build_ids or {}
+        if self.stale_var.get():
+            self.apply_filters()
+
+    def _on_refresh_done(self, build_ids, error) -> None:
+        """
+        Event when the inventory has been updated. Run in the main thread.
+        :param build_ids: The Build IDs of the engines, see _refresh_inventory().
+        :param error: The exception raised by the job, if any.
+        """
+        self._on_build_ids_done(build_ids, error)
+        self.progress_var.set(self.inventory.stats_text())
+        self.apply_filters()
+        self.engine.end_report()
+        if self.engine.error_list:
+            messagebox.showwarning('Command Result', f'Inventory updated with {len(self.engine.error_list)} errors, see the results of the main window.')
+            self.engine.error_list = []
+
+    def refresh(self) -> None:
+        """
+        Update the inventory with the plugins that have changed since the last refresh.
+        """
+        projects_folder = ToolConfig(init_values={}, section='FolderCleaner').get('projects_folder', '')
+        self._start_task(self._refresh_inventory, args=(projects_folder, self.full_rescan_var.get()), on_done=self._on_refresh_done)
+
+    def cancel(self) -> None:
+        """
+        Cancel the current job.
+        """
+        if self.task is not None:
+            self.task.cancel()
@@ -0,0 +1,276 @@
+# coding=utf-8
+"""
+Implementation for:
+- PluginInventory: A persistent inventory of the metadata of the plugins, indexed for fast queries.
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable
+
+from modules.functions import atomic_write
+
+# the version of the format of the inventory file. The inventory is rebuilt if it changes
+_inventory_version = 1
+
+
+class PluginInventory:
+    """
+    A persistent inventory of the metadata of the plugins, indexed for fast queries.
+    For each .uplugin file, the inventory stores its name, its versions, its EngineVersion, its BuildId, its modules and the folder it was found in.
+    The BuildId is read from the .modules file of the plugin (see PluginsBuildIdFixerEngine.get_modules_file()), or from the .uplugin file if it has no binaries.
+    The entries are keyed by the path of the .uplugin file, with the modification times of the two files: a plugin is parsed again only if one of them has changed.
+    The queries use indexes built in memory when the inventory is loaded or updated, they never read the plugin files.
+    An update builds new entries and indexes and swaps them in at its end: a query run meanwhile in another thread (ie. by a window) uses the previous ones.
+    :param inventory_file: The file used to save the inventory between two runs. If None, the inventory is only kept in memory.
+    """
+
+    def __init__(self, inventory_file: str = None):
+        self.inventory_file = inventory_file
+        # the entries and the indexes of the queries, replaced together: (entries, indexes), see entries and _build_indexes()
+        self._state = ({}, self._build_indexes({}))
+        self.parsed = 0  # number of plugins parsed by the last update
+        self.reused = 0  # number of plugins reused from the inventory by the last update
+        self.removed = 0  # number of plugins removed from the inventory by the last update
+        self.error_list = []
+        self.load()
+
+    @property
+    def entries(self) -> dict:
+        """
+        The entries of the plugins: {plugin file: {'name', 'friendly_name', 'version', 'version_name', 'engine_version', 'build_id', 'modules': [names], 'root',
+        'mtime_ns': [uplugin, modules], 'error'}}. They must not be changed: an update replaces them.
+        """
+        return self._state[0]
+
+    def load(self) -> None:
+        """
+        Load the inventory from the inventory file.
+        """
+        entries = {}
+        if self.inventory_file is not None and os.path.isfile(self.inventory_file):
+            try:
+                with open(self.inventory_file, 'r', encoding='utf-8') as file:
+                    data = json.load(file)
+                if data.get('version') == _inventory_version:
+                    entries = dict(data['plugins'])
+            except (OSError, ValueError, KeyError, AttributeError, TypeError):
+                entries = {}
+        self._state = (entries, self._build_indexes(entries))
+
+    def save(self) -> None:
+        """
+        Save the inventory to the inventory file.
+        """
+        if self.inventory_file is None:
+            return
+        os.makedirs(os.path.dirname(self.inventory_file), exist_ok=True)
+        atomic_write(self.inventory_file, json.dumps({'version': _inventory_version, 'plugins': self.entries}, separators=(',', ':')).encode('utf-8'))
+
+    @staticmethod
+    def get_version_key(engine_version: str) -> str:
+        """
+        Get the key of an EngineVersion in the index: its major and minor numbers, ie. '5.1' for '5.1.0'.
+        :param engine_version: The EngineVersion.
+        """
+        return '.'.join(engine_version.split('.')[:2])
+
+    @staticmethod
+    def is_version_match(engine_version: str, version: str) -> bool:
+        """
+        Check if an EngineVersion is a version or one of its sub versions, ie. '5.1.0' matches '5.1' but '5.10.0' does not.
+        :param engine_version: The EngineVersion.
+        :param version: The version.
+        """
+        return engine_version == version or engine_version.startswith(version + '.')
+
+    @staticmethod
+    def _get_mtimes(plugin_file: str, modules_file: str) -> list:
+        """
+        Get the modification times of the files of a plugin.
+        :param plugin_file: The .uplugin file.
+        :param modules_file: The .modules file. 0 is used if it does not exist.
+        :return: [mtime_ns of the .uplugin file, mtime_ns of the .modules file].
+        """
+        try:
+            modules_mtime_ns = os.stat(modules_file).st_mtime_ns
+        except OSError:
+            modules_mtime_ns = 0
+        return [os.stat(plugin_file).st_mtime_ns, modules_mtime_ns]
+
+    @staticmethod
+    def _read_json(json_file: str) -> dict:
+        """
+        Read a JSON file of a plugin. The .uplugin files often start with a BOM.
+        :param json_file: The path to the file.
+        """
+        with open(json_file, 'r', encoding='utf-8-sig') as file:
+            data = json.load(file)
+        if not isinstance(data, dict):
+            raise ValueError('not a JSON object')
+        return data
+
+    def read_plugin(self, plugin_file: str, modules_file: str, root: str, mtime_ns: list) -> dict:
+        """
+        Parse the files of a plugin.
+        :param plugin_file: The .uplugin file.
+        :param modules_file: The .modules file. It's only read if it exists, ie. mtime_ns[1] is not 0.
+        :param root: The folder the plugin was found in.
+        :param mtime_ns: The modification times of the files, see _get_mtimes().
+        :return: The entry of the plugin. If a file can't be read, its error is set in 'error'.
+        """
+        entry = {
+            'name': os.path.splitext(os.path.basename(plugin_file))[0], 'friendly_name': '', 'version': 0, 'version_name': '', 'engine_version': '', 'build_id': '',
+            'modules': [], 'root': root, 'mtime_ns': mtime_ns, 'error': ''
+        }
+        try:
+            data = self._read_json(plugin_file)
+            entry['friendly_name'] = str(data.get('FriendlyName', ''))
+            entry['version'] = data.get('Version', 0) if isinstance(data.get('Version', 0), int) else 0
+            entry['version_name'] = str(data.get('VersionName', ''))
+            entry['engine_version'] = str(data.get('EngineVersion', ''))
+            entry['build_id'] = str(data.get('BuildId', ''))
+            entry['modules'] = [str(module['Name']) for module in data.get('Modules', []) if isinstance(module, dict) and 'Name' in module]
+            if mtime_ns[1]:
+                entry['build_id'] = str(self._read_json(modules_file).get('BuildId', '')) or entry['build_id']
+        except (OSError, ValueError, TypeError, AttributeError) as error:
+            entry['error'] = repr(error)
+        return entry
+
+    def update(self, plugins_by_root: dict, get_modules_file: Callable[[str], str], should_stop: Callable[[], bool] = None,
+               on_progress: Callable[[int, int], None] = None, max_workers: int = 8) -> None:
+        """
+        Update the inventory with the plugins found in some folders. Only the plugins whose files have changed are parsed again.
+        The plugins of these folders that have not been found anymore are removed from the inventory, the plugins of the other folders are kept.
+        :param plugins_by_root: The plugins found: {folder: list of .uplugin files}.
+        :param get_modules_file: A function that returns the path of the .modules file of a plugin.
+        :param should_stop: A function called regularly. If it returns True, the update stops and the plugins not read yet are kept as they were.
+        :param on_progress: A function called with (plugins done, plugins total) while parsing.
+        :param max_workers: The number of threads used to parse the plugins.
+        """
+        self.parsed = self.reused = self.removed = 0
+        self.error_list = []
+        found = {}  # {plugin file: root}
+        for root, plugin_list in plugins_by_root.items():
+            for plugin_file in plugin_list:
+                found[plugin_file] = os.path.normpath(root)
+        # the current entries are left as they are until the end of the update, for the queries run meanwhile
+        entries = dict(self.entries)
+        prefixes = tuple(os.path.normpath(root).rstrip(os.sep) + os.sep for root in plugins_by_root)
+        for plugin_file in [path for path in entries if path.startswith(prefixes) and path not in found]:
+            del entries[plugin_file]
+            self.removed += 1
+        to_parse = []
+        for plugin_file, root in found.items():
+            modules_file = get_modules_file(plugin_file)
+            try:
+                mtime_ns = self._get_mtimes(plugin_file, modules_file)
+            except OSError as error:
+                self.error_list.append(f'Could not read {plugin_file}: error {error!r}')
+                continue
+            entry = entries.get(plugin_file)
+            if entry is not None and entry['mtime_ns'] == mtime_ns:
+                if entry['root'] != root:
+                    entries[plugin_file] = dict(entry, root=root)
+                self.reused += 1
+            else:
+                to_parse.append((plugin_file, modules_file, root, mtime_ns))
+        total = len(to_parse)
+
+        def parse(item):
+            if should_stop is not None and should_stop():
+                return None
+            return self.read_plugin(*item)
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='PluginInventory') as executor:
+            futures = {executor.submit(parse, item): item[0] for item in to_parse}
+            # the progress is the number of plugins done, in the order they are done
+            for done, future in enumerate(as_completed(futures), start=1):
+                entry = future.result()
+                if on_progress is not None:
+                    on_progress(done, total)
+                if entry is None:
+                    continue
+                plugin_file = futures[future]
+                if entry['error']:
+                    self.error_list.append(f'Could not parse {plugin_file}: error {entry["error"]}')
+                entries[plugin_file] = entry
+                self.parsed += 1
+        self._state = (entries, self._build_indexes(entries))
+
+    def _build_indexes(self, entries: dict) -> dict:
+        """
+        Build the indexes of the queries: {lowercase name: plugin files}, {EngineVersion key: plugin files}, {BuildId: plugin files}, {lowercase module name: plugin files}.
+        :param entries: The entries to index.
+        :return: {field: {key: [plugin files]}}.
+        """
+        indexes = {'name': {}, 'engine_version': {}, 'build_id': {}, 'module': {}}
+        for plugin_file, entry in entries.items():
+            indexes['name'].setdefault(entry['name'].lower(), []).append(plugin_file)
+            indexes['engine_version'].setdefault(self.get_version_key(entry['engine_version']), []).append(plugin_file)
+            indexes['build_id'].setdefault(entry['build_id'], []).append(plugin_file)
+            for module in set(module.lower() for module in entry['modules']):
+                indexes['module'].setdefault(module, []).append(plugin_file)
+        return indexes
+
+    def query(self, name: str = '', engine_version: str = '', build_id: str = '', module: str = '', text: str = '', root: str = '', stale_build_ids: dict = None) -> list:
+        """
+        Find the plugins that match all the given filters. The empty filters are ignored. The plugin files are not read.
+        :param name: The name of the plugin (the name of its .uplugin file), case-insensitive.
+        :param engine_version: The EngineVersion or its first numbers, ie. '5.1' for all the 5.1.x versions or '5' for all the 5.x versions.
+        :param build_id: The BuildId.
+        :param module: The name of one of the modules of the plugin, case-insensitive.
+        :param text: A text to search in the name, the friendly name and the path of the plugin, case-insensitive.
+        :param root: The folder the plugin was found in, ie. the plugins folder of an engine.
+        :param stale_build_ids: The expected BuildId of the plugins of some folders: {folder: BuildId}. If set, only the plugins of these folders
+            whose BuildId is set and different are returned.
+        :return: The entries of the plugins, with their 'path', sorted by name.
+        """
+        entries, indexes = self._state  # the same entries and indexes for the whole query, even if an update ends meanwhile
+        candidates = None  # the plugin files that match the indexed filters, None if there is none
+        engine_version = engine_version.strip().rstrip('.')
+        for field, key in (('name', name.lower()), ('engine_version', engine_version), ('build_id', build_id), ('module', module.lower())):
+            if not key:
+                continue
+            if field == 'engine_version' and '.' not in key:
+                # only the major version: all the keys of this major version
+                plugin_files = [path for version_key, paths in indexes[field].items() if self.is_version_match(version_key, key) for path in paths]
+            else:
+                plugin_files = indexes[field].get(self.get_version_key(key) if field == 'engine_version' else key, [])
+            candidates = set(plugin_files) if candidates is None else candidates.intersection(plugin_files)
+            if not candidates:
+                return []
+        text = text.lower()
+        root = os.path.normpath(root) if root else ''
+        if stale_build_ids is not None:
+            stale_build_ids = {os.path.normpath(folder): value for folder, value in stale_build_ids.items()}
+        results = []
+        for plugin_file in (entries if candidates is None else candidates):
+            entry = entries[plugin_file]
+            if engine_version and not self.is_version_match(entry['engine_version'], engine_version):
+                continue
+            if root and entry['root'] != root:
+                continue
+            if text and text not in entry['name'].lower() and text not in entry['friendly_name'].lower() and text not in plugin_file.lower():
+                continue
+            if stale_build_ids is not None:
+                expected = stale_build_ids.get(entry['root'])
+                if not expected or not entry['build_id'] or entry['build_id'] == expected:
+                    continue
+            results.append(dict(entry, path=plugin_file))
+        results.sort(key=lambda item: (item['name'].lower(), item['path']))
+        return results
+
+    def get_values(self, field: str) -> list:
+        """
+        Get the values of an indexed field, ie. to fill the filters of a window.
+        :param field: 'name', 'engine_version', 'build_id' or 'module'.
+        :return: The values, sorted. The empty value is not included.
+        """
+        return sorted(key for key in self._state[1][field] if key)
+
+    def stats_text(self) -> str:
+        """
+        Get a summary of the last update.
+        """
+        return f'{len(self.entries)} plugins in the inventory: {self.parsed} parsed, {self.reused} unchanged, {self.removed} removed'
@@ -3,34 +3,47 @@
 Implementation for:
 - PluginsBuildIdFixer: A window to update plugin files with the Custom Engine Build ID.
 """
-import json
 import os
 import tkinter as tk
 from tkinter import ttk, messagebox as messagebox
 
+from modules.BackgroundTaskClass import BackgroundTask
+from modules.ChangePlanClass import ChangePlan, ACTION_UPDATE
+from modules.CleaningRulesClass import default_plugin_skip_patterns
+from modules.PluginVersionFixerEngineClass import PluginsBuildIdFixerEngine, default_update_workers
+from modules.ResultLogClass import ResultLog
 from modules.ToolConfigClass import ToolConfig
 from modules.functions import browse_folder
-from modules.globals import default_engine_folder, config_folder, config_filename
+from modules.globals import default_engine_folder, config_folder, config_filename, scan_index_filename, build_id_journal_filename, engine_registry_filename, plan_filename_suffix, stats_filename_suffix, profile_filename_suffix
 
 
 class PluginsBuildIdFixer(tk.Toplevel):
     """
     A window to update plugin files with the Custom Engine Build ID.
     :param master: The parent window.
-    :param display_callback: A callback function to display the result.
+    :param result_log: The log the results are written to, displayed by the main window.
+    :param scheduler: The JobScheduler of the main window. If set, the updates and the rollbacks run as jobs of the main window, else in this window.
     """
 
-    def __init__(self, master, display_callback=None):
+    def __init__(self, master, result_log: ResultLog = None, scheduler=None):
         super().__init__(master)
+        self.scheduler = scheduler
         self.name = 'PluginsBuildIdFixer'
         self.description = 'Update plugin files with the Custom Engine Build ID. Read the Build ID for a given engine folder and update the plugin files in the given plugins folder.'
-        self.width = 500
-        self.height = 270
+        self.width = 620
+        self.height = 385
         self.config_file, self.config = self.init_config(self.name)
-        self.build_id = ''
-        self.result = f'\n###########\nRUNNING {self.name}\n###########\n'
-        self.display_callback = display_callback
-        self.error_list = []
+        self.engine = PluginsBuildIdFixerEngine(
+            index_file=os.path.join(config_folder, scan_index_filename),
+            journal_file=os.path.join(config_folder, build_id_journal_filename),
+            update_workers=self.config.get('update_workers'),
+            registry_file=os.path.join(config_folder, engine_registry_filename),
+            result_log=result_log,
+            profile_file=os.path.join(config_folder, self.name + profile_filename_suffix) if self.config.get('profile') else None,
+            skip_patterns=self.config.get('skip_patterns')
+        )
+        self.plan_file = os.path.join(config_folder, self.name + plan_filename_suffix)
+        self.stats_file = os.path.join(config_folder, self.name + stats_filename_suffix)
         self.plugin_list = []
 
         self.title('Update Plugins')
@@ -38,7 +51,18 @@ class PluginsBuildIdFixer(tk.Toplevel):
         self.geometry(f'{self.width}x{self.height}')
 
         # Initialize StringVar variables for managing Entry widgets
+        self.task = None  # The BackgroundTask running the current job
+        self.btn_find = None
         self.btn_execute = None
+        self.btn_execute_all = None
+        self.btn_cancel = None
+        self.btn_rollback = None
+        self.btn_plan = None
+        self.btn_execute_plan = None
+        self.progress_bar = None
+        self.plan_var = tk.StringVar()
+        self.progress_var = tk.StringVar()
+        self.full_rescan_var = tk.BooleanVar(value=False)
         self.engine_folder_var = tk.StringVar()
         self.plugins_folder_var = tk.StringVar()
         self.plugins_folder_var.trace_add("write", lambda *args: self.config.set('plugins_folder', self.plugins_folder_var.get()))
@@ -46,7 +70,7 @@ class PluginsBuildIdFixer(tk.Toplevel):
         self.create_widgets()
         self.bind('<Key>', self.on_key)
         self.protocol("WM_DELETE_WINDOW", self.on_close)
-        self.grab_set()  # Captures keyboard events in the Toplevel window
+        self.focus_set()  # Captures keyboard events in the Toplevel window
 
     @staticmethod
     def init_config(section: str) -> tuple[str, ToolConfig]:
@@ -57,10 +81,12 @@ class PluginsBuildIdFixer(tk.Toplevel):
         defaults = {
             'engine_folder': default_engine_folder,  #
             'plugins_folder': os.path.join(default_engine_folder, 'Plugins/Marketplace'),  #
+            'update_workers': default_update_workers,  # number of threads used to read and write the plugin files
+            'profile': False,  # profile the phases with cProfile, for a deep dive (see PhaseStats)
+            'skip_patterns': default_plugin_skip_patterns,  # the folders that can't contain a plugin: names, globs or 're:' regexes (see CleaningRules)
         }
         config_file = os.path.join(os.path.join(config_folder, config_filename))
         config = ToolConfig(init_values=defaults, section=section)
-        config.load()
         return config_file, config
 
     def create_widgets(self):
@@ -71,11 +97,15 @@ class PluginsBuildIdFixer(tk.Toplevel):
         lbl_description = ttk.Label(self, text=self.description, wraplength=int(self.width * .9), font='TkDefaultFont 9 bold')
         lblf_source_folder = tk.LabelFrame(self, text='Engine Binary Folder (source of the Build ID)')
         lblf_plugins_folder = tk.LabelFrame(self, text='Marketplace Plugins Folder (Build ID updates)')
+        lblf_progress = tk.LabelFrame(self, text='Progress')
+        lblf_plan = tk.LabelFrame(self, text='Plan (preview the changes, then run the approved plan without scanning again)')
         lblf_bottom = tk.LabelFrame(self, text='Commands')
 
         lbl_description.pack(fill=tk.X, **pack_def_options)
         lblf_source_folder.pack(fill=tk.X, **pack_def_options)
         lblf_plugins_folder.pack(fill=tk.X, **pack_def_options)
+        lblf_progress.pack(fill=tk.X, **pack_def_options)
+        lblf_plan.pack(fill=tk.X, **pack_def_options)
         lblf_bottom.pack(fill=tk.X, **pack_def_options)
 
         # noinspection DuplicatedCode
@@ -89,12 +119,31 @@ class PluginsBuildIdFixer(tk.Toplevel):
         entry_plugins_folder.pack(side=tk.LEFT, fill=tk.X, expand=True, **pack_def_options)
         btn_plugins_folder = ttk.Button(lblf_plugins_folder, text='Browse', command=self._browse_plugins_folder)
         btn_plugins_folder.pack(side=tk.LEFT, **pack_def_options)
+        ttk.Checkbutton(lblf_plugins_folder, text='Full rescan', variable=self.full_rescan_var).pack(side=tk.LEFT, **pack_def_options)
+
+        self.progress_bar = ttk.Progressbar(lblf_progress, orient=tk.HORIZONTAL, mode='determinate')
+        self.progress_bar.pack(side=tk.LEFT, fill=tk.X, expand=True, **pack_def_options)
+        ttk.Label(lblf_progress, textvariable=self.progress_var, width=35).pack(side=tk.LEFT, **pack_def_options)
+
+        # noinspection DuplicatedCode
+        self.btn_plan = ttk.Button(lblf_plan, text='Preview Changes', command=self.plan, state=tk.DISABLED)
+        self.btn_plan.pack(side=tk.LEFT, **pack_def_options)
+        self.btn_execute_plan = ttk.Button(lblf_plan, text='Run Approved Plan', command=self.execute_plan, state=tk.DISABLED)
+        self.btn_execute_plan.pack(side=tk.LEFT, **pack_def_options)
+        ttk.Label(lblf_plan, textvariable=self.plan_var).pack(side=tk.LEFT, fill=tk.X, expand=True, **pack_def_options)
 
         # noinspection DuplicatedCode
         ttk.Button(lblf_bottom, text='Close', command=self.close_window).pack(**pack_def_options, side=tk.RIGHT)
-        ttk.Button(lblf_bottom, text='Find Plugins', command=self.find, state=tk.NORMAL).pack(side=tk.LEFT, **pack_def_options)
+        self.btn_find = ttk.Button(lblf_bottom, text='Find Plugins', command=self.find, state=tk.NORMAL)
+        self.btn_find.pack(side=tk.LEFT, **pack_def_options)
         self.btn_execute = ttk.Button(lblf_bottom, text='Update Plugin Files', command=self.execute, state=tk.DISABLED)
-        self.btn_execute.pack(**pack_def_options)
+        self.btn_execute.pack(side=tk.LEFT, **pack_def_options)
+        self.btn_execute_all = ttk.Button(lblf_bottom, text='Update All Engines', command=self.execute_all, state=tk.NORMAL)
+        self.btn_execute_all.pack(side=tk.LEFT, **pack_def_options)
+        self.btn_cancel = ttk.Button(lblf_bottom, text='Cancel', command=self.cancel, state=tk.DISABLED)
+        self.btn_cancel.pack(side=tk.LEFT, **pack_def_options)
+        self.btn_rollback = ttk.Button(lblf_bottom, text='Rollback Last Run', command=self.rollback, state=tk.NORMAL)
+        self.btn_rollback.pack(side=tk.LEFT, **pack_def_options)
 
         self._update_widgets_from_config()
 
@@ -104,6 +153,22 @@ class PluginsBuildIdFixer(tk.Toplevel):
         """
         self.engine_folder_var.set(self.config.get('engine_folder'))
         self.plugins_folder_var.set(self.config.get('plugins_folder'))
+        self._update_plan_status()
+
+    def _update_plan_status(self) -> None:
+        """
+        Show the date of the saved plan, if any, and enable the button to run it.
+        """
+        try:
+            plan = ChangePlan.load(self.plan_file)
+        except (OSError, ValueError, KeyError):
+            plan = None
+        if plan is None or plan.tool != self.name:
+            self.plan_var.set('No saved plan')
+            self.btn_execute_plan.config(state=tk.DISABLED)
+        else:
+            self.plan_var.set(f'Saved plan: {plan.created}, {len(plan.get_items(ACTION_UPDATE))} files to update')
+            self.btn_execute_plan.config(state=tk.NORMAL)
 
     def _browse_engine_folder(self):
         path = browse_folder()
@@ -117,79 +182,81 @@ class PluginsBuildIdFixer(tk.Toplevel):
             self.config.set('plugins_folder', path)
             self.plugins_folder_var.set(path)
 
-    def _extract_build_id(self) -> str:
+    def _find_plugins(self, task: BackgroundTask, plugins_folder: str, full_rescan: bool = False) -> list:
         """
-        Extract Custom Engine Build ID from the paper2D plugin from the specified engine path.
+        Recursively find all Unreal Engine plugins from a given directory.
+        Run in a worker thread.
+        :param task: The task running this job.
+        :param plugins_folder: The folder to scan.
+        :param full_rescan: Whether to invalidate the scan index before scanning.
+        :return: A list of plugin paths.
         """
-        paper_plugin_path = os.path.join(self.config.get('engine_folder'), 'Plugins', '2D', 'Paper2D', 'Binaries', 'Win64', 'UnrealEditor.modules')
-        paper_plugin_path = os.path.abspath(paper_plugin_path)
-        try:
-            with open(paper_plugin_path, 'r') as file:
-                data = json.load(file)
-                build_id = data['BuildId']
-            return build_id
-        except FileNotFoundError:
-            self.log(f'Could not find the the plugin we read build_id from ({paper_plugin_path}).\nThe engine path is probably wrong.')
-            return ''
+        return self.engine.find_plugins(plugins_folder, full_rescan, should_stop=lambda: task.is_cancelled, on_progress=task.progress)
 
-    def _replace_build_id(self, json_file: str) -> bool:
+    def _fix_build_id_in_plugins(self, task: BackgroundTask, engine_folder: str, plugins_folder: str, plugin_list: list) -> dict:
         """
-        Replace the value of the 'BuildId' key in a JSON file.
-        :param json_file: The path to the JSON file.
-        :return: True if the file has been updated, False otherwise.
+        Update the plugins found by find() with a Custom Engine Build ID.
+        Run in a worker thread.
+        :param task: The task running this job.
+        :param engine_folder: The engine folder to read the Build ID from.
+        :param plugins_folder: The plugins folder, registered with the engine for the next batch updates.
+        :param plugin_list: The plugin files to update.
+        :return: A dict {plugin file: status}.
         """
-        try:
-            with open(json_file, 'r') as file:
-                data = json.load(file)
-            data['BuildId'] = self.build_id
-            with open(json_file, 'w') as file:
-                json.dump(data, file, indent=4)
-            return True
-        except FileNotFoundError:
-            self.log(f'File not found: {json_file}')
-        except json.decoder.JSONDecodeError:
-            self.log(f'Invalid JSON file: {json_file}')
-        return False
-
-    def _find_plugins(self) -> list:
+        self.engine.registry.add(engine_folder, plugins_folder)
+        self.engine.build_id = self.engine.extract_build_id(engine_folder, should_stop=lambda: task.is_cancelled)
+        if not self.engine.build_id:
+            raise ValueError('Failed to extract Custom Engine Build ID from the specified file.')
+        return self.engine.fix_build_id_in_plugins(plugin_list, should_stop=lambda: task.is_cancelled, on_progress=task.progress)
+
+    def _plan_fix(self, task: BackgroundTask, engine_folder: str, plugins_folder: str, plugin_list: list) -> ChangePlan:
         """
-        Recursively find all Unreal Engine plugins from a given directory.
-        :return: A list of plugin paths.
+        Make the plan of the update of the plugins found by find() and save it.
+        Run in a worker thread.
+        :param task: The task running this job.
+        :param engine_folder: The engine folder to read the Build ID from.
+        :param plugins_folder: The plugins folder, stored in the plan.
+        :param plugin_list: The plugin files to update.
+        :return: The plan.
         """
-        folders_to_skip = ['Binaries', 'Build', 'DerivedDataCache', 'Intermediate', 'Saved', 'ThirdParty']
-        plugin_files = []
-        for root, dirs, files in os.walk(self.config.get('plugins_folder')):
-            if any(folder in os.path.basename(root) for folder in folders_to_skip):
-                continue  # Skip folders that are not plugins
-            for file in files:
-                if file.endswith('.uplugin'):
-                    plugin_files.append(os.path.join(root, file))
-                    continue
-        return plugin_files
-
-    def _fix_build_id_in_plugins(self) -> None:
-        """
-        Update all the plugin a plugins directory with a Custom Engine Build ID.
-        """
-        plugins = self._find_plugins()
-        for plugin_file in plugins:
-            if self._fix_build_id_in_plugin(plugin_file):
-                self.result += f'Updated plugin files in {plugin_file}\n'
-            else:
-                self.result += f'Failed to update plugin files in {plugin_file}\n'
+        self.engine.build_id = self.engine.extract_build_id(engine_folder, should_stop=lambda: task.is_cancelled)
+        if not self.engine.build_id:
+            raise ValueError('Failed to extract Custom Engine Build ID from the specified file.')
+        parameters = {'engine_folder': engine_folder, 'plugins_folder': plugins_folder, 'build_id': self.engine.build_id}
+        plan = self.engine.plan_fix(plugin_list, should_stop=lambda: task.is_cancelled, on_progress=task.progress, parameters=parameters)
+        plan.save(self.plan_file)
+        return plan
+
+    def _execute_plan(self, task: BackgroundTask) -> dict:
+        """
+        Execute the saved plan, without scanning again.
+        Run in a worker thread.
+        :param task: The task running this job.
+        :return: A dict {plugin file: status}, empty if the plan is out of date.
+        """
+        return self.engine.execute_plan(ChangePlan.load(self.plan_file), should_stop=lambda: task.is_cancelled, on_progress=task.progress)
+
+    def _fix_build_id_for_engines(self, task: BackgroundTask, engine_folder: str, plugins_folder: str, full_rescan: bool = False) -> dict:
+        """
+        Update the plugins of all the registered engines, after registering the current one.
+        Run in a worker thread.
+        :param task: The task running this job.
+        :param engine_folder: The current engine folder.
+        :param plugins_folder: The plugins folder of the current engine.
+        :param full_rescan: Whether to invalidate the scan index before scanning.
+        :return: A dict {engine folder: {plugin file: status}}.
+        """
+        self.engine.registry.add(engine_folder, plugins_folder)
+        return self.engine.fix_build_id_for_engines(full_rescan=full_rescan, should_stop=lambda: task.is_cancelled, on_progress=task.progress)
 
-    def _fix_build_id_in_plugin(self, plugin_file: str) -> bool:
+    def _rollback_last_run(self, task: BackgroundTask) -> dict:
         """
-        Update the .modules and .uplugin of a plugin files with a Custom Engine Build ID.
-        :param plugin_file: The path to the plugin file.
+        Restore the files changed by the last update.
+        Run in a worker thread.
+        :param task: The task running this job.
+        :return: A dict {file: status}.
         """
-        # Update .uplugin file
-        result = self._replace_build_id(plugin_file)
-        # Update modules file
-        plugin_path = os.path.dirname(plugin_file)
-        modules_file_path = os.path.join(plugin_path, 'Binaries', 'Win64', 'UnrealEditor.modules')
-        result = result and self._replace_build_id(modules_file_path)
-        return result
+        return self.engine.rollback_last_run(should_stop=lambda: task.is_cancelled, on_progress=task.progress)
 
     def on_close(self, _event=None) -> None:
         """
@@ -210,6 +277,8 @@ class PluginsBuildIdFixer(tk.Toplevel):
         """
         Close the window
         """
+        if self.task is not None:
+            self.task.stop_polling()
         self.config.save()
         self.destroy()
 
@@ -218,8 +287,156 @@ class PluginsBuildIdFixer(tk.Toplevel):
         Log a message to the console.
         :param message: The message to log.
         """
-        print(f'[{self.__class__.__name__}] {message}')
-        self.error_list.append(message)
+        self.engine.log(message)
+
+    def _start_task(self, target, args=(), on_done=None, is_reserved: bool = False) -> None:
+        """
+        Run a job in a worker thread and update the widgets while it's running.
+        :param target: The job to run.
+        :param args: The parameters of the job.
+        :param on_done: A callback called with the result of the job and its exception.
+        :param is_reserved: Whether the job writes the state of the Build ID jobs of the main window: it doesn't start while one of them runs, and they wait for its end.
+        """
+        if is_reserved and self.scheduler is not None:
+            from modules.jobs import JOB_FIX_BUILD_ID, job_resources
+            resources = job_resources[JOB_FIX_BUILD_ID]
+            if not self.scheduler.reserve(resources):
+                messagebox.showerror('Error', 'A job of the main window is updating the plugins. Try again when it has ended.')
+                return
+            target = self.scheduler.releasing(target, resources)
+        self.task = BackgroundTask(self, target, args=args, on_progress=self._on_progress, on_done=on_done)
+        self._set_running(True)
+        self.task.start()
+
+    def _set_running(self, is_running: bool) -> None:
+        """
+        Update the widgets when a job starts or stops.
+        :param is_running: Whether a job is running.
+        """
+        self.btn_find.config(state=tk.DISABLED if is_running else tk.NORMAL)
+        self.btn_execute.config(state=tk.DISABLED if is_running or not self.plugin_list else tk.NORMAL)
+        self.btn_execute_all.config(state=tk.DISABLED if is_running else tk.NORMAL)
+        self.btn_cancel.config(state=tk.NORMAL if is_running else tk.DISABLED)
+        self.btn_rollback.config(state=tk.DISABLED if is_running else tk.NORMAL)
+        self.btn_plan.config(state=tk.DISABLED if is_running or not self.plugin_list else tk.NORMAL)
+        self.btn_execute_plan.config(state=tk.DISABLED if is_running or not os.path.isfile(self.plan_file) else tk.NORMAL)
+        self.progress_bar.config(value=0)
+        self.progress_var.set('')
+
+    def _on_progress(self, done: int, total: int) -> None:
+        """
+        Update the progress bar. Run in the main thread.
+        :param done: The number of elements done.
+        :param total: The total number of elements, 0 if unknown.
+        """
+        with self.engine.stats.phase('ui'):
+            if total:
+                self.progress_bar.config(mode='determinate', maximum=total, value=done)
+                self.progress_var.set(f'{done}/{total} files processed')
+            else:
+                # the total is unknown when scanning: just show some activity
+                self.progress_bar.config(mode='indeterminate')
+                self.progress_bar.step()
+                self.progress_var.set(f'{done} folders scanned')
+
+    def _end_report(self) -> None:
+        """
+        Write the summary of the run to the result log, and the timing of its phases to the stats file.
+        """
+        self.engine.end_report()
+        try:
+            self.engine.stats.save(self.stats_file)
+        except OSError as error:
+            self.log(f'Could not save {self.stats_file}: error {error!r}')
+
+    def _on_find_done(self, plugin_list, error) -> None:
+        """
+        Event when the search of the plugins is finished. Run in the main thread.
+        :param plugin_list: The plugin files found.
+        :param error: The exception raised by the job, if any.
+        """
+        self.task = None
+        if error is not None:
+            self.log(f'Failed to find the plugins: error {error!r}')
+            plugin_list = []
+        self.plugin_list = plugin_list or []
+        self._set_running(False)
+        self.progress_var.set(self.engine.scan_stats)
+        messagebox.showinfo('Command Result', f'Found {len(self.plugin_list)} Plugins to update.')
+
+    def _on_execute_done(self, _result, error) -> None:
+        """
+        Event when the update of the plugins is finished. Run in the main thread.
+        :param _result: The result of the job (unused).
+        :param error: The exception raised by the job, if any.
+        """
+        is_cancelled = self.task.is_cancelled
+        self.task = None
+        self._set_running(False)
+        if error is not None:
+            self.log(str(error))
+            messagebox.showerror('Error', str(error))
+        elif is_cancelled:
+            messagebox.showinfo('Command Result', 'Update cancelled. Some plugins have not been updated.')
+        else:
+            counts = self.engine.file_counts
+            messagebox.showinfo(
+                'Command Result', f'Plugin files updated successfully.\n{counts["changed"]} files changed, {counts["unchanged"]} unchanged, {counts["failed"]} failed.'
+            )
+
+        self.config.save()
+        self._end_report()
+        self.close_window()
+
+    def _on_plan_done(self, plan, error) -> None:
+        """
+        Event when the plan is made. Run in the main thread.
+        :param plan: The plan.
+        :param error: The exception raised by the job, if any.
+        """
+        self.task = None
+        self._set_running(False)
+        self._update_plan_status()
+        if error is not None:
+            self.log(str(error))
+            messagebox.showerror('Error', str(error))
+            return
+        self.engine.report(plan.to_text())
+        messagebox.showinfo('Command Result', 'The plan is displayed in the results pane.\nClick on "Run Approved Plan" to execute it.')
+
+    def _on_execute_plan_done(self, results, error) -> None:
+        """
+        Event when the execution of the saved plan is finished. Run in the main thread.
+        :param results: The status of each plugin, empty if the plan is out of date.
+        :param error: The exception raised by the job, if any.
+        """
+        if error is None and not results and self.engine.error_list:
+            self.task = None
+            self._set_running(False)
+            messagebox.showerror('Error', f'{self.engine.error_list[0]}\nSee the console for the changed files.')
+            self.engine.error_list = []
+            return
+        self._on_execute_done(results, error)
+
+    def _on_rollback_done(self, results, error) -> None:
+        """
+        Event when the rollback of the last update is finished. Run in the main thread.
+        :param results: The status of each restored file.
+        :param error: The exception raised by the job, if any.
+        """
+        self.task = None
+        self._set_running(False)
+        if error is not None:
+            self.log(f'Failed to roll back the last run: error {error!r}')
+            messagebox.showerror('Error', str(error))
+            return
+        if not results:
+            messagebox.showinfo('Command Result', 'No update to roll back.')
+            return
+        failed = sum(1 for status in results.values() if status == 'failed')
+        messagebox.showinfo('Command Result', f'{len(results) - failed} files restored, {failed} failed.')
+        self._end_report()
+        self.close_window()
 
     def find(self) -> None:
         """
@@ -229,13 +446,8 @@ class PluginsBuildIdFixer(tk.Toplevel):
             messagebox.showerror('Error', 'Engine Path or Plugins Directory not specified.')
             return
 
-        self.plugin_list = self._find_plugins()
-        count = len(self.plugin_list)
-        messagebox.showinfo('Command Result', f'Found {count} Plugins to update.')
-        if count > 0:
-            self.btn_execute.config(state=tk.NORMAL)
-        else:
-            self.btn_execute.config(state=tk.DISABLED)
+        self.plugin_list = []
+        self._start_task(self._find_plugins, args=(self.config.get('plugins_folder'), self.full_rescan_var.get()), on_done=self._on_find_done)
 
     def execute(self) -> None:
         """
@@ -245,21 +457,87 @@ class PluginsBuildIdFixer(tk.Toplevel):
             messagebox.showerror('Error', 'The list of plugins to update is empty.')
             return
 
-        build_id = self._extract_build_id()
-        if build_id:
-            self._fix_build_id_in_plugins()
-            messagebox.showinfo('Command Result', 'Plugin files updated successfully.')
-        else:
-            messagebox.showerror('Error', 'Failed to extract Custom Engine Build ID from the specified file.')
+        if self.scheduler is not None:
+            self._submit_fix_job({'plugins': list(self.plugin_list)}, title=f'Update {len(self.plugin_list)} plugins in {self.config.get("plugins_folder")}')
+            return
+        self._start_task(
+            self._fix_build_id_in_plugins, args=(self.config.get('engine_folder'), self.config.get('plugins_folder'), list(self.plugin_list)), on_done=self._on_execute_done
+        )
+
+    def plan(self) -> None:
+        """
+        Make the plan of the update of the plugins found, display it and save it.
+        """
+        if len(self.plugin_list) < 1:
+            messagebox.showerror('Error', 'The list of plugins to update is empty.')
+            return
+        # reading the Build ID of the engine writes the engine registry
+        self._start_task(
+            self._plan_fix, args=(self.config.get('engine_folder'), self.config.get('plugins_folder'), list(self.plugin_list)), on_done=self._on_plan_done, is_reserved=True
+        )
 
+    def execute_plan(self) -> None:
+        """
+        Execute the saved plan, without scanning again.
+        """
+        if not messagebox.askyesno('Run Approved Plan', f'{self.plan_var.get()}\nUpdate the files of this plan ?'):
+            return
+        if self.scheduler is not None:
+            from modules.jobs import JOB_APPLY_BUILD_ID_PLAN
+            self._submit_fix_job({'plan_file': self.plan_file}, title='Run the approved plan', kind=JOB_APPLY_BUILD_ID_PLAN)
+            return
+        self._start_task(self._execute_plan, on_done=self._on_execute_plan_done)
+
+    def execute_all(self) -> None:
+        """
+        Update the plugins of all the registered engines in a single batch. The current engine and plugins folders are registered first.
+        """
+        if self.config.get('engine_folder') == '' or self.config.get('plugins_folder') == '':
+            messagebox.showerror('Error', 'Engine Path or Plugins Directory not specified.')
+            return
+        engine_count = len(set(self.engine.registry.engine_folders + [self.engine.registry.get_engine_root(self.config.get('engine_folder'))]))
+        if not messagebox.askyesno('Update All Engines', f'Update the plugins of the {engine_count} registered engines ?'):
+            return
+        if self.scheduler is not None:
+            self._submit_fix_job({'all_engines': True, 'full_rescan': self.full_rescan_var.get()}, title=f'Update the plugins of {engine_count} engines')
+            return
+        self._start_task(
+            self._fix_build_id_for_engines,
+            args=(self.config.get('engine_folder'), self.config.get('plugins_folder'), self.full_rescan_var.get()),
+            on_done=self._on_execute_done
+        )
+
+    def _submit_fix_job(self, parameters: dict, title: str, kind: str = None) -> None:
+        """
+        Submit a change of the plugin files as a job of the main window, then close this window. The job is displayed in the main window.
+        :param parameters: The parameters of the job. For an update, besides the engine and plugins folders, see jobs.run_fix_build_id_job().
+        :param title: The text displayed for the job.
+        :param kind: The kind of the job, see jobs.py. If None, an update of the plugins.
+        """
+        if kind is None:
+            from modules.jobs import JOB_FIX_BUILD_ID
+            kind = JOB_FIX_BUILD_ID
+            parameters = {'engine_folder': self.config.get('engine_folder'), 'plugins_folder': self.config.get('plugins_folder'), **parameters}
+        job = self.scheduler.submit(kind, parameters, title=title)
+        self.engine.report(f'Update submitted as job {job.name}')
         self.config.save()
-        if len(self.error_list) > 0:
-            self.result += '\n###########\nErrors\n###########\n'
-            self.result += '\n'.join(self.error_list)
-        else:
-            self.result += '\n###########\nNo Errors\n###########\n'
-        try:
-            self.display_callback(self.result)
-        except AttributeError:
-            self.log('No display callback specified.')
         self.close_window()
+
+    def cancel(self) -> None:
+        """
+        Cancel the running job.
+        """
+        if self.task is not None:
+            self.task.cancel()
+
+    def rollback(self) -> None:
+        """
+        Restore the plugin files changed by the last update.
+        """
+        if not messagebox.askyesno('Rollback', 'Restore the original Build ID of the files changed by the last update ?'):
+            return
+        if self.scheduler is not None:
+            from modules.jobs import JOB_ROLLBACK_BUILD_ID
+            self._submit_fix_job({}, title='Roll back the last update', kind=JOB_ROLLBACK_BUILD_ID)
+            return
+        self._start_task(self._rollback_last_run, on_done=self._on_rollback_done)
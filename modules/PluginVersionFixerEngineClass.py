@@ -0,0 +1,548 @@
+# coding=utf-8
+"""
+Implementation for:
+- PluginsBuildIdFixerEngine: The GUI-free part of the PluginsBuildIdFixer tool.
+"""
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable
+
+from modules.BuildIdJournalClass import BuildIdJournal, JOURNAL_APPLIED, JOURNAL_ROLLED_BACK
+from modules.ChangePlanClass import ChangePlan, ACTION_UPDATE, ACTION_UP_TO_DATE, ACTION_FAILED
+from modules.EngineRegistryClass import EngineRegistry
+from modules.CleaningRulesClass import CleaningRules, default_plugin_skip_patterns
+from modules.PhaseStatsClass import PhaseStats
+from modules.PluginInventoryClass import PluginInventory
+from modules.ResultLogClass import ResultLog, LEVEL_INFO, LEVEL_WARNING, LEVEL_ERROR
+from modules.ScanIndexClass import ScanIndex
+from modules.functions import atomic_write
+
+# status of a file after an update
+STATUS_CHANGED = 'changed'
+STATUS_UNCHANGED = 'unchanged'
+STATUS_FAILED = 'failed'
+
+# the value of the BuildId key in a JSON file. Group 2 is the (escaped) value
+_build_id_pattern = re.compile(rb'("BuildId"\s*:\s*")((?:[^"\\]|\\.)*)(")')
+
+default_update_workers = 8
+
+
+class PluginsBuildIdFixerEngine:
+    """
+    The GUI-free part of the PluginsBuildIdFixer tool: update plugin files with the Custom Engine Build ID.
+    It can be used by the PluginsBuildIdFixer window or from the command line. It never imports tkinter.
+    :param index_file: The file of the scan index. If None, the index is only kept in memory.
+    :param journal_file: The file of the journal used to roll back the last run. If None, no journal is written.
+    :param update_workers: The number of threads used to read and write the plugin files.
+    :param registry_file: The file of the engine registry. If None, the registry is only kept in memory.
+    :param result_log: The log the results are written to. If None, the results are only kept in a private log.
+    :param profile_file: The .prof file the phases are profiled to, see PhaseStats. If None, the phases are only timed.
+    :param skip_patterns: The patterns of the folders that can't contain a plugin, see CleaningRules. If None, default_plugin_skip_patterns is used.
+    """
+
+    def __init__(self, index_file: str = None, journal_file: str = None, update_workers: int = default_update_workers, registry_file: str = None,
+                 result_log: ResultLog = None, profile_file: str = None, skip_patterns: list = None):
+        self.name = 'PluginsBuildIdFixer'
+        self.index_file = index_file
+        self.journal_file = journal_file
+        self.registry = EngineRegistry(registry_file=registry_file)
+        self.update_workers = max(1, update_workers)
+        self.build_id = ''
+        self.result_log = ResultLog() if result_log is None else result_log
+        self.error_list = []
+        self.stats = PhaseStats(self.name, profile_file=profile_file)  # the timing and the counters of each phase
+        self.scan_stats = ''  # stats of the scan index for the last search
+        self.file_counts = {STATUS_CHANGED: 0, STATUS_UNCHANGED: 0, STATUS_FAILED: 0}  # number of files by status for the last update
+        # folders that can't contain a plugin, they are not visited by find_plugins()
+        self.skip_rules = CleaningRules(include=[], exclude=default_plugin_skip_patterns if skip_patterns is None else skip_patterns, skip=[])
+        self.report(f'###########\nRUNNING {self.name}\n###########')
+
+    def log(self, message: str) -> None:
+        """
+        Log an error message to the console (stderr, to keep stdout clean for the command line output) and to the result log.
+        :param message: The message to log.
+        """
+        print(f'[{self.__class__.__name__}] {message}', file=sys.stderr)
+        self.error_list.append(message)
+        self.result_log.write(self.name, message, LEVEL_ERROR)
+
+    def report(self, message: str, level: str = LEVEL_INFO) -> None:
+        """
+        Write a result message to the result log.
+        :param message: The message. A multi lines message is written as one record per line.
+        :param level: The level of the message: LEVEL_INFO or LEVEL_WARNING. The errors are written by log().
+        """
+        self.result_log.write(self.name, message, level)
+
+    @staticmethod
+    def get_modules_file(plugin_file: str) -> str:
+        """
+        Get the path of the .modules file of a plugin.
+        :param plugin_file: The path to the .uplugin file.
+        :return: The path to the .modules file.
+        """
+        return os.path.join(os.path.dirname(plugin_file), 'Binaries', 'Win64', 'UnrealEditor.modules')
+
+    def extract_build_id(self, engine_folder: str, rescan: bool = False, should_stop: Callable[[], bool] = None) -> str:
+        """
+        Extract Custom Engine Build ID from the .modules files of the specified engine, using the engine registry.
+        The value is cached: the engine folder is scanned again only if one of its .modules files has changed.
+        :param engine_folder: The engine folder to read the Build ID from.
+        :param rescan: Whether to scan the engine folder again even if none of its .modules files has changed.
+        :param should_stop: A function called regularly. If it returns True, the search stops.
+        :return: The Build ID, or an empty string if it could not be read.
+        """
+        registry = self.registry
+        registry.error_list = []
+        with self.stats.phase('engine_build_id') as counters:
+            build_id = registry.get_build_id(engine_folder, rescan=rescan, should_stop=should_stop)
+            registry.save()
+            entry = registry.get_entry(engine_folder)
+            counters.update(files=len(entry['files']) if entry else 0, errors=len(registry.error_list))
+        for message in registry.error_list:
+            self.log(message)
+        if build_id and entry['inconsistent_files']:
+            self.report(f'{len(entry["inconsistent_files"])} of {len(entry["files"])} .modules files of {engine_folder} have a BuildId other than {build_id}:', LEVEL_WARNING)
+            for modules_file in entry['inconsistent_files']:
+                self.report(f'    {modules_file}', LEVEL_WARNING)
+        return build_id
+
+    @staticmethod
+    def _set_build_id_in_content(content: bytes, build_id: str):
+        """
+        Set the value of the 'BuildId' key in the content of a JSON file.
+        Only the value is replaced, the rest of the content is kept byte for byte.
+        :param content: The content of the file.
+        :param build_id: The value to set.
+        :return: The new content (None if the value is already correct) and the old value (None if there was no BuildId key).
+        """
+        new_value = json.dumps(build_id)[1:-1].encode('utf-8')
+        match = _build_id_pattern.search(content)
+        if match:
+            old_value = json.loads(b'"' + match.group(2) + b'"')
+            if match.group(2) == new_value:
+                return None, old_value
+            return content[:match.start(2)] + new_value + content[match.end(2):], old_value
+        # no BuildId key yet: add it, the file is reformatted
+        data = json.loads(content.decode('utf-8-sig'))
+        data['BuildId'] = build_id
+        return json.dumps(data, indent=4).encode('utf-8'), None
+
+    def _prepare_build_id(self, json_file: str, build_id: str = None) -> dict:
+        """
+        Read a JSON file and prepare the update of its 'BuildId' value. Nothing is written.
+        :param json_file: The path to the JSON file.
+        :param build_id: The Build ID to set. If None, self.build_id is used.
+        :return: A dict {'path', 'status', 'old_build_id', 'content': the new content, 'original': the original content if there was no BuildId key, 'duration',
+            'size': the size of the original content}.
+        """
+        start = time.perf_counter()
+        update = {'path': json_file, 'status': STATUS_FAILED, 'old_build_id': None, 'content': None, 'original': None, 'duration': 0.0, 'size': 0}
+        try:
+            with open(json_file, 'rb') as file:
+                content = file.read()
+            update['size'] = len(content)
+            update['content'], update['old_build_id'] = self._set_build_id_in_content(content, self.build_id if build_id is None else build_id)
+            if update['content'] is None:
+                update['status'] = STATUS_UNCHANGED
+            else:
+                update['status'] = STATUS_CHANGED
+                if update['old_build_id'] is None:
+                    update['original'] = content.decode('utf-8', 'surrogateescape')
+        except FileNotFoundError:
+            self.log(f'File not found: {json_file}')
+        except (UnicodeDecodeError, json.decoder.JSONDecodeError, AttributeError, TypeError):
+            self.log(f'Invalid JSON file: {json_file}')
+        except OSError as error:
+            self.log(f'Could not read {json_file}: error {error!r}')
+        update['duration'] = time.perf_counter() - start
+        return update
+
+    def _write_build_id(self, update: dict) -> str:
+        """
+        Write a file prepared by _prepare_build_id(), atomically: a crash during the update never leaves a truncated file.
+        :param update: The prepared update. Its duration is increased by the duration of the write.
+        :return: The status of the file: STATUS_CHANGED or STATUS_FAILED.
+        """
+        start = time.perf_counter()
+        try:
+            atomic_write(update['path'], update['content'])
+            return STATUS_CHANGED
+        except OSError as error:
+            self.log(f'Could not write {update["path"]}: error {error!r}')
+            return STATUS_FAILED
+        finally:
+            update['duration'] += time.perf_counter() - start
+
+    def find_plugins(self, plugins_folder: str, full_rescan: bool = False, should_stop: Callable[[], bool] = None, on_progress: Callable[[int, int], None] = None) -> list:
+        """
+        Recursively find all Unreal Engine plugins from a given directory.
+        The folders that can't contain a plugin are not visited, nor the sub folders of a plugin.
+        Only the folders that have changed since the last scan are read, the others are reused from the scan index.
+        :param plugins_folder: The folder to scan.
+        :param full_rescan: Whether to invalidate the scan index before scanning.
+        :param should_stop: A function called regularly. If it returns True, the search stops.
+        :param on_progress: A function called with (folders scanned, 0) while scanning.
+        :return: A list of plugin paths.
+        """
+        should_visit = self.skip_rules.should_visit
+        plugin_files = []
+        dirs_visited = 0
+        with self.stats.phase('index_load') as counters:
+            index = ScanIndex(index_file=self.index_file)
+            if full_rescan:
+                index.invalidate(plugins_folder)
+            counters['dirs'] = len(index.entries)
+        with self.stats.phase('scan') as counters:
+            for root, dirs, files in index.walk(plugins_folder, should_stop=should_stop):
+                dirs_visited += 1
+                if on_progress is not None:
+                    on_progress(dirs_visited, 0)
+                found = [os.path.join(root, file) for file in files if file.endswith('.uplugin')]
+                if found:
+                    plugin_files.extend(found)
+                    dirs[:] = []  # a plugin does not contain other plugins, no need to go deeper
+                else:
+                    dirs[:] = [name for name in dirs if should_visit(root, name)]  # Skip folders that are not plugins
+            counters.update(dirs=dirs_visited, items=len(plugin_files), errors=len(index.error_list))
+        with self.stats.phase('index_save') as counters:
+            index.save()
+            counters['dirs'] = len(index.entries)
+        self.scan_stats = index.stats_text()
+        for message in index.error_list:
+            self.log(message)
+        return plugin_files
+
+    def fix_build_id_in_plugins(self, plugin_list: list, should_stop: Callable[[], bool] = None, on_progress: Callable[[int, int], None] = None, build_ids: dict = None) -> dict:
+        """
+        Update a list of plugins with the Custom Engine Build ID stored in self.build_id, or with the Build ID given for each plugin.
+        The .uplugin and .modules files are read, then written, by a pool of threads.
+        The original values of the files to change are written to the journal before any file is changed, see rollback_last_run().
+        :param plugin_list: The plugin files to update, as returned by find_plugins().
+        :param should_stop: A function called regularly. If it returns True, the update stops.
+        :param on_progress: A function called with (files done, files total) while reading, then while writing the files.
+        :param build_ids: A dict {plugin file: Build ID}, used to update the plugins of several engines in one run. If None, self.build_id is used for all the plugins.
+        :return: A dict {plugin file: status of the plugin}: STATUS_FAILED if a file has failed, STATUS_CHANGED if a file has been changed, STATUS_UNCHANGED otherwise.
+        """
+        self.file_counts = {STATUS_CHANGED: 0, STATUS_UNCHANGED: 0, STATUS_FAILED: 0}
+        file_build_ids = self._get_json_files(plugin_list, build_ids)
+        json_files = list(file_build_ids)
+        statuses = {}  # {json file: status}
+        prepared = {}  # {json file: prepared update}
+
+        with ThreadPoolExecutor(max_workers=self.update_workers, thread_name_prefix='BuildIdFixer') as executor:
+            # read all the files first, so the journal can be written before any change
+            with self.stats.phase('read') as counters:
+                updates = self._run_in_pool(executor, lambda json_file: self._prepare_build_id(json_file, file_build_ids[json_file]), json_files, should_stop, on_progress)
+                read = [update for update in updates if update is not None]
+                counters.update(
+                    files=len(read), bytes=sum(update['size'] for update in read), errors=sum(1 for update in read if update['status'] == STATUS_FAILED)
+                )
+            to_write = []
+            for update in updates:
+                if update is None:
+                    continue  # skipped, the update has been cancelled
+                prepared[update['path']] = update
+                statuses[update['path']] = update['status']
+                if update['status'] == STATUS_CHANGED:
+                    to_write.append(update)
+            if to_write and not (should_stop is not None and should_stop()):
+                journal = None
+                if self.journal_file is not None:
+                    with self.stats.phase('journal') as counters:
+                        journal = BuildIdJournal(self.journal_file)
+                        journal.start(', '.join(sorted(set(file_build_ids.values()))), [{'path': update['path'], 'old_build_id': update['old_build_id'], 'original': update['original']} for update in to_write])
+                        counters['items'] = len(to_write)
+                with self.stats.phase('write') as counters:
+                    written = self._run_in_pool(executor, self._write_build_id, to_write, should_stop, on_progress)
+                    counters.update(
+                        files=sum(1 for status in written if status == STATUS_CHANGED), errors=sum(1 for status in written if status == STATUS_FAILED),
+                        bytes=sum(len(update['content']) for update, status in zip(to_write, written) if status == STATUS_CHANGED)
+                    )
+                for update, status in zip(to_write, written):
+                    # a file not written keeps its content
+                    statuses[update['path']] = STATUS_UNCHANGED if status is None else status
+                if journal is not None:
+                    journal.set_status(JOURNAL_APPLIED)
+            else:
+                # cancelled before writing: no file has been changed
+                for update in to_write:
+                    statuses[update['path']] = STATUS_UNCHANGED
+
+        for json_file, status in statuses.items():
+            update = prepared[json_file]
+            self.result_log.add_item(
+                self.name, 'update', json_file, status=status, old_build_id=update['old_build_id'], new_build_id=file_build_ids[json_file], duration=round(update['duration'], 4)
+            )
+        results = {}
+        for plugin_file in plugin_list:
+            plugin_statuses = [statuses.get(plugin_file), statuses.get(self.get_modules_file(plugin_file))]
+            if None in plugin_statuses:
+                continue  # not processed, the update has been cancelled
+            for status in plugin_statuses:
+                self.file_counts[status] += 1
+            if STATUS_FAILED in plugin_statuses:
+                results[plugin_file] = STATUS_FAILED
+                self.report(f'Failed to update plugin files in {plugin_file}', LEVEL_WARNING)
+            elif STATUS_CHANGED in plugin_statuses:
+                results[plugin_file] = STATUS_CHANGED
+                self.report(f'Updated plugin files in {plugin_file}')
+            else:
+                results[plugin_file] = STATUS_UNCHANGED
+                self.report(f'Plugin files already up to date in {plugin_file}')
+        if should_stop is not None and should_stop():
+            self.report('Update cancelled by user.', LEVEL_WARNING)
+        counts = self.file_counts
+        self.report(f'Files: {counts[STATUS_CHANGED]} changed, {counts[STATUS_UNCHANGED]} unchanged, {counts[STATUS_FAILED]} failed')
+        return results
+
+    def _get_json_files(self, plugin_list: list, build_ids: dict = None) -> dict:
+        """
+        Get the JSON files to update for a list of plugins: the .uplugin and the .modules file of each plugin.
+        :param plugin_list: The plugin files.
+        :param build_ids: A dict {plugin file: Build ID}. If None, self.build_id is used for all the plugins.
+        :return: A dict {JSON file: Build ID to set}, in the order of the plugins.
+        """
+        file_build_ids = {}
+        for plugin_file in plugin_list:
+            build_id = self.build_id if build_ids is None else build_ids[plugin_file]
+            file_build_ids[plugin_file] = build_id
+            file_build_ids[self.get_modules_file(plugin_file)] = build_id
+        return file_build_ids
+
+    def plan_fix(self, plugin_list: list, should_stop: Callable[[], bool] = None, on_progress: Callable[[int, int], None] = None, build_ids: dict = None,
+                 parameters: dict = None) -> ChangePlan:
+        """
+        Make the plan of an update: read the plugin files and list the files to update, with their old and new BuildId, and the files already up to date.
+        Nothing is written. The plan can be executed later by execute_plan().
+        :param plugin_list: The plugin files to update, as returned by find_plugins().
+        :param should_stop: A function called regularly. If it returns True, the plan stops.
+        :param on_progress: A function called with (files done, files total) while reading the files.
+        :param build_ids: A dict {plugin file: Build ID}. If None, self.build_id is used for all the plugins.
+        :param parameters: The parameters to store in the plan, ie. the engine and plugins folders.
+        :return: The plan.
+        """
+        file_build_ids = self._get_json_files(plugin_list, build_ids)
+        plugin_files = {}  # {JSON file: plugin file}
+        for plugin_file in plugin_list:
+            plugin_files[plugin_file] = plugin_file
+            plugin_files[self.get_modules_file(plugin_file)] = plugin_file
+        with ThreadPoolExecutor(max_workers=self.update_workers, thread_name_prefix='BuildIdPlanner') as executor, self.stats.phase('read') as counters:
+            json_files = list(file_build_ids)
+            updates = self._run_in_pool(executor, lambda json_file: self._prepare_build_id(json_file, file_build_ids[json_file]), json_files, should_stop, on_progress)
+            read = [update for update in updates if update is not None]
+            counters.update(files=len(read), bytes=sum(update['size'] for update in read), errors=sum(1 for update in read if update['status'] == STATUS_FAILED))
+        plan = ChangePlan(self.name)
+        plan.parameters = parameters or {}
+        actions = {STATUS_CHANGED: ACTION_UPDATE, STATUS_UNCHANGED: ACTION_UP_TO_DATE, STATUS_FAILED: ACTION_FAILED}
+        for json_file, update in zip(json_files, updates):
+            if update is None:
+                continue  # cancelled
+            item = plan.add(actions[update['status']], json_file, plugin=plugin_files[json_file], old_build_id=update['old_build_id'], new_build_id=file_build_ids[json_file])
+            self.result_log.add_item(self.name, 'plan', json_file, status=item['action'], old_build_id=item['old_build_id'], new_build_id=item['new_build_id'])
+        return plan
+
+    def execute_plan(self, plan: ChangePlan, should_stop: Callable[[], bool] = None, on_progress: Callable[[int, int], None] = None) -> dict:
+        """
+        Execute a plan made by plan_fix(), without scanning the plugins folder again.
+        The plan is not executed if one of its files has changed since the plan was made.
+        :param plan: The plan.
+        :param should_stop: A function called regularly. If it returns True, the update stops.
+        :param on_progress: A function called with (files done, files total) while reading, then while writing the files.
+        :return: A dict {plugin file: status of the plugin}, empty if the plan has not been executed.
+        """
+        if plan.tool != self.name:
+            raise ValueError(f'This plan has been made by {plan.tool}, not by {self.name}.')
+        stale_items = plan.get_stale_items()
+        if stale_items:
+            self.log(f'The plan of {plan.created} is out of date: {len(stale_items)} files have changed since. Make the plan again.')
+            for item in stale_items:
+                self.log(f'    Changed: {item["path"]}')
+            return {}
+        build_ids = {item['plugin']: item['new_build_id'] for item in plan.get_items(ACTION_UPDATE)}
+        self.report(f'Executing the plan of {plan.created}: {len(plan.get_items(ACTION_UPDATE))} files to update')
+        return self.fix_build_id_in_plugins(list(build_ids), should_stop=should_stop, on_progress=on_progress, build_ids=build_ids)
+
+    def find_plugins_for_engines(self, engine_folders: list = None, full_rescan: bool = False, should_stop: Callable[[], bool] = None,
+                                 on_progress: Callable[[int, int], None] = None) -> tuple[dict, dict]:
+        """
+        Find the plugins of several registered engines, and the Build ID to set in each of them.
+        :param engine_folders: The engine folders. If None, all the registered engines are used.
+        :param full_rescan: Whether to scan the engine folders again and to invalidate the scan index before scanning the plugins folders.
+        :param should_stop: A function called regularly. If it returns True, the search stops.
+        :param on_progress: A function called with (folders scanned, 0) while scanning.
+        :return: A dict {engine folder: plugin files} and a dict {plugin file: Build ID}.
+        """
+        if engine_folders is None:
+            engine_folders = self.registry.engine_folders
+        build_ids = {}  # {plugin file: Build ID}
+        engine_plugins = {}  # {engine folder: plugin files}
+        scan_stats = []
+        for engine_folder in engine_folders:
+            if should_stop is not None and should_stop():
+                break
+            build_id = self.extract_build_id(engine_folder, rescan=full_rescan, should_stop=should_stop)
+            plugins_folder = self.registry.add(engine_folder)['plugins_folder']
+            if not build_id:
+                continue
+            if not os.path.isdir(plugins_folder):
+                self.log(f'Invalid plugins folder for {engine_folder}: "{plugins_folder}"')
+                continue
+            self.report(f'Engine {engine_folder}: BuildId {build_id}, plugins in {plugins_folder}')
+            plugin_list = self.find_plugins(plugins_folder, full_rescan=full_rescan, should_stop=should_stop, on_progress=on_progress)
+            scan_stats.append(self.scan_stats)
+            engine_plugins[engine_folder] = plugin_list
+            for plugin_file in plugin_list:
+                build_ids[plugin_file] = build_id
+        self.registry.save()
+        self.scan_stats = '; '.join(scan_stats)
+        return engine_plugins, build_ids
+
+    def fix_build_id_for_engines(self, engine_folders: list = None, full_rescan: bool = False, should_stop: Callable[[], bool] = None,
+                                 on_progress: Callable[[int, int], None] = None) -> dict:
+        """
+        Update the plugins of several registered engines in a single batch: each plugins folder is updated with the Build ID of its engine.
+        All the files are updated in one run, so a single rollback restores all of them.
+        :param engine_folders: The engine folders. If None, all the registered engines are updated.
+        :param full_rescan: Whether to scan the engine folders again and to invalidate the scan index before scanning the plugins folders.
+        :param should_stop: A function called regularly. If it returns True, the update stops.
+        :param on_progress: A function called with (done, total) while scanning and updating, see find_plugins() and fix_build_id_in_plugins().
+        :return: A dict {engine folder: {plugin file: status of the plugin}}.
+        """
+        engine_plugins, build_ids = self.find_plugins_for_engines(engine_folders, full_rescan=full_rescan, should_stop=should_stop, on_progress=on_progress)
+        results = self.fix_build_id_in_plugins(list(build_ids), should_stop=should_stop, on_progress=on_progress, build_ids=build_ids)
+        return {engine_folder: {plugin_file: results[plugin_file] for plugin_file in plugin_list if plugin_file in results} for engine_folder, plugin_list in engine_plugins.items()}
+
+    def get_expected_build_ids(self, rescan: bool = False, should_stop: Callable[[], bool] = None) -> dict:
+        """
+        Get the BuildId expected in the plugins folder of each registered engine, ie. to find the plugins with a stale BuildId in the inventory.
+        :param rescan: Whether to scan the engine folders again even if none of their .modules files has changed.
+        :param should_stop: A function called regularly. If it returns True, the search stops.
+        :return: A dict {plugins folder: Build ID of its engine}. The engines whose Build ID can't be read are not included.
+        """
+        build_ids = {}
+        for engine_folder in self.registry.engine_folders:
+            if should_stop is not None and should_stop():
+                break
+            build_id = self.extract_build_id(engine_folder, rescan=rescan, should_stop=should_stop)
+            if build_id:
+                build_ids[self.registry.get_entry(engine_folder)['plugins_folder']] = build_id
+        return build_ids
+
+    def update_inventory(self, inventory: PluginInventory, folders: list = None, full_rescan: bool = False, should_stop: Callable[[], bool] = None,
+                         on_progress: Callable[[int, int], None] = None) -> None:
+        """
+        Find the plugins of the registered engines and of some other folders (ie. the projects folder), and update the inventory with their metadata.
+        Only the plugins whose files have changed since the last update are parsed. The inventory is saved.
+        :param inventory: The inventory to update.
+        :param folders: The folders to search for plugins, in addition to the plugins folders of the registered engines.
+        :param full_rescan: Whether to invalidate the scan index before scanning.
+        :param should_stop: A function called regularly. If it returns True, the update stops and the inventory is not changed.
+        :param on_progress: A function called with (done, total) while scanning and parsing, see find_plugins().
+        """
+        roots = [self.registry.get_entry(engine_folder)['plugins_folder'] for engine_folder in self.registry.engine_folders] + list(folders or [])
+        plugins_by_root = {}
+        for root in dict.fromkeys(os.path.normpath(folder) for folder in roots):
+            if not os.path.isdir(root):
+                self.log(f'Invalid plugins folder: "{root}"')
+                continue
+            plugins_by_root[root] = self.find_plugins(root, full_rescan=full_rescan, should_stop=should_stop, on_progress=on_progress)
+            if should_stop is not None and should_stop():
+                # the plugins not found would be removed from the inventory
+                return
+        with self.stats.phase('inventory') as counters:
+            inventory.update(plugins_by_root, self.get_modules_file, should_stop=should_stop, on_progress=on_progress, max_workers=self.update_workers)
+            inventory.save()
+            counters.update(items=len(inventory.entries), files=inventory.parsed, errors=len(inventory.error_list))
+        for message in inventory.error_list:
+            self.log(message)
+        self.report(inventory.stats_text())
+
+    @staticmethod
+    def _run_in_pool(executor: ThreadPoolExecutor, function, items: list, should_stop: Callable[[], bool] = None, on_progress: Callable[[int, int], None] = None) -> list:
+        """
+        Run a function on a list of items with a pool of threads.
+        :param executor: The pool of threads.
+        :param function: The function to run on each item.
+        :param items: The items.
+        :param should_stop: A function called before each item. If it returns True, the remaining items are skipped.
+        :param on_progress: A function called with (items done, items total) each time an item is done, in the calling thread.
+        :return: The results, in the order of the items. The result of a skipped item is None.
+        """
+        total = len(items)
+
+        def run(item):
+            if should_stop is not None and should_stop():
+                return None
+            return function(item)
+
+        futures = {executor.submit(run, item): index for index, item in enumerate(items)}
+        results = [None] * total
+        # the progress is the number of items done, in the order they complete: it never goes backwards
+        for done, future in enumerate(as_completed(futures), start=1):
+            results[futures[future]] = future.result()
+            if on_progress is not None:
+                on_progress(done, total)
+        return results
+
+    def rollback_last_run(self, should_stop: Callable[[], bool] = None, on_progress: Callable[[int, int], None] = None) -> dict:
+        """
+        Restore the original values of all the files changed by the last run, using the journal.
+        :param should_stop: A function called regularly. If it returns True, the rollback stops.
+        :param on_progress: A function called with (files done, files total) each time a file is restored.
+        :return: A dict {file: status}: STATUS_CHANGED if restored, STATUS_UNCHANGED if already restored, STATUS_FAILED if failed.
+        """
+        if self.journal_file is None:
+            self.log('No journal file specified.')
+            return {}
+        journal = BuildIdJournal(self.journal_file)
+        if not journal.load() or not journal.can_rollback():
+            self.log('No run to roll back.')
+            return {}
+
+        def restore(entry: dict) -> str:
+            path = entry['path']
+            try:
+                if entry['old_build_id'] is None:
+                    content = entry['original'].encode('utf-8', 'surrogateescape')
+                else:
+                    with open(path, 'rb') as file:
+                        content, _old_value = self._set_build_id_in_content(file.read(), entry['old_build_id'])
+                    if content is None:
+                        return STATUS_UNCHANGED
+                atomic_write(path, content)
+                return STATUS_CHANGED
+            except (OSError, ValueError, AttributeError, TypeError) as error:
+                self.log(f'Could not restore {path}: error {error!r}')
+                return STATUS_FAILED
+
+        with ThreadPoolExecutor(max_workers=self.update_workers, thread_name_prefix='BuildIdRollback') as executor, self.stats.phase('rollback') as counters:
+            statuses = self._run_in_pool(executor, restore, journal.files, should_stop, on_progress)
+            counters.update(files=sum(1 for status in statuses if status == STATUS_CHANGED), errors=sum(1 for status in statuses if status == STATUS_FAILED))
+        results = {entry['path']: status for entry, status in zip(journal.files, statuses) if status is not None}
+        for entry in journal.files:
+            if entry['path'] in results:
+                self.result_log.add_item(self.name, 'rollback', entry['path'], status=results[entry['path']], old_build_id=journal.data.get('build_id'), new_build_id=entry['old_build_id'])
+        restored = sum(1 for status in results.values() if status == STATUS_CHANGED)
+        self.report(f'Rolled back the run of {journal.data.get("date")} (BuildId {journal.data.get("build_id")}): {restored} files restored')
+        for path, status in results.items():
+            if status == STATUS_FAILED:
+                self.report(f'Failed to restore {path}', LEVEL_WARNING)
+        if len(results) == len(journal.files) and STATUS_FAILED not in results.values():
+            journal.set_status(JOURNAL_ROLLED_BACK)
+        return results
+
+    def end_report(self) -> None:
+        """
+        Write the summary of the phases and of the errors to the result log. The errors themselves have been written when they occurred.
+        """
+        self.report(self.stats.to_text())
+        if len(self.error_list) > 0:
+            self.report(f'###########\n{len(self.error_list)} Errors\n###########', LEVEL_WARNING)
+        else:
+            self.report('###########\nNo Errors\n###########')
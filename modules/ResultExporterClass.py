@@ -0,0 +1,91 @@
+# coding=utf-8
+"""
+Implementation for:
+- ResultExporter: Export the typed items of the runs to CSV, TSV, JSON Lines or JSON.
+"""
+import csv
+import json
+import os
+import shutil
+
+# formats of the exported files
+FORMAT_CSV = 'csv'
+FORMAT_TSV = 'tsv'
+FORMAT_JSONL = 'jsonl'
+FORMAT_JSON = 'json'
+
+# {file extension: format}. A .tcsv file is a CSV file with tabs, a .jsonl file has one object per line, a .json file is an array of objects
+format_by_extension = {'.csv': FORMAT_CSV, '.tcsv': FORMAT_TSV, '.tsv': FORMAT_TSV, '.json': FORMAT_JSON, '.jsonl': FORMAT_JSONL}
+
+
+class ResultExporter:
+    """
+    Export the typed items of the runs to CSV, TSV, JSON Lines or JSON.
+    The items are read line by line from the items file of a ResultLog and written one by one, so the export never holds the items in memory.
+    :param items_file: The items file (JSON Lines) written by ResultLog.
+    """
+    # the columns of the CSV and TSV files. The JSON files keep all the fields of the items.
+    # 'job' is the name of the job that processed the path (see ResultLog.get_job_log()), empty for the runs of the windows and of the command line
+    fields = ['time', 'tool', 'job', 'action', 'path', 'status', 'bytes', 'files', 'duration', 'old_build_id', 'new_build_id', 'error']
+
+    def __init__(self, items_file: str):
+        self.items_file = items_file
+
+    @staticmethod
+    def get_format(filename: str):
+        """
+        Get the format of an exported file from its extension.
+        :param filename: The file.
+        :return: The format, or None if the extension is not an export format (ie. '.txt').
+        """
+        return format_by_extension.get(os.path.splitext(filename)[1].lower())
+
+    def iter_items(self):
+        """
+        Read the items of the items file, one by one.
+        :return: An iterator on the items.
+        """
+        if self.items_file is None or not os.path.isfile(self.items_file):
+            return
+        with open(self.items_file, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # a line truncated by a crash
+
+    def export(self, filename: str, file_format: str = None) -> int:
+        """
+        Export the items to a file.
+        :param filename: The exported file.
+        :param file_format: The format: FORMAT_CSV, FORMAT_TSV, FORMAT_JSONL or FORMAT_JSON. If None, the format is given by the extension of the file.
+        :return: The number of exported items.
+        """
+        file_format = file_format or self.get_format(filename)
+        if file_format not in (FORMAT_CSV, FORMAT_TSV, FORMAT_JSONL, FORMAT_JSON):
+            raise ValueError(f'Unsupported export format for {filename}')
+        if file_format == FORMAT_JSONL:
+            # the items file is already in this format: a plain copy is the fastest export
+            if self.items_file is not None and os.path.isfile(self.items_file):
+                shutil.copyfile(self.items_file, filename)
+                with open(filename, 'rb') as file:
+                    return sum(1 for _line in file)
+            open(filename, 'w').close()
+            return 0
+        count = 0
+        if file_format == FORMAT_JSON:
+            # a single array, written item by item
+            with open(filename, 'w', encoding='utf-8') as file:
+                file.write('[')
+                for item in self.iter_items():
+                    file.write((',\n' if count else '\n') + json.dumps(item))
+                    count += 1
+                file.write('\n]\n')
+            return count
+        with open(filename, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=self.fields, delimiter='\t' if file_format == FORMAT_TSV else ',', extrasaction='ignore')
+            writer.writeheader()
+            for item in self.iter_items():
+                writer.writerow(item)
+                count += 1
+        return count
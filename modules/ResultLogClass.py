@@ -0,0 +1,231 @@
+# coding=utf-8
+"""
+Implementation for:
+- ResultLog: A structured, bounded-memory log of the results of the tools, streamed to a file.
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+# levels of the records
+LEVEL_INFO = 'INFO'
+LEVEL_WARNING = 'WARNING'
+LEVEL_ERROR = 'ERROR'
+levels = (LEVEL_INFO, LEVEL_WARNING, LEVEL_ERROR)
+
+# number of records kept in memory. The older ones are only in the log file
+default_max_records = 10000
+# number of log files of the previous sessions kept in the log folder
+default_kept_log_files = 10
+
+
+class ResultLog:
+    """
+    A structured, bounded-memory log of the results of the tools.
+    The tools write records as they are produced. The last records are kept in a ring buffer, which can be filtered by level or by tool.
+    All the records are streamed to a log file, so the full log is never kept in memory.
+    Besides the text records, the tools write typed items, one per processed path (see add_item()). They are only streamed to the items file,
+    as JSON Lines, and can be exported to CSV, TSV, JSON Lines or JSON by ResultExporter.
+    It's thread safe: the records can be written by the worker threads. The listeners are called in the thread that writes the record.
+    :param log_file: The file the records are streamed to. If None, the records are only kept in memory.
+    :param max_records: The number of records kept in memory.
+    :param items_file: The file the items are streamed to. If None, the items are dropped.
+    """
+
+    def __init__(self, log_file: str = None, max_records: int = default_max_records, items_file: str = None):
+        self.log_file = log_file
+        self.items_file = items_file
+        self.item_count = 0  # number of items written since the creation
+        self._items = None
+        self.records = deque(maxlen=max_records)  # the last records: dict {'time', 'level', 'tool', 'message'}
+        self.count = 0  # number of records written since the creation
+        self.tools = set()  # names of the tools that have written a record
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._file = None
+        self._parent = None  # the log the records and the items of a job log are forwarded to, see get_job_log()
+        self.job = ''  # the name of the job of a job log
+        if log_file is not None:
+            self.open_log_file(log_file)
+        if items_file is not None:
+            self.open_items_file(items_file)
+
+    def open_log_file(self, log_file: str) -> None:
+        """
+        Stream the next records to a log file. The records already written are added to the file first.
+        :param log_file: The log file.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+            self.log_file = log_file
+            self._file = open(log_file, 'a', encoding='utf-8')
+            self._file.writelines(self.format_record(record, with_time=True) + '\n' for record in self.records)
+
+    def open_items_file(self, items_file: str) -> None:
+        """
+        Stream the next items to a file, as JSON Lines.
+        :param items_file: The items file.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(items_file)), exist_ok=True)
+        with self._lock:
+            if self._items is not None:
+                self._items.close()
+            self.items_file = items_file
+            self._items = open(items_file, 'a', encoding='utf-8')
+
+    def add_item(self, tool: str, action: str, path: str, **fields) -> None:
+        """
+        Write a typed item: the result of the processing of a path.
+        :param tool: The name of the tool.
+        :param action: The action, ie. 'clean' or 'update'.
+        :param path: The processed path.
+        :param fields: The other fields, see ResultExporter.fields: status, bytes, files, duration, old_build_id, new_build_id, error.
+        """
+        if self._parent is not None:
+            self._parent.add_item(tool, action, path, job=self.job, **fields)
+            return
+        import json  # imported on the first item, not at the startup of the main window
+        item = {'time': round(time.time(), 3), 'tool': tool, 'action': action, 'path': path, **fields}
+        line = json.dumps(item) + '\n'
+        with self._lock:
+            self.item_count += 1
+            if self._items is not None:
+                self._items.write(line)
+
+    def add_listener(self, listener: Callable[[dict], None]) -> None:
+        """
+        Add a function called with each new record.
+        :param listener: The function.
+        """
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[dict], None]) -> None:
+        """
+        Remove a function added by add_listener().
+        :param listener: The function.
+        """
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def write(self, tool: str, message: str, level: str = LEVEL_INFO) -> None:
+        """
+        Write a record. A multi lines message is written as one record per line.
+        :param tool: The name of the tool.
+        :param message: The message.
+        :param level: The level: LEVEL_INFO, LEVEL_WARNING or LEVEL_ERROR.
+        """
+        now = time.time()
+        with self._lock:
+            listeners = list(self._listeners)
+            new_records = []
+            for line in message.splitlines() or ['']:
+                record = {'time': now, 'level': level, 'tool': tool, 'message': line}
+                self.records.append(record)
+                new_records.append(record)
+                if self._file is not None:
+                    self._file.write(self.format_record(record, with_time=True) + '\n')
+            self.count += len(new_records)
+            self.tools.add(tool)
+        for record in new_records:
+            for listener in listeners:
+                listener(record)
+        if self._parent is not None:
+            self._parent.write(f'{tool} {self.job}', message, level)
+
+    def get_job_log(self, job: str, max_records: int = default_max_records) -> 'ResultLog':
+        """
+        Get a log for a job, ie. a tool run by the JobScheduler. Its records are kept in its own buffer (the log stream of the job), and written to this log
+        with the name of the job after the name of the tool (ie. '[FolderCleaner #3]'), so the results pane can be filtered by job.
+        Its items are written to the items file of this log, with the name of the job in a 'job' field.
+        :param job: The name of the job, ie. '#3'.
+        :param max_records: The number of records of the job kept in memory.
+        :return: The log of the job.
+        """
+        job_log = ResultLog(max_records=max_records)
+        job_log._parent = self
+        job_log.job = job
+        return job_log
+
+    @staticmethod
+    def level_index(level: str) -> int:
+        """
+        Get the severity of a level, to compare levels.
+        :param level: The level. If None or unknown, the lowest severity is returned.
+        """
+        return levels.index(level) if level in levels else 0
+
+    def get_records(self, level: str = None, tool: str = None) -> list:
+        """
+        Get the records kept in memory, filtered by level or by tool.
+        :param level: The minimum level of the records. If None, all the levels are returned.
+        :param tool: The name of the tool. If None, the records of all the tools are returned.
+        :return: The records, from the oldest to the newest.
+        """
+        min_index = self.level_index(level)
+        with self._lock:
+            return [record for record in self.records if self.level_index(record['level']) >= min_index and (tool is None or record['tool'] == tool)]
+
+    @staticmethod
+    def format_record(record: dict, with_time: bool = False) -> str:
+        """
+        Format a record as a line of text.
+        :param record: The record.
+        :param with_time: Whether to add the time of the record.
+        :return: The line, without the end of line.
+        """
+        prefix = time.strftime('%Y-%m-%d %H:%M:%S ', time.localtime(record['time'])) if with_time else ''
+        return f'{prefix}{record["level"]:<7} [{record["tool"]}] {record["message"]}'
+
+    def clear(self) -> None:
+        """
+        Remove the records kept in memory. The log file is kept.
+        """
+        with self._lock:
+            self.records.clear()
+
+    def flush(self) -> None:
+        """
+        Write the buffered records to the log file.
+        """
+        with self._lock:
+            for file in (self._file, self._items):
+                if file is not None:
+                    file.flush()
+
+    def close(self) -> None:
+        """
+        Close the log file and the items file.
+        """
+        with self._lock:
+            for file in (self._file, self._items):
+                if file is not None:
+                    file.close()
+            self._file = None
+            self._items = None
+
+
+def get_session_log_file(log_folder: str, kept_log_files: int = default_kept_log_files) -> str:
+    """
+    Get a new log file for the current session. The oldest log files of the folder, and their items files, are removed.
+    The items file of the session is the log file with the '.jsonl' extension.
+    :param log_folder: The folder of the log files.
+    :param kept_log_files: The number of log files of the previous sessions to keep.
+    :return: The path of the new log file.
+    """
+    try:
+        old_files = sorted(name for name in os.listdir(log_folder) if name.startswith('results_') and name.endswith('.log'))
+    except OSError:
+        old_files = []
+    for name in old_files[:max(0, len(old_files) - kept_log_files)]:
+        for file_name in (name, name[:-len('.log')] + '.jsonl'):
+            try:
+                os.remove(os.path.join(log_folder, file_name))
+            except OSError:
+                pass
+    return os.path.join(log_folder, time.strftime('results_%Y%m%d_%H%M%S') + f'_{os.getpid()}.log')
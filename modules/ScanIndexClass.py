@@ -0,0 +1,188 @@
+# coding=utf-8
+"""
+Implementation for:
+- ScanIndex: A persistent index of the folder contents, used to scan only the folders that have changed since the last scan.
+"""
+import json
+import os
+from typing import Callable, Iterator
+
+from modules.functions import atomic_write, FileLock
+
+# the files that are kept in the index, the others are ignored. '.uetoolsignore' is the ignore file of the cleaning rules
+default_tracked_suffixes = ('.uplugin', '.uproject', '.uetoolsignore')
+
+
+class ScanIndex:
+    """
+    A persistent index of the folder contents, used to scan only the folders that have changed since the last scan.
+    For each folder, the index stores its modification time, the names of its sub folders and the names of its tracked files.
+    A folder is read again only if its modification time has changed, otherwise its content is reused from the index.
+    :param index_file: The file used to save the index between two runs. If None, the index is only kept in memory.
+    :param tracked_suffixes: The suffixes of the files to keep in the index.
+    """
+
+    def __init__(self, index_file: str = None, tracked_suffixes=default_tracked_suffixes):
+        self.index_file = index_file
+        self.tracked_suffixes = tuple(tracked_suffixes)
+        self.entries = {}  # {folder path: [mtime_ns, sub folder names, tracked file names]}
+        self.reused = 0  # number of folders whose content has been reused from the index
+        self.rescanned = 0  # number of folders that have been read from the disk
+        self.error_list = []
+        # the changes since the last load or save, merged into the index file by save()
+        self._changed = set()  # the folders read from the disk
+        self._removed = []  # the folders removed with their sub folders
+        self._is_cleared = False
+        self.load()
+
+    def _read_entries(self) -> dict:
+        """
+        Read the entries of the index file.
+        :return: The entries, empty if the file does not exist, can't be read or tracks other suffixes.
+        """
+        if not os.path.isfile(self.index_file):
+            return {}
+        try:
+            with open(self.index_file, 'r') as file:
+                data = json.load(file)
+            if data.get('tracked_suffixes') == list(self.tracked_suffixes):
+                return data['entries']
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+        return {}
+
+    def load(self) -> None:
+        """
+        Load the index from the index file.
+        """
+        if self.index_file is not None:
+            self.entries = self._read_entries()
+
+    def save(self) -> None:
+        """
+        Save the index to the index file.
+        The index is shared by the tools, the jobs and the command line: the changes since the load are merged into the current content of the file
+        under a file lock, so the folders scanned by another run in the meantime are kept. The file is written atomically.
+        """
+        if self.index_file is None:
+            return
+        os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+        try:
+            with FileLock(self.index_file + '.lock'):
+                entries = self.entries
+                if not self._is_cleared:
+                    entries = self._read_entries()
+                    for root in self._removed:
+                        self._remove(entries, root)
+                    entries.update((path, self.entries[path]) for path in self._changed if path in self.entries)
+                # a crash or a concurrent reader never sees a truncated index, which would be thrown away
+                atomic_write(self.index_file, json.dumps({'tracked_suffixes': list(self.tracked_suffixes), 'entries': entries}).encode('utf-8'))
+        except OSError as error:
+            # ie. the file is locked by another run for too long (TimeoutError): the folders are only read again by the next scan
+            self.error_list.append(f'Could not save the scan index to {self.index_file}: error {error!r}')
+            return
+        self.entries = entries
+        self._changed = set()
+        self._removed = []
+        self._is_cleared = False
+
+    @staticmethod
+    def _remove(entries: dict, root: str) -> None:
+        """
+        Remove a folder and its sub folders from some entries.
+        :param entries: The entries.
+        :param root: The normalized path of the folder.
+        """
+        prefix = root.rstrip(os.sep) + os.sep
+        for path in [path for path in entries if path == root or path.startswith(prefix)]:
+            del entries[path]
+
+    def invalidate(self, root: str = None) -> None:
+        """
+        Remove a folder and its sub folders from the index, so they are read again by the next scan.
+        :param root: The folder to remove. If None, the whole index is cleared.
+        """
+        if root is None:
+            self.entries = {}
+            self._changed = set()
+            self._removed = []
+            self._is_cleared = True
+            return
+        root = os.path.normpath(root)
+        self._remove(self.entries, root)
+        self._removed.append(root)
+
+    def reset_stats(self) -> None:
+        """
+        Reset the counters of reused and rescanned folders.
+        """
+        self.reused = 0
+        self.rescanned = 0
+        self.error_list = []
+
+    def stats_text(self) -> str:
+        """
+        Get the counters of reused and rescanned folders as a text.
+        """
+        return f'{self.reused} folders reused, {self.rescanned} rescanned'
+
+    def list_dir(self, path: str) -> tuple[list, list]:
+        """
+        Get the content of a folder, from the index if the folder has not changed, or from the disk.
+        :param path: The normalized path of the folder.
+        :return: The names of the sub folders and the names of the tracked files. Links are not included.
+        """
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError as error:
+            self.error_list.append(f'Could not scan {path}: error {error!r}')
+            self.invalidate(path)
+            return [], []
+        cached = self.entries.get(path)
+        if cached is not None and cached[0] == mtime_ns:
+            self.reused += 1
+            return cached[1], cached[2]
+
+        dirs = []
+        files = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            dirs.append(entry.name)
+                        elif entry.name.endswith(self.tracked_suffixes):
+                            files.append(entry.name)
+                    except OSError:
+                        continue
+        except OSError as error:
+            self.error_list.append(f'Could not scan {path}: error {error!r}')
+            self.invalidate(path)
+            return [], []
+        self.rescanned += 1
+        if cached is not None:
+            # forget the sub folders that have been removed since the last scan
+            for name in set(cached[1]).difference(dirs):
+                self.invalidate(os.path.join(path, name))
+        self.entries[path] = [mtime_ns, dirs, files]
+        self._changed.add(path)
+        return dirs, files
+
+    def walk(self, root: str, should_stop: Callable[[], bool] = None) -> Iterator[tuple[str, list, list]]:
+        """
+        Walk a folder tree, top-down, like os.walk(). Only the tracked files are listed.
+        As with os.walk(), the caller can remove names from the sub folder list to avoid visiting them.
+        :param root: The folder to walk.
+        :param should_stop: A function called before reading each folder. If it returns True, the walk stops.
+        :return: An iterator on (folder path, sub folder names, tracked file names).
+        """
+        stack = [os.path.normpath(root)]
+        while stack:
+            if should_stop is not None and should_stop():
+                return
+            path = stack.pop()
+            dirs, files = self.list_dir(path)
+            dirs = list(dirs)  # a copy, so the caller can prune it without changing the index
+            yield path, dirs, list(files)
+            # reversed to keep the listing order when popping from the stack
+            stack.extend(os.path.join(path, name) for name in reversed(dirs))
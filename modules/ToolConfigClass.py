@@ -3,69 +3,55 @@
 Implementation for:
 - ToolConfig: A class to manage configuration values.
 """
-import configparser
-import os
-
-from modules.globals import config_folder, config_filename
+from modules.ConfigStoreClass import ConfigStore, get_config_store
 
 
 class ToolConfig:
     """
     A class to manage configuration values for a specific tool.
     Note: A tool is a window in the application. Each tool has its own section in the configuration file.
+    All the tools share the same ConfigStore: the file is loaded once and a save never overwrites the sections of the other tools.
     """
 
     def __init__(self, init_values: dict, section: str, config_file: str = None):
         """
         Initialize the Config object.
-        :param init_values: Initialisation values for the options in the section.
+        :param init_values: Initialisation values for the options in the section. Their types are the types of the values returned by get().
         :param section: Section to set
         :param config_file: Configuration file to use. If None, the default configuration file is used (see globals.py)
         """
-        if os.path.isdir(config_folder) is False:
-            os.makedirs(config_folder)
-
         self.section = section
-        if config_file is None:
-            self.config_file = os.path.join(os.path.join(config_folder, config_filename))
-        else:
-            self.config_file = config_file
-
-        self.config = configparser.ConfigParser()
-        if not self.config.has_section(section):
-            self.config.add_section(section)
-
-        # set initial values, will be overwritten when loading the config file
-        for key, value in init_values.items():
-            self.set(key, value)
+        self.defaults = dict(init_values)
+        self.store: ConfigStore = get_config_store(config_file)
+        self.config_file = self.store.config_file
 
     def get(self, option: str, default=None):
         """
-        Get a configuration value.
+        Get a configuration value, converted to the type of its initialisation value (ie. int, bool, list).
         :param option: Option to get
-        :param default: Default value if the key is not found
+        :param default: Default value if the key is not found. If None, the initialisation value is used.
         :return: The value of the key or the default value
         """
-        return self.config.get(self.section, option, fallback=default)
+        if default is None:
+            default = self.defaults.get(option)
+        return self.store.get(self.section, option, default)
 
     def set(self, option: str, value) -> None:
         """
-        Set a configuration value.
+        Set a configuration value. The configuration file is saved after a short delay, see ConfigStore.
         :param option: Option to set
-        :param value: Value to set
+        :param value: Value to set: str, int, float, bool, list or tuple.
         """
-        self.config.set(self.section, option, value)
+        self.store.set(self.section, option, value)
 
     def save(self):
         """
-        Save the configuration values to a configuration file.
+        Save the changed configuration values now.
         """
-        with open(self.config_file, 'w') as file:
-            self.config.write(file)
+        self.store.flush()
 
     def load(self):
         """
-        Load the configuration values from a configuration file.
+        Load the configuration values from the configuration file. The changes not saved yet are kept.
         """
-        if os.path.isfile(self.config_file):
-            self.config.read(self.config_file)
+        self.store.load()
@@ -0,0 +1,562 @@
+# coding=utf-8
+"""
+The headless command line interface of UETools.
+It uses the GUI-free engines of the tools and never imports tkinter nor ttkwidgets, so it starts fast and runs on headless build agents.
+Usage:
+    uetools clean [--projects-folder PATH] [--orphans] [--trash] [--prune [--prune-max-size-gb N] [--prune-max-days N]] [--dry-run [--save-plan FILE]] [--full-rescan] [--workers N]
+    uetools trash [list | restore FOLDER... | purge [--all]]
+    uetools fix-buildid [--engine-folder PATH] [--plugins-folder PATH] [--all-engines] [--dry-run [--save-plan FILE]] [--full-rescan] [--workers N]
+    uetools apply-plan FILE [--workers N]
+    uetools engines [list | add ENGINE_FOLDER [--plugins-folder PATH] | remove ENGINE_FOLDER] [--rescan]
+    uetools plugins [--name NAME] [--engine-version VERSION] [--build-id ID] [--module NAME] [--search TEXT] [--stale] [--refresh [--projects-folder PATH] [--full-rescan]]
+    uetools rollback-buildid [--workers N]
+The result is printed on stdout as JSON, the errors are also printed on stderr.
+With --export FILE, the result of each processed path is also exported to a CSV, TSV, JSON Lines or JSON file.
+The folders to clean and the folders not searched for plugins are set by the patterns of the configuration file of the GUI, see CleaningRules.
+The JSON output includes the timing and the counters of each phase ("phases"). With --profile FILE, the phases are also profiled with cProfile.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from modules.ChangePlanClass import ChangePlan
+from modules.CleaningRulesClass import CleaningRules, default_include_patterns, default_names_to_skip, default_plugin_skip_patterns
+from modules.FolderCleanerEngineClass import FolderCleanerEngine
+from modules.FolderDeleterClass import default_delete_workers
+from modules.FolderPrunerClass import FolderPruner, default_prune_patterns, default_prune_max_size, default_prune_max_days, PRUNE_BY_ACCESS
+from modules.FolderTrashClass import FolderTrash, default_trash_max_size, default_trash_max_days
+from modules.PluginInventoryClass import PluginInventory
+from modules.PluginVersionFixerEngineClass import PluginsBuildIdFixerEngine, default_update_workers, STATUS_FAILED
+from modules.ResultExporterClass import ResultExporter
+from modules.ResultLogClass import ResultLog
+from modules.ToolConfigClass import ToolConfig
+from modules.globals import config_folder, scan_index_filename, sizes_cache_filename, build_id_journal_filename, engine_registry_filename, trash_registry_filename, plugin_inventory_filename
+
+# exit codes
+EXIT_OK = 0
+EXIT_ERRORS = 1  # the command has run but some items have failed
+EXIT_USAGE = 2  # invalid arguments or settings (same code as argparse)
+EXIT_CANCELLED = 130  # interrupted by the user (Ctrl+C)
+
+
+def _get_config_value(section: str, option: str) -> str:
+    """
+    Get a value from the configuration file of the GUI, used as a default value for the command line.
+    :param section: The section of the tool.
+    :param option: The option to get.
+    :return: The value, or an empty string if not set.
+    """
+    config = ToolConfig(init_values={}, section=section)
+    return config.get(option, '')
+
+
+def _print_json(data: dict) -> None:
+    """
+    Print the result of a command as JSON on stdout.
+    :param data: The result to print.
+    """
+    json.dump(data, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+def _save_plan(plan: ChangePlan, args, output: dict) -> None:
+    """
+    Add a plan to the output of a dry run, and save it if asked.
+    :param plan: The plan.
+    :param args: The parsed arguments.
+    :param output: The output of the command.
+    """
+    output['plan'] = plan.to_dict()
+    if args.save_plan:
+        plan.save(args.save_plan)
+        output['plan_file'] = args.save_plan
+
+
+def get_cleaning_rules() -> CleaningRules:
+    """
+    Get the cleaning rules of the clean commands from the configuration file of the GUI.
+    """
+    config = ToolConfig(init_values={}, section='FolderCleaner')
+    return CleaningRules(
+        include=config.get('include_patterns', default_include_patterns),
+        exclude=config.get('exclude_patterns', []),
+        skip=config.get('skip_names', default_names_to_skip)
+    )
+
+
+def get_folder_cleaner_engine(workers: int = default_delete_workers, result_log: ResultLog = None, profile_file: str = None, use_trash: bool = False, use_prune: bool = False,
+                               prune_max_size_gb: float = None, prune_max_days: int = None) -> FolderCleanerEngine:
+    """
+    Create the engine of the clean commands, with the files shared with the GUI. It is also used by the jobs of the main window, see jobs.py.
+    :param workers: The number of threads used to delete the files and to compute the sizes.
+    :param result_log: The log the results are written to (see --export). If None, a private log is used.
+    :param profile_file: The .prof file the phases are profiled to (see --profile). If None, the phases are only timed.
+    :param use_trash: Whether the folders are moved to the trash instead of being deleted (see --trash).
+    :param use_prune: Whether the cache folders are pruned instead of being deleted (see --prune).
+    :param prune_max_size_gb: The size kept for the pruned folders of each project, in GB. If None, the value of the configuration file is used.
+    :param prune_max_days: The number of days the files of the pruned folders are kept after their last use. If None, the value of the configuration file is used.
+    """
+    config = ToolConfig(init_values={}, section='FolderCleaner')
+    if prune_max_size_gb is None:
+        prune_max_size_gb = config.get('prune_max_size_gb', default_prune_max_size // 1024 ** 3)
+    pruner = FolderPruner(
+        patterns=config.get('prune_patterns', default_prune_patterns),
+        max_size=int(prune_max_size_gb * 1024 ** 3),
+        max_days=config.get('prune_max_days', default_prune_max_days) if prune_max_days is None else prune_max_days,
+        order=config.get('prune_by', PRUNE_BY_ACCESS),
+        max_workers=workers
+    )
+    trash = FolderTrash(
+        registry_file=os.path.join(config_folder, trash_registry_filename),
+        max_size=config.get('trash_max_size_gb', default_trash_max_size // 1024 ** 3) * 1024 ** 3,
+        max_days=config.get('trash_max_days', default_trash_max_days)
+    )
+    return FolderCleanerEngine(
+        index_file=os.path.join(config_folder, scan_index_filename),
+        sizes_cache_file=os.path.join(config_folder, sizes_cache_filename),
+        delete_workers=workers,
+        size_workers=workers,
+        result_log=result_log,
+        profile_file=profile_file,
+        rules=get_cleaning_rules(),
+        trash=trash,
+        use_trash=use_trash,
+        pruner=pruner,
+        use_prune=use_prune
+    )
+
+
+def _get_clean_output(stats: dict) -> list:
+    """
+    Get the output of the cleaned folders.
+    :param stats: The stats returned by FolderCleanerEngine.clean_folders().
+    """
+    return [
+        {
+            'path': folder,
+            'bytes': folder_stats['bytes'],
+            'files': folder_stats['files'],
+            'duration': round(folder_stats['duration'], 3),
+            'staged': folder_stats.get('staged', ''),
+            'kept_bytes': folder_stats.get('kept_bytes', 0),
+            'kept_files': folder_stats.get('kept_files', 0),
+            'errors': folder_stats['errors']
+        } for folder, folder_stats in stats.items()
+    ]
+
+
+def _get_purge_output(stats: dict) -> list:
+    """
+    Get the output of the purged trash items.
+    :param stats: The stats returned by FolderCleanerEngine.purge_trash().
+    """
+    return [
+        {
+            'path': folder_stats['path'],
+            'item': item_folder,
+            'bytes': folder_stats['bytes'],
+            'files': folder_stats['files'],
+            'duration': round(folder_stats['duration'], 3),
+            'errors': folder_stats['errors']
+        } for item_folder, folder_stats in stats.items()
+    ]
+
+
+def run_clean(args) -> int:
+    """
+    Run the clean command.
+    :param args: The parsed arguments.
+    :return: The exit code.
+    """
+    projects_folder = args.projects_folder or _get_config_value('FolderCleaner', 'projects_folder')
+    if not projects_folder or not os.path.isdir(projects_folder):
+        print(f'Invalid projects folder: "{projects_folder}"', file=sys.stderr)
+        return EXIT_USAGE
+
+    engine = get_folder_cleaner_engine(
+        args.workers, args.result_log, args.profile, use_trash=args.trash, use_prune=args.prune, prune_max_size_gb=args.prune_max_size_gb, prune_max_days=args.prune_max_days
+    )
+    folder_list = engine.find_folders(projects_folder, full_rescan=args.full_rescan, include_orphans=args.orphans)
+    output = {'command': 'clean', 'dry_run': args.dry_run, 'projects_folder': projects_folder, 'scan_index': engine.scan_stats}
+    if args.dry_run:
+        plan = engine.plan_clean(folder_list, parameters={'projects_folder': projects_folder})
+        output['folders'] = [
+            {'path': item['path'], 'action': item['action'], 'bytes': item['bytes'], 'files': item['files'], 'kept_bytes': item.get('kept_bytes', 0), 'kept_files': item.get('kept_files', 0)}
+            for item in plan.items
+        ]
+        output['total_bytes'] = sum(item['bytes'] for item in plan.items)
+        _save_plan(plan, args, output)
+    else:
+        stats = engine.clean_folders(folder_list)
+        output['folders'] = _get_clean_output(stats)
+        output['total_bytes'] = sum(folder_stats['bytes'] for folder_stats in stats.values())
+        if args.trash:
+            # no background thread here: the expired items are purged before exiting, the time to purge is in the 'purge' phase
+            output['purged'] = _get_purge_output(engine.purge_trash())
+    output['phases'] = engine.stats.to_dict()['phases']
+    output['errors'] = engine.error_list
+    _print_json(output)
+    return EXIT_ERRORS if engine.error_list else EXIT_OK
+
+
+def run_trash(args) -> int:
+    """
+    Run the trash command: list, restore or purge the folders moved to the trash by clean --trash.
+    :param args: The parsed arguments.
+    :return: The exit code.
+    """
+    engine = get_folder_cleaner_engine(result_log=args.result_log)
+    output = {'command': 'trash', 'action': args.action}
+    if args.action == 'restore':
+        if not args.folders:
+            print('The folders to restore are required: their original path or their folder in the trash.', file=sys.stderr)
+            return EXIT_USAGE
+        items = engine.trash.list_items()
+        item_folders = [item['item'] for item in items if item['item'] in args.folders or item['path'] in args.folders]
+        output['restored'] = [{'path': path, 'error': error} for path, error in engine.restore_from_trash(item_folders).items()]
+        unknown = set(args.folders).difference(item['item'] for item in items).difference(item['path'] for item in items)
+        for folder in sorted(unknown):
+            engine.log(f'Not in the trash: {folder}')
+    elif args.action == 'purge':
+        output['purged'] = _get_purge_output(engine.purge_trash(purge_all=args.all))
+    output['items'] = engine.trash.list_items()
+    output['total_bytes'] = sum(item['bytes'] for item in output['items'])
+    output['errors'] = engine.error_list
+    _print_json(output)
+    return EXIT_ERRORS if engine.error_list else EXIT_OK
+
+
+def get_build_id_fixer_engine(workers: int = default_update_workers, result_log: ResultLog = None, profile_file: str = None) -> PluginsBuildIdFixerEngine:
+    """
+    Create the engine of the BuildId commands, with the files shared with the GUI. It is also used by the jobs of the main window, see jobs.py.
+    :param workers: The number of threads used to read and write the plugin files.
+    :param result_log: The log the results are written to (see --export). If None, a private log is used.
+    :param profile_file: The .prof file the phases are profiled to (see --profile). If None, the phases are only timed.
+    """
+    return PluginsBuildIdFixerEngine(
+        index_file=os.path.join(config_folder, scan_index_filename),
+        journal_file=os.path.join(config_folder, build_id_journal_filename),
+        update_workers=workers,
+        registry_file=os.path.join(config_folder, engine_registry_filename),
+        result_log=result_log,
+        profile_file=profile_file,
+        skip_patterns=ToolConfig(init_values={}, section='PluginsBuildIdFixer').get('skip_patterns', default_plugin_skip_patterns)
+    )
+
+
+def run_fix_build_id(args) -> int:
+    """
+    Run the fix-buildid command.
+    :param args: The parsed arguments.
+    :return: The exit code.
+    """
+    if args.all_engines:
+        return _run_fix_build_id_for_engines(args)
+    engine_folder = args.engine_folder or _get_config_value('PluginsBuildIdFixer', 'engine_folder')
+    plugins_folder = args.plugins_folder or _get_config_value('PluginsBuildIdFixer', 'plugins_folder')
+    for name, folder in (('engine', engine_folder), ('plugins', plugins_folder)):
+        if not folder or not os.path.isdir(folder):
+            print(f'Invalid {name} folder: "{folder}"', file=sys.stderr)
+            return EXIT_USAGE
+
+    engine = get_build_id_fixer_engine(args.workers, args.result_log, args.profile)
+    engine.registry.add(engine_folder, plugins_folder)
+    engine.build_id = engine.extract_build_id(engine_folder)
+    output = {'command': 'fix-buildid', 'dry_run': args.dry_run, 'engine_folder': engine_folder, 'plugins_folder': plugins_folder, 'build_id': engine.build_id}
+    if not engine.build_id:
+        output['phases'] = engine.stats.to_dict()['phases']
+        output['errors'] = engine.error_list
+        _print_json(output)
+        return EXIT_ERRORS
+
+    output['inconsistent_files'] = engine.registry.get_entry(engine_folder)['inconsistent_files']
+    plugin_list = engine.find_plugins(plugins_folder, full_rescan=args.full_rescan)
+    if args.dry_run:
+        plan = engine.plan_fix(plugin_list, parameters={'engine_folder': engine_folder, 'plugins_folder': plugins_folder, 'build_id': engine.build_id})
+        output['files'] = _get_plan_files_output(plan)
+        _save_plan(plan, args, output)
+    else:
+        results = engine.fix_build_id_in_plugins(plugin_list)
+        output['plugins'] = [{'path': plugin_file, 'status': status} for plugin_file, status in results.items()]
+        output['files'] = engine.file_counts
+    output['scan_index'] = engine.scan_stats
+    output['phases'] = engine.stats.to_dict()['phases']
+    output['errors'] = engine.error_list
+    _print_json(output)
+    return EXIT_ERRORS if engine.error_list else EXIT_OK
+
+
+def _get_plan_files_output(plan: ChangePlan) -> list:
+    """
+    Get the output of the files of a BuildId plan.
+    :param plan: The plan made by PluginsBuildIdFixerEngine.plan_fix().
+    """
+    return [{'path': item['path'], 'action': item['action'], 'old_build_id': item['old_build_id'], 'new_build_id': item['new_build_id']} for item in plan.items]
+
+
+def _run_fix_build_id_for_engines(args) -> int:
+    """
+    Run the fix-buildid command for all the registered engines.
+    :param args: The parsed arguments.
+    :return: The exit code.
+    """
+    engine = get_build_id_fixer_engine(args.workers, args.result_log, args.profile)
+    if not engine.registry.engine_folders:
+        print('No registered engine. Use the "engines add" command first.', file=sys.stderr)
+        return EXIT_USAGE
+    output = {'command': 'fix-buildid', 'dry_run': args.dry_run, 'engines': []}
+    if args.dry_run:
+        engine_plugins, build_ids = engine.find_plugins_for_engines(full_rescan=args.full_rescan)
+        plan = engine.plan_fix(list(build_ids), build_ids=build_ids, parameters={'engine_folders': ', '.join(engine_plugins)})
+        for engine_folder in engine_plugins:
+            entry = engine.registry.get_entry(engine_folder)
+            output['engines'].append({'engine_folder': engine_folder, 'plugins_folder': entry['plugins_folder'], 'build_id': entry['build_id']})
+        output['files'] = _get_plan_files_output(plan)
+        _save_plan(plan, args, output)
+    else:
+        results = engine.fix_build_id_for_engines(full_rescan=args.full_rescan)
+        for engine_folder, plugin_results in results.items():
+            entry = engine.registry.get_entry(engine_folder)
+            output['engines'].append({
+                'engine_folder': engine_folder,
+                'plugins_folder': entry['plugins_folder'],
+                'build_id': entry['build_id'],
+                'plugins': [{'path': plugin_file, 'status': status} for plugin_file, status in plugin_results.items()]
+            })
+        output['files'] = engine.file_counts
+    output['phases'] = engine.stats.to_dict()['phases']
+    output['errors'] = engine.error_list
+    _print_json(output)
+    return EXIT_ERRORS if engine.error_list else EXIT_OK
+
+
+def run_engines(args) -> int:
+    """
+    Run the engines command: list, register or unregister the engines used by fix-buildid --all-engines.
+    :param args: The parsed arguments.
+    :return: The exit code.
+    """
+    engine = get_build_id_fixer_engine()
+    registry = engine.registry
+    if args.action in ('add', 'remove') and not args.engine_folder:
+        print(f'The engine folder is required to {args.action} an engine.', file=sys.stderr)
+        return EXIT_USAGE
+    if args.action == 'add':
+        if not os.path.isdir(args.engine_folder):
+            print(f'Invalid engine folder: "{args.engine_folder}"', file=sys.stderr)
+            return EXIT_USAGE
+        registry.add(args.engine_folder, args.plugins_folder)
+    elif args.action == 'remove':
+        if not registry.remove(args.engine_folder):
+            print(f'Engine not registered: "{args.engine_folder}"', file=sys.stderr)
+            return EXIT_USAGE
+    engines = []
+    for engine_folder in registry.engine_folders:
+        build_id = engine.extract_build_id(engine_folder, rescan=args.rescan)
+        entry = registry.get_entry(engine_folder)
+        engines.append({
+            'engine_folder': engine_folder,
+            'plugins_folder': entry['plugins_folder'],
+            'build_id': build_id,
+            'modules_files': len(entry['files']),
+            'inconsistent_files': entry['inconsistent_files']
+        })
+    registry.save()
+    _print_json({'command': 'engines', 'engines': engines, 'errors': engine.error_list})
+    return EXIT_ERRORS if engine.error_list else EXIT_OK
+
+
+def get_plugin_inventory() -> PluginInventory:
+    """
+    Create the plugin inventory, with the file shared with the GUI.
+    """
+    return PluginInventory(inventory_file=os.path.join(config_folder, plugin_inventory_filename))
+
+
+def run_plugins(args) -> int:
+    """
+    Run the plugins command: query the inventory of the plugins of the registered engines and of the projects.
+    The inventory is only updated with --refresh, or if it's empty: the queries never read the plugin files.
+    :param args: The parsed arguments.
+    :return: The exit code.
+    """
+    inventory = get_plugin_inventory()
+    engine = None
+    output = {'command': 'plugins'}
+    if args.refresh or not inventory.entries:
+        if args.projects_folder and not os.path.isdir(args.projects_folder):
+            print(f'Invalid projects folder: "{args.projects_folder}"', file=sys.stderr)
+            return EXIT_USAGE
+        projects_folder = args.projects_folder or _get_config_value('FolderCleaner', 'projects_folder')
+        engine = get_build_id_fixer_engine(args.workers)
+        engine.update_inventory(inventory, [projects_folder] if projects_folder and os.path.isdir(projects_folder) else [], full_rescan=args.full_rescan)
+        output['inventory'] = inventory.stats_text()
+        output['phases'] = engine.stats.to_dict()['phases']
+    stale_build_ids = None
+    if args.stale:
+        engine = engine or get_build_id_fixer_engine(args.workers)
+        stale_build_ids = engine.get_expected_build_ids()
+        output['expected_build_ids'] = stale_build_ids
+    start = time.perf_counter()
+    plugins = inventory.query(
+        name=args.name, engine_version=args.engine_version, build_id=args.build_id, module=args.module, text=args.search, stale_build_ids=stale_build_ids
+    )
+    output['query_ms'] = round((time.perf_counter() - start) * 1000, 3)
+    output['count'] = len(plugins)
+    output['plugins'] = [
+        {field: plugin[field] for field in ('path', 'name', 'friendly_name', 'version', 'version_name', 'engine_version', 'build_id', 'modules', 'root', 'error')}
+        for plugin in plugins
+    ]
+    output['errors'] = engine.error_list if engine is not None else []
+    _print_json(output)
+    return EXIT_ERRORS if output['errors'] else EXIT_OK
+
+
+def run_apply_plan(args) -> int:
+    """
+    Run the apply-plan command: execute a plan saved by a dry run, without scanning again.
+    :param args: The parsed arguments.
+    :return: The exit code.
+    """
+    try:
+        plan = ChangePlan.load(args.plan_file)
+    except (OSError, ValueError, KeyError) as error:
+        print(f'Invalid plan file: "{args.plan_file}": error {error!r}', file=sys.stderr)
+        return EXIT_USAGE
+    output = {'command': 'apply-plan', 'plan_file': args.plan_file, 'tool': plan.tool, 'created': plan.created}
+    if plan.tool == 'FolderCleaner':
+        engine = get_folder_cleaner_engine(args.workers or default_delete_workers, args.result_log, args.profile)
+        stats = engine.execute_plan(plan)
+        output['folders'] = _get_clean_output(stats)
+        output['total_bytes'] = sum(folder_stats['bytes'] for folder_stats in stats.values())
+    elif plan.tool == 'PluginsBuildIdFixer':
+        engine = get_build_id_fixer_engine(args.workers or default_update_workers, args.result_log, args.profile)
+        results = engine.execute_plan(plan)
+        output['plugins'] = [{'path': plugin_file, 'status': status} for plugin_file, status in results.items()]
+        output['files'] = engine.file_counts
+    else:
+        print(f'Unknown tool in the plan: "{plan.tool}"', file=sys.stderr)
+        return EXIT_USAGE
+    output['phases'] = engine.stats.to_dict()['phases']
+    output['errors'] = engine.error_list
+    _print_json(output)
+    return EXIT_ERRORS if engine.error_list else EXIT_OK
+
+
+def run_rollback_build_id(args) -> int:
+    """
+    Run the rollback-buildid command.
+    :param args: The parsed arguments.
+    :return: The exit code.
+    """
+    engine = get_build_id_fixer_engine(args.workers, args.result_log, args.profile)
+    results = engine.rollback_last_run()
+    output = {
+        'command': 'rollback-buildid',
+        'files': [{'path': path, 'status': status} for path, status in results.items()],
+        'phases': engine.stats.to_dict()['phases'],
+        'errors': engine.error_list
+    }
+    _print_json(output)
+    return EXIT_ERRORS if engine.error_list or STATUS_FAILED in results.values() else EXIT_OK
+
+
+def get_parser() -> argparse.ArgumentParser:
+    """
+    Create the parser of the command line.
+    """
+    parser = argparse.ArgumentParser(prog='uetools', description='A collection of tools for Unreal Engine 5. Default folders are read from the GUI configuration file.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    parser_clean = subparsers.add_parser('clean', help='Clean UE projects from build and intermediate folders.')
+    parser_clean.add_argument('--projects-folder', help='The folder that contains the projects to clean.')
+    parser_clean.add_argument('--workers', type=int, default=default_delete_workers, help='The number of threads used to delete the files.')
+    parser_clean.add_argument('--orphans', action='store_true', help='Also clean the folders that are not in a project nor in a plugin.')
+    parser_clean.add_argument('--trash', action='store_true', help='Move the folders to the trash of their volume instead of deleting them. They can be restored until they are purged.')
+    parser_clean.add_argument('--prune', action='store_true', help='Evict the least recently used files of the cache folders (prune_patterns) instead of deleting them. Use --dry-run to preview.')
+    parser_clean.add_argument('--prune-max-size-gb', type=float, default=None, help='With --prune, the size kept for the pruned folders of each project, in GB (0: no size target).')
+    parser_clean.add_argument('--prune-max-days', type=int, default=None, help='With --prune, the files not used for this number of days are evicted (0: no age threshold).')
+    parser_clean.set_defaults(func=run_clean)
+
+    parser_trash = subparsers.add_parser('trash', help='List, restore or purge the folders moved to the trash by clean --trash.')
+    parser_trash.add_argument('action', nargs='?', choices=('list', 'restore', 'purge'), default='list', help='The action to run (default: list).')
+    parser_trash.add_argument('folders', nargs='*', help='The folders to restore: their original path or their folder in the trash.')
+    parser_trash.add_argument('--all', action='store_true', help='Purge all the folders, not only the expired ones (older than trash_max_days or above trash_max_size_gb).')
+    parser_trash.set_defaults(func=run_trash)
+
+    parser_fix = subparsers.add_parser('fix-buildid', help='Update plugin files with the Custom Engine Build ID.')
+    parser_fix.add_argument('--engine-folder', help='The engine folder to read the Build ID from.')
+    parser_fix.add_argument('--plugins-folder', help='The folder that contains the plugins to update.')
+    parser_fix.add_argument('--all-engines', action='store_true', help='Update the plugins of all the registered engines, each with the Build ID of its engine.')
+    parser_fix.add_argument('--workers', type=int, default=default_update_workers, help='The number of threads used to read and write the plugin files.')
+    parser_fix.set_defaults(func=run_fix_build_id)
+
+    parser_engines = subparsers.add_parser('engines', help='List, register or unregister the engines updated by fix-buildid --all-engines.')
+    parser_engines.add_argument('action', nargs='?', choices=('list', 'add', 'remove'), default='list', help='The action to run (default: list).')
+    parser_engines.add_argument('engine_folder', nargs='?', help='The engine folder to add or remove.')
+    parser_engines.add_argument('--plugins-folder', help='The folder that contains the plugins of the engine (default: Plugins/Marketplace in the engine).')
+    parser_engines.add_argument('--rescan', action='store_true', help='Read the Build IDs again even if the .modules files have not changed.')
+    parser_engines.set_defaults(func=run_engines)
+
+    parser_plugins = subparsers.add_parser('plugins', help='Query the inventory of the plugins of the registered engines and of the projects. All the filters must match.')
+    parser_plugins.add_argument('--name', default='', help='The name of the plugin (the name of its .uplugin file), case-insensitive.')
+    parser_plugins.add_argument('--engine-version', default='', help='The EngineVersion declared by the plugin, or its beginning (ie. 5.1 for all the 5.1.x versions).')
+    parser_plugins.add_argument('--build-id', default='', help='The BuildId of the plugin.')
+    parser_plugins.add_argument('--module', default='', help='The name of one of the modules of the plugin, case-insensitive.')
+    parser_plugins.add_argument('--search', default='', help='A text to search in the name, the friendly name and the path of the plugin.')
+    parser_plugins.add_argument('--stale', action='store_true', help='Only the plugins of the registered engines whose BuildId is not the BuildId of their engine.')
+    parser_plugins.add_argument('--refresh', action='store_true', help='Update the inventory first. Only the plugins whose files have changed are read again.')
+    parser_plugins.add_argument('--projects-folder', help='With --refresh, the folder that contains the projects whose plugins are added to the inventory.')
+    parser_plugins.add_argument('--full-rescan', action='store_true', help='With --refresh, invalidate the scan index before scanning.')
+    parser_plugins.add_argument('--workers', type=int, default=default_update_workers, help='The number of threads used to read the plugin files.')
+    parser_plugins.set_defaults(func=run_plugins)
+
+    parser_apply = subparsers.add_parser('apply-plan', help='Execute a plan saved by a dry run (--save-plan), without scanning again. The plan is refused if the files have changed since.')
+    parser_apply.add_argument('plan_file', help='The plan file.')
+    parser_apply.add_argument('--workers', type=int, default=0, help='The number of threads used to process the files (default: the default of the tool).')
+    parser_apply.set_defaults(func=run_apply_plan)
+
+    parser_rollback = subparsers.add_parser('rollback-buildid', help='Restore the plugin files changed by the last fix-buildid run.')
+    parser_rollback.add_argument('--workers', type=int, default=default_update_workers, help='The number of threads used to restore the files.')
+    parser_rollback.set_defaults(func=run_rollback_build_id)
+
+    for subparser in (parser_clean, parser_trash, parser_fix, parser_apply, parser_rollback):
+        subparser.add_argument(
+            '--export', metavar='FILE', help='Export the result of each processed path to a .csv, .tcsv/.tsv (tabs), .jsonl (JSON Lines) or .json (JSON array) file.'
+        )
+        subparser.add_argument('--profile', metavar='FILE', help='Profile the phases of the command with cProfile and write the profile to a .prof file.')
+
+    for subparser in (parser_clean, parser_fix):
+        subparser.add_argument('--dry-run', action='store_true', help='Only show what would be done (the plan of the changes).')
+        subparser.add_argument('--save-plan', metavar='FILE', help='With --dry-run, save the plan to a file, to execute it later with apply-plan.')
+        subparser.add_argument('--full-rescan', action='store_true', help='Invalidate the scan index before scanning.')
+    return parser
+
+
+def main(argv=None) -> int:
+    """
+    Run the command line interface.
+    :param argv: The arguments. If None, sys.argv is used.
+    :return: The exit code.
+    """
+    args = get_parser().parse_args(argv)
+    export_file = getattr(args, 'export', None)
+    args.result_log = None
+    if export_file:
+        if ResultExporter.get_format(export_file) is None:
+            print(f'Unsupported export file type: "{export_file}"', file=sys.stderr)
+            return EXIT_USAGE
+        # the items are streamed to a temporary file, then converted: the export never holds the items in memory
+        args.result_log = ResultLog(items_file=export_file + '.items.tmp')
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        print('Cancelled by user.', file=sys.stderr)
+        return EXIT_CANCELLED
+    finally:
+        if args.result_log is not None:
+            args.result_log.close()
+            ResultExporter(args.result_log.items_file).export(export_file)
+            os.remove(args.result_log.items_file)
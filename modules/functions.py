@@ -2,7 +2,12 @@
 """
 Global  functions 
 """
-from tkinter import filedialog
+import os
+import stat
+
+# the umask of the process, read once at import time: os.umask() can only be read by changing it, which is not thread-safe
+_umask = os.umask(0o022)
+os.umask(_umask)
 
 
 def browse_folder() -> str:
@@ -10,18 +15,103 @@ def browse_folder() -> str:
     Open a directory browser and set the selected path to the given entry widget
     :return: The selected path
     """
+    # imported here to keep this module usable without tkinter (see cli.py)
+    from tkinter import filedialog
     folder = filedialog.askdirectory()
     return folder
 
 
-def make_modal(tk_root, tk_child):
+def format_size(size: float) -> str:
+    """
+    Format a size in bytes to a human-readable string.
+    :param size: The size in bytes.
+    :return: The formatted size, e.g. '1.5 GB'.
+    """
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024:
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024
+    return f'{size:.1f} TB'
+
+
+def atomic_write(filename: str, content: bytes) -> None:
     """
-    Make a tk_child windows displayed as a modal window.
-    :param tk_root: root tk windows
-    :param tk_child: tk_child tk window
-    :return:
+    Write a file atomically: the content is written to a temporary file in the same folder, which then replaces the file.
+    A crash during the write never leaves a truncated file. The permissions of the existing file are kept.
+    :param filename: The file to write.
+    :param content: The content to write.
     """
-    tk_child.transient(tk_root)
-    tk_child.grab_set()
-    tk_child.focus_set()
-    tk_child.wait_window()
+    # imported here because this module is imported by the main window at startup
+    import tempfile
+
+    folder = os.path.dirname(os.path.abspath(filename))
+    file_descriptor, temp_filename = tempfile.mkstemp(dir=folder, prefix='.' + os.path.basename(filename) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(file_descriptor, 'wb') as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+        # mkstemp() creates the file readable by its owner only: use the mode of the replaced file, or the mode of a new file
+        if os.path.exists(filename):
+            os.chmod(temp_filename, stat.S_IMODE(os.stat(filename).st_mode))
+        else:
+            os.chmod(temp_filename, 0o666 & ~_umask)
+        os.replace(temp_filename, filename)
+    except BaseException:
+        try:
+            os.unlink(temp_filename)
+        except OSError:
+            pass
+        raise
+
+
+class FileLock:
+    """
+    An exclusive lock shared between processes, based on a lock file. Use it as a context manager.
+    It uses fcntl.flock() on POSIX systems and msvcrt.locking() on Windows.
+    :param lock_filename: The lock file. It's created if it does not exist and never removed.
+    :param timeout: The maximum time to wait for the lock, in seconds.
+    """
+
+    def __init__(self, lock_filename: str, timeout: float = 10.0):
+        self.lock_filename = lock_filename
+        self.timeout = timeout
+        self._file = None
+
+    def __enter__(self):
+        # imported here because this module is imported by the main window at startup
+        import time
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.lock_filename)), exist_ok=True)
+        self._file = open(self.lock_filename, 'a+b')
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                self._lock(True)
+                return self
+            except OSError:
+                if time.monotonic() > deadline:
+                    self._file.close()
+                    self._file = None
+                    raise TimeoutError(f'Could not lock {self.lock_filename} in {self.timeout}s')
+                time.sleep(0.05)
+
+    def __exit__(self, _exc_type, _exc_value, _traceback):
+        try:
+            self._lock(False)
+        finally:
+            self._file.close()
+            self._file = None
+
+    def _lock(self, lock: bool) -> None:
+        """
+        Lock or unlock the lock file, without waiting.
+        :param lock: True to lock, False to unlock.
+        """
+        if os.name == 'nt':
+            import msvcrt
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK if lock else msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(self._file.fileno(), (fcntl.LOCK_EX | fcntl.LOCK_NB) if lock else fcntl.LOCK_UN)
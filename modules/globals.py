@@ -1,9 +1,40 @@
 # coding=utf-8
 """
 Global variables
+Note: the values that need a lookup in the environment (ie. config_folder) are computed on their first access, not at import time.
 """
 import os
 
-config_folder = os.path.join(os.environ['USERPROFILE'], '.config', 'UeTools')
 config_filename = 'config.ini'
+scan_index_filename = 'scan_index.json'
+sizes_cache_filename = 'folder_sizes.json'
+build_id_journal_filename = 'build_id_journal.json'
+engine_registry_filename = 'engines.json'
+trash_registry_filename = 'trash_folders.json'  # the trash folders of the volumes, see FolderTrash
+plugin_inventory_filename = 'plugin_inventory.json'  # the metadata of the plugins of the engines and of the projects, see PluginInventory
+log_folder_name = 'logs'  # the folder of the result logs, in the config folder
+plan_filename_suffix = '_plan.json'  # the last plan of a tool is saved in <tool name>_plan.json
+stats_filename_suffix = '_stats.json'  # the timing of the phases of the last run of a tool is saved in <tool name>_stats.json
+profile_filename_suffix = '.prof'  # the cProfile capture of a tool, when enabled by its 'profile' option, is saved in <tool name>.prof
 default_engine_folder = 'C:/Program Files/Epic Games/5.2/Engine'
+
+
+def get_config_folder() -> str:
+    """
+    Get the folder that contains the configuration files.
+    USERPROFILE is only defined on Windows, use the home folder on the other systems (ie. headless build agents)
+    :return: The folder path.
+    """
+    return os.path.join(os.environ.get('USERPROFILE', os.path.expanduser('~')), '.config', 'UeTools')
+
+
+def __getattr__(name: str):
+    """
+    Compute the lazy global values on their first access. Only called for the names that are not already defined in the module.
+    :param name: The name of the global value.
+    """
+    if name == 'config_folder':
+        value = get_config_folder()
+        globals()[name] = value  # the next accesses will not call __getattr__
+        return value
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,145 @@
+# coding=utf-8
+"""
+The runners of the jobs of the main window, see JobScheduler.
+Each runner does the work of a tool with its GUI-free engine, configured from the configuration file like the command line (see cli.py).
+It runs in a worker thread: it checks job.is_cancelled, reports its progress with job.progress() and writes its results to job.log.
+Its pools use at most job.workers threads, the share of the job in the threads of all the running jobs.
+"""
+import os
+
+from modules.ChangePlanClass import ChangePlan
+from modules.FolderDeleterClass import default_delete_workers
+from modules.JobSchedulerClass import Job
+from modules.PluginVersionFixerEngineClass import default_update_workers, STATUS_FAILED
+from modules.ToolConfigClass import ToolConfig
+from modules.cli import get_folder_cleaner_engine, get_build_id_fixer_engine
+from modules.functions import format_size
+
+# the kinds of jobs
+JOB_CLEAN = 'clean'
+JOB_FIX_BUILD_ID = 'fix-buildid'
+JOB_APPLY_BUILD_ID_PLAN = 'apply-plan-buildid'
+JOB_ROLLBACK_BUILD_ID = 'rollback-buildid'
+
+
+def get_workers(job: Job, workers: int) -> int:
+    """
+    Get the number of threads of the pools of a job: the value of the configuration file, within the share of the job.
+    :param job: The job.
+    :param workers: The value of the configuration file.
+    """
+    return min(workers, job.workers) if job.workers else workers
+
+
+def run_clean_job(job: Job) -> str:
+    """
+    Clean the folders of a projects folder.
+    The parameters of the job are: projects_folder, folders (the folders to clean. If empty, all the folders found in the projects folder),
+    include_orphans, full_rescan, use_trash and use_prune (see FolderCleanerEngine).
+    :param job: The job.
+    :return: The summary of the job.
+    """
+    parameters = job.parameters
+    config = ToolConfig(init_values={}, section='FolderCleaner')
+    engine = get_folder_cleaner_engine(
+        get_workers(job, config.get('delete_workers', default_delete_workers)), job.log, use_trash=parameters.get('use_trash', False), use_prune=parameters.get('use_prune', False)
+    )
+    folder_list = parameters.get('folders') or []
+    if folder_list:
+        # the job may run long after it was submitted, ie. in the next session
+        missing = [folder for folder in folder_list if not os.path.isdir(folder)]
+        for folder in missing:
+            engine.report(f'Skipped {folder}: it does not exist anymore')
+        folder_list = [folder for folder in folder_list if folder not in missing]
+    else:
+        folder_list = engine.find_folders(
+            parameters['projects_folder'], full_rescan=parameters.get('full_rescan', False), should_stop=lambda: job.is_cancelled,
+            include_orphans=parameters.get('include_orphans', False)
+        )
+    stats = engine.clean_folders(folder_list, should_stop=lambda: job.is_cancelled, on_progress=job.progress) if not job.is_cancelled else {}
+    if engine.use_trash:
+        engine.purge_trash_in_background()
+    engine.end_report()
+    summary = f'{len(stats)} folders, {format_size(sum(folder_stats["bytes"] for folder_stats in stats.values()))} freed'
+    return summary + (f', {len(engine.error_list)} errors' if engine.error_list else '')
+
+
+def run_fix_build_id_job(job: Job) -> str:
+    """
+    Update the plugin files with the Build ID of their engine.
+    The parameters of the job are: engine_folder, plugins_folder, plugins (the plugin files to update. If empty, the plugins found in the plugins folder),
+    full_rescan and all_engines (update the plugins of all the registered engines, after registering the engine folder).
+    :param job: The job.
+    :return: The summary of the job.
+    """
+    parameters = job.parameters
+    config = ToolConfig(init_values={}, section='PluginsBuildIdFixer')
+    engine = get_build_id_fixer_engine(get_workers(job, config.get('update_workers', default_update_workers)), job.log)
+    engine_folder = parameters['engine_folder']
+    plugins_folder = parameters['plugins_folder']
+    engine.registry.add(engine_folder, plugins_folder)
+    full_rescan = parameters.get('full_rescan', False)
+    if parameters.get('all_engines', False):
+        results = {}
+        for plugin_results in engine.fix_build_id_for_engines(full_rescan=full_rescan, should_stop=lambda: job.is_cancelled, on_progress=job.progress).values():
+            results.update(plugin_results)
+    else:
+        engine.build_id = engine.extract_build_id(engine_folder, should_stop=lambda: job.is_cancelled)
+        if not engine.build_id:
+            raise ValueError(f'Failed to extract the Custom Engine Build ID from {engine_folder}')
+        plugin_list = parameters.get('plugins') or engine.find_plugins(plugins_folder, full_rescan=full_rescan, should_stop=lambda: job.is_cancelled, on_progress=job.progress)
+        results = engine.fix_build_id_in_plugins(plugin_list, should_stop=lambda: job.is_cancelled, on_progress=job.progress)
+    engine.end_report()
+    failed = sum(1 for status in results.values() if status == STATUS_FAILED)
+    return f'{len(results)} plugins, {failed} failed' + (f', {len(engine.error_list)} errors' if engine.error_list else '')
+
+
+def run_apply_build_id_plan_job(job: Job) -> str:
+    """
+    Update the plugin files of a saved plan, without scanning again.
+    The parameter of the job is plan_file, the file of the plan made by the PluginsBuildIdFixer window. The plan is not executed if it is out of date.
+    :param job: The job.
+    :return: The summary of the job.
+    """
+    config = ToolConfig(init_values={}, section='PluginsBuildIdFixer')
+    engine = get_build_id_fixer_engine(get_workers(job, config.get('update_workers', default_update_workers)), job.log)
+    results = engine.execute_plan(ChangePlan.load(job.parameters['plan_file']), should_stop=lambda: job.is_cancelled, on_progress=job.progress)
+    engine.end_report()
+    if not results and engine.error_list:
+        raise ValueError(engine.error_list[0])
+    failed = sum(1 for status in results.values() if status == STATUS_FAILED)
+    return f'{len(results)} plugins, {failed} failed' + (f', {len(engine.error_list)} errors' if engine.error_list else '')
+
+
+def run_rollback_build_id_job(job: Job) -> str:
+    """
+    Restore the plugin files changed by the last update. The job has no parameters.
+    :param job: The job.
+    :return: The summary of the job.
+    """
+    config = ToolConfig(init_values={}, section='PluginsBuildIdFixer')
+    engine = get_build_id_fixer_engine(get_workers(job, config.get('update_workers', default_update_workers)), job.log)
+    results = engine.rollback_last_run(should_stop=lambda: job.is_cancelled, on_progress=job.progress)
+    engine.end_report()
+    if not results:
+        return 'No update to roll back'
+    failed = sum(1 for status in results.values() if status == STATUS_FAILED)
+    return f'{len(results) - failed} files restored, {failed} failed'
+
+
+# {kind of job: runner}, see JobScheduler
+job_runners = {
+    JOB_CLEAN: run_clean_job,
+    JOB_FIX_BUILD_ID: run_fix_build_id_job,
+    JOB_APPLY_BUILD_ID_PLAN: run_apply_build_id_plan_job,
+    JOB_ROLLBACK_BUILD_ID: run_rollback_build_id_job
+}
+# {kind of job: the state written by its jobs}, see JobScheduler: two jobs of the same kind never run at the same time.
+# The scan index is written by all the kinds, its saves are merged instead, see ScanIndex.save()
+# The windows reserve the same state while they write it themselves, see JobScheduler.reserve()
+job_resources = {
+    JOB_CLEAN: ('sizes_cache', 'trash_registry'),
+    JOB_FIX_BUILD_ID: ('build_id_journal', 'engine_registry'),
+    JOB_APPLY_BUILD_ID_PLAN: ('build_id_journal', 'engine_registry'),
+    JOB_ROLLBACK_BUILD_ID: ('build_id_journal', 'engine_registry')
+}
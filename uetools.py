@@ -0,0 +1,11 @@
+# coding=utf-8
+"""
+The UETools command line, for headless use (build agents, scheduled jobs...).
+See modules/cli.py for the available commands. Run "python uetools.py --help" for the usage.
+"""
+import sys
+
+from modules.cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())